@@ -9,10 +9,13 @@ Módulo de API para integraciones externas
 Endpoints disponibles:
 - /test (GET): Endpoint de prueba
 - /api/update_category (POST): Actualiza la categoría de un producto
+- /api/telemetry/batch (POST): Ingesta por lotes de lecturas de máquinas
+- /api/telemetry/latest (POST): Último valor por máquina y métrica
+- /api/telemetry/series (POST): Serie de una métrica con la resolución adecuada a la ventana
 """,
     'author': 'MEGASTOCK',
     'website': 'https://megastock.com',
-    'depends': ['base', 'mrp'],
+    'depends': ['base', 'mrp', 'megastock_machines'],
     'data': [],
     'installable': True,
     'application': False,
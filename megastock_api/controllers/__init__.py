@@ -1,3 +1,4 @@
 from . import product_api
 from . import workcenter_controller
+from . import telemetry_controller
 from . import test_controller
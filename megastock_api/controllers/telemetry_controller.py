@@ -0,0 +1,138 @@
+from odoo import http
+from odoo.addons.megastock_machines.models.machine_telemetry import MAX_LECTURAS_POR_LOTE
+import logging
+
+_logger = logging.getLogger(__name__)
+
+class TelemetryAPIController(http.Controller):
+
+    @http.route('/api/telemetry/batch', type='json', auth='none', methods=['POST'], csrf=False)
+    def ingest_telemetry_batch(self, **kw):
+        """Recibe un lote de lecturas de varias máquinas y métricas en una sola transacción
+
+        Cuerpo: {"readings": [{"centro": "CORRUGADORA", "ts": "2025-01-01T08:00:00Z",
+                               "metrics": {"power_kw": 75.2, "speed_mmin": 140}}, ...]}
+        """
+        try:
+            data = http.request.jsonrequest
+            readings = data.get('readings')
+
+            if not isinstance(readings, list) or not readings:
+                return {
+                    'status': 'error',
+                    'message': 'Falta el campo requerido (readings) como lista de lecturas'
+                }
+
+            if len(readings) > MAX_LECTURAS_POR_LOTE:
+                return {
+                    'status': 'error',
+                    'message': f'El lote excede el máximo de {MAX_LECTURAS_POR_LOTE} lecturas'
+                }
+
+            if any(not isinstance(r, dict) or not isinstance(r.get('metrics', {}), dict) for r in readings):
+                return {
+                    'status': 'error',
+                    'message': 'Cada lectura debe ser un objeto y metrics un objeto {metrica: valor}'
+                }
+
+            resultado = http.request.env['megastock.machine.telemetry'].sudo()._ingest_readings(readings)
+
+            return {
+                'status': 'success',
+                'accepted': resultado['accepted'],
+                'rejected': resultado['rejected'],
+            }
+
+        except Exception as e:
+            _logger.error(f"Error en el endpoint /api/telemetry/batch: {str(e)}", exc_info=True)
+            return {
+                'status': 'error',
+                'message': f'Error interno del servidor: {str(e)}'
+            }
+
+    @http.route('/api/telemetry/latest', type='json', auth='none', methods=['POST'], csrf=False)
+    def get_latest_telemetry(self, **kw):
+        """Devuelve el último valor de cada métrica por máquina desde la caché"""
+        try:
+            data = http.request.jsonrequest or {}
+            env = http.request.env
+
+            domain = []
+            if data.get('centros'):
+                domain = [('name', 'in', [str(c).upper() for c in data['centros']])]
+            workcenters = env['mrp.workcenter'].sudo().search(domain)
+            ultimos = env['megastock.machine.telemetry.latest'].sudo().get_latest(workcenters.ids)
+
+            return {
+                'status': 'success',
+                'data': {
+                    workcenter.name: {
+                        metrica: {'ts': str(instante), 'value': valor}
+                        for metrica, (instante, valor) in ultimos.get(workcenter.id, {}).items()
+                    }
+                    for workcenter in workcenters if workcenter.id in ultimos
+                }
+            }
+
+        except Exception as e:
+            _logger.error(f"Error en el endpoint /api/telemetry/latest: {str(e)}", exc_info=True)
+            return {
+                'status': 'error',
+                'message': f'Error interno del servidor: {str(e)}'
+            }
+
+    @http.route('/api/telemetry/series', type='json', auth='none', methods=['POST'], csrf=False)
+    def get_telemetry_series(self, **kw):
+        """Serie de una métrica; la resolución (cruda, 1m, 1h, 1d) se elige según la ventana
+
+        Cuerpo: {"centros": ["CORRUGADORA"], "metric": "power_consumption_kw",
+                 "desde": "2025-01-01 00:00:00", "hasta": "2025-02-01 00:00:00", "max_points": 500}
+        """
+        try:
+            data = http.request.jsonrequest or {}
+            env = http.request.env
+
+            metric = data.get('metric')
+            desde = data.get('desde')
+            hasta = data.get('hasta')
+            if not metric or not desde or not hasta:
+                return {
+                    'status': 'error',
+                    'message': 'Faltan campos requeridos (metric, desde, hasta)'
+                }
+
+            Telemetry = env['megastock.machine.telemetry'].sudo()
+            date_from = Telemetry._parse_timestamp(desde)
+            date_to = Telemetry._parse_timestamp(hasta)
+
+            domain = []
+            if data.get('centros'):
+                domain = [('name', 'in', [str(c).upper() for c in data['centros']])]
+            workcenters = env['mrp.workcenter'].sudo().search(domain)
+            if not workcenters:
+                return {
+                    'status': 'error',
+                    'message': 'No se encontraron centros de trabajo'
+                }
+
+            resultado = env['megastock.machine.telemetry.rollup'].sudo().query_series(
+                workcenters.ids, metric, date_from, date_to, int(data.get('max_points') or 500))
+
+            return {
+                'status': 'success',
+                'resolution': resultado['resolution'],
+                'data': {
+                    workcenter.name: [
+                        {'ts': str(inicio), 'min': vmin, 'max': vmax, 'avg': vavg, 'sum': vsum, 'count': n}
+                        for inicio, vmin, vmax, vavg, vsum, n in resultado['series'].get(workcenter.id, [])
+                    ]
+                    for workcenter in workcenters
+                }
+            }
+
+        except Exception as e:
+            _logger.error(f"Error en el endpoint /api/telemetry/series: {str(e)}", exc_info=True)
+            return {
+                'status': 'error',
+                'message': f'Error interno del servidor: {str(e)}'
+            }
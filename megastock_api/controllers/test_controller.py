@@ -1,5 +1,6 @@
 from odoo import http
 import logging
+import time
 
 _logger = logging.getLogger(__name__)
 
@@ -32,6 +33,12 @@ class TestController(http.Controller):
             workcenter.write({
                 'power_consumption_kw': float(valor)
             })
+            # Conservar el histórico para los agregados de telemetría
+            http.request.env['megastock.machine.telemetry'].sudo()._ingest_readings([{
+                'centro': workcenter.name,
+                'ts': time.time(),
+                'metrics': {'power_consumption_kw': float(valor)},
+            }])
             
             return http.request.make_json_response({
                 'status': 'success',
@@ -1,5 +1,6 @@
 from odoo import http
 import logging
+import time
 
 _logger = logging.getLogger(__name__)
 
@@ -39,6 +40,12 @@ class WorkcenterAPIController(http.Controller):
                 workcenter.write({
                     'power_consumption_kw': valor_float
                 })
+                # Conservar el histórico para los agregados de telemetría
+                http.request.env['megastock.machine.telemetry'].sudo()._ingest_readings([{
+                    'centro': workcenter.name,
+                    'ts': time.time(),
+                    'metrics': {'power_consumption_kw': valor_float},
+                }])
                 
                 _logger.info(f"Actualizado consumo energético de {centro} a {valor_float} kW")
                 
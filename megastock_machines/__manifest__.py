@@ -14,7 +14,8 @@ FASE 1 - Máquinas:
 * Dimensiones máximas de procesamiento
 * Capacidades de producción teóricas y reales
 * Estado operacional de máquinas
-* Métricas OEE básicas
+* Métricas OEE desde paradas y procesos (buckets horarios precalculados)
+* Telemetría histórica con agregados por minuto, hora y día y retención configurable
 * Información básica de mantenimiento (fechas e intervalos)
 
 FASE 2 - Operadores y Turnos:
@@ -39,6 +40,8 @@ NOTA: Implementación sin dependencias del módulo 'maintenance' de Odoo
     'data': [
         'security/ir.model.access.csv',
         'data/machine_basic_data.xml',
+        'data/oee_cron_data.xml',
+        'data/telemetry_cron_data.xml',
         # 'data/test_data.xml',  # Comentado para versión simple
         'views/mrp_workcenter_simple_views.xml',  # Solo vista simple
         'views/machine_downtime_views.xml',  # Vista de paradas
@@ -3,6 +3,8 @@
 # Cargar modelo principal con campos de trimado
 from . import mrp_workcenter
 from . import machine_downtime
+from . import machine_oee
+from . import machine_telemetry
 
 # Versiones comentadas temporalmente
 # from . import mrp_workcenter_simple
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Horas hacia atrás que el cron vuelve a calcular (eventos cerrados con retraso)
+OEE_LOOKBACK_HOURS = 48
+
+
+class MachineOeeBucket(models.Model):
+    """Componentes OEE precalculados por máquina y hora
+
+    Cada registro guarda minutos y cantidades sumables de una hora. El OEE de
+    cualquier ventana se obtiene sumando buckets, sin recorrer eventos.
+    """
+    _name = 'megastock.machine.oee.bucket'
+    _description = 'Bucket OEE por Hora MEGASTOCK'
+    _order = 'bucket_start desc'
+
+    workcenter_id = fields.Many2one(
+        'mrp.workcenter',
+        string='Centro de Trabajo',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    bucket_start = fields.Datetime(
+        string='Inicio Hora',
+        required=True,
+        index=True
+    )
+
+    planned_minutes = fields.Float(string='Tiempo Planificado (min)', default=60.0)
+    planned_downtime_minutes = fields.Float(string='Paradas Planificadas (min)')
+    downtime_minutes = fields.Float(string='Paradas No Planificadas (min)')
+    run_minutes = fields.Float(string='Tiempo en Proceso (min)')
+    planned_qty = fields.Float(string='Cantidad Planificada')
+    produced_qty = fields.Float(string='Cantidad Producida')
+    scrap_qty = fields.Float(string='Desperdicio')
+
+    _sql_constraints = [
+        ('workcenter_bucket_unique', 'unique(workcenter_id, bucket_start)',
+         'Solo puede existir un bucket OEE por máquina y hora.'),
+    ]
+
+    @api.model
+    def _rebuild_buckets(self, workcenters, date_from, date_to):
+        """Recalcular los buckets horarios de las máquinas en el rango dado
+
+        Los eventos (paradas y procesos) se reparten entre las horas que
+        solapan; las cantidades se prorratean según el tiempo solapado.
+        """
+        date_from = date_from.replace(minute=0, second=0, microsecond=0)
+        date_to = date_to.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+        ahora = fields.Datetime.now()
+        eventos_por_maquina = workcenters._get_oee_events(date_from, date_to)
+
+        vals_list = []
+        for workcenter in workcenters:
+            buckets = {}
+            for evento in eventos_por_maquina.get(workcenter.id, []):
+                inicio = max(evento['start'], date_from)
+                fin = min(evento['end'], date_to)
+                duracion_total = (evento['end'] - evento['start']).total_seconds()
+                if fin <= inicio or duracion_total <= 0:
+                    continue
+
+                hora = inicio.replace(minute=0, second=0, microsecond=0)
+                while hora < fin:
+                    siguiente = hora + timedelta(hours=1)
+                    solape = (min(fin, siguiente) - max(inicio, hora)).total_seconds()
+                    bucket = buckets.setdefault(hora, {
+                        'planned_downtime_minutes': 0.0,
+                        'downtime_minutes': 0.0,
+                        'run_minutes': 0.0,
+                        'planned_qty': 0.0,
+                        'produced_qty': 0.0,
+                        'scrap_qty': 0.0,
+                    })
+                    if evento['type'] == 'planned_downtime':
+                        bucket['planned_downtime_minutes'] += solape / 60.0
+                    elif evento['type'] == 'downtime':
+                        bucket['downtime_minutes'] += solape / 60.0
+                    else:
+                        fraccion = solape / duracion_total
+                        bucket['run_minutes'] += solape / 60.0
+                        bucket['planned_qty'] += evento.get('planned_qty', 0.0) * fraccion
+                        bucket['produced_qty'] += evento.get('produced_qty', 0.0) * fraccion
+                        bucket['scrap_qty'] += evento.get('scrap_qty', 0.0) * fraccion
+                    hora = siguiente
+
+            # Toda hora transcurrida del rango es tiempo planificado, aunque no tenga eventos
+            hora = date_from
+            while hora < date_to:
+                vals = buckets.get(hora, {})
+                vals.update({
+                    'workcenter_id': workcenter.id,
+                    'bucket_start': hora,
+                    'planned_minutes': max(0.0, min(60.0, (ahora - hora).total_seconds() / 60.0)),
+                })
+                vals_list.append(vals)
+                hora += timedelta(hours=1)
+
+        self.search([
+            ('workcenter_id', 'in', workcenters.ids),
+            ('bucket_start', '>=', date_from),
+            ('bucket_start', '<', date_to),
+        ]).unlink()
+        return self.create(vals_list)
+
+    @api.model
+    def _aggregate(self, workcenters, date_from, date_to):
+        """Sumar los componentes OEE por máquina en una ventana
+
+        Returns:
+            dict: {workcenter_id: {campo: suma}} solo para máquinas con buckets
+        """
+        campos = ['planned_minutes', 'planned_downtime_minutes', 'downtime_minutes',
+                  'run_minutes', 'planned_qty', 'produced_qty', 'scrap_qty']
+        grupos = self.read_group(
+            [('workcenter_id', 'in', workcenters.ids),
+             ('bucket_start', '>=', date_from),
+             ('bucket_start', '<', date_to)],
+            campos,
+            ['workcenter_id'],
+        )
+        return {
+            grupo['workcenter_id'][0]: {campo: grupo[campo] or 0.0 for campo in campos}
+            for grupo in grupos
+        }
+
+    @api.model
+    def _oee_from_totals(self, totales, performance_default=100.0):
+        """Calcular disponibilidad, rendimiento, calidad y OEE (en %) desde sumas de buckets"""
+        tiempo_operativo = totales['planned_minutes'] - totales['planned_downtime_minutes']
+        if tiempo_operativo > 0:
+            availability = max(0.0, (tiempo_operativo - totales['downtime_minutes']) / tiempo_operativo) * 100.0
+        else:
+            availability = 0.0
+
+        if totales['planned_qty']:
+            performance = min(1.0, totales['produced_qty'] / totales['planned_qty']) * 100.0
+        else:
+            performance = performance_default
+
+        if totales['produced_qty']:
+            quality = max(0.0, (totales['produced_qty'] - totales['scrap_qty']) / totales['produced_qty']) * 100.0
+        else:
+            quality = 100.0
+
+        return {
+            'availability': availability,
+            'performance': performance,
+            'quality': quality,
+            'oee': availability * performance * quality / 10000.0,
+        }
+
+    @api.model
+    def _cron_update_oee_buckets(self):
+        """Cron: recalcular las últimas horas de buckets y refrescar el OEE de las máquinas"""
+        ahora = fields.Datetime.now()
+        workcenters = self.env['mrp.workcenter'].search([])
+        if not workcenters:
+            return
+        self._rebuild_buckets(workcenters, ahora - timedelta(hours=OEE_LOOKBACK_HOURS), ahora)
+        # Escribir la marca de tiempo dispara el recálculo de los campos OEE almacenados
+        workcenters.write({'oee_last_update': ahora})
+        _logger.info("Buckets OEE actualizados para %s máquinas", len(workcenters))
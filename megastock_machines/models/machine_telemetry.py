@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+from datetime import datetime, timedelta, timezone
+from psycopg2.extras import execute_values
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Máximo de lecturas aceptadas por llamada de ingesta
+MAX_LECTURAS_POR_LOTE = 10000
+
+# Resoluciones de agregación: (código, segundos por bucket, unidad date_trunc)
+RESOLUCIONES = [
+    ('1m', 60, 'minute'),
+    ('1h', 3600, 'hour'),
+    ('1d', 86400, 'day'),
+]
+
+# Minutos hacia atrás que el cron vuelve a agregar (lecturas que llegan con retraso)
+ROLLUP_LOOKBACK_MINUTES = 120
+
+# Retención por defecto en días (configurable en ir.config_parameter); 0 = sin límite
+RETENCION_DEFAULT = {
+    'raw': 7,
+    '1m': 30,
+    '1h': 400,
+    '1d': 0,
+}
+
+
+class MachineTelemetry(models.Model):
+    """Serie de tiempo compacta de lecturas de máquinas
+
+    Sin columnas de auditoría: cada fila es (máquina, métrica, instante, valor).
+    Las filas se insertan en bloque por SQL desde _ingest_readings.
+    """
+    _name = 'megastock.machine.telemetry'
+    _description = 'Telemetría de Máquinas MEGASTOCK'
+    _order = 'timestamp desc'
+    _log_access = False
+
+    workcenter_id = fields.Many2one(
+        'mrp.workcenter',
+        string='Centro de Trabajo',
+        required=True,
+        ondelete='cascade'
+    )
+    metric = fields.Char(string='Métrica', required=True)
+    timestamp = fields.Datetime(string='Instante', required=True)
+    value = fields.Float(string='Valor')
+
+    def init(self):
+        tools.create_index(
+            self._cr, 'megastock_machine_telemetry_wc_metric_ts_idx',
+            self._table, ['workcenter_id', 'metric', 'timestamp']
+        )
+        # Agregación y retención filtran solo por instante; la tabla es de solo inserción
+        tools.create_index(
+            self._cr, 'megastock_machine_telemetry_ts_brin_idx',
+            self._table, ['timestamp'], method='brin'
+        )
+
+    @api.model
+    def _parse_timestamp(self, valor):
+        """Convertir epoch (segundos) o texto ISO a datetime UTC sin zona"""
+        if isinstance(valor, (int, float)):
+            return datetime.utcfromtimestamp(valor)
+        if isinstance(valor, str):
+            instante = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+            if instante.tzinfo:
+                instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+            return instante
+        return None
+
+    @api.model
+    def _ingest_readings(self, readings):
+        """Insertar en bloque un lote de lecturas y actualizar el último valor por máquina
+
+        Cada lectura es {'centro', 'ts', 'metric', 'value'} o
+        {'centro', 'ts', 'metrics': {metrica: valor}}. Las lecturas con máquina
+        desconocida, instante o valor inválido se descartan.
+
+        Returns:
+            dict: {'accepted': n, 'rejected': n}
+        """
+        nombres = {str(lectura.get('centro', '')).upper() for lectura in readings}
+        workcenters = self.env['mrp.workcenter'].search([('name', 'in', list(nombres))])
+        ids_por_nombre = {workcenter.name.upper(): workcenter.id for workcenter in workcenters}
+
+        filas = []
+        rechazadas = 0
+        for lectura in readings:
+            workcenter_id = ids_por_nombre.get(str(lectura.get('centro', '')).upper())
+            metricas = lectura.get('metrics') or {lectura.get('metric'): lectura.get('value')}
+            try:
+                instante = self._parse_timestamp(lectura.get('ts'))
+            except (ValueError, TypeError, OverflowError):
+                instante = None
+            for metrica, valor in metricas.items():
+                if not workcenter_id or not instante or not metrica:
+                    rechazadas += 1
+                    continue
+                try:
+                    filas.append((workcenter_id, str(metrica), instante, float(valor)))
+                except (ValueError, TypeError):
+                    rechazadas += 1
+
+        if filas:
+            execute_values(
+                self._cr._obj,
+                f"INSERT INTO {self._table} (workcenter_id, metric, timestamp, value) VALUES %s",
+                filas,
+                page_size=1000,
+            )
+            self.env['megastock.machine.telemetry.latest']._upsert_latest(filas)
+
+        return {'accepted': len(filas), 'rejected': rechazadas}
+
+
+class MachineTelemetryLatest(models.Model):
+    """Último valor conocido por máquina y métrica (caché de lectura rápida)"""
+    _name = 'megastock.machine.telemetry.latest'
+    _description = 'Último Valor de Telemetría MEGASTOCK'
+    _order = 'workcenter_id, metric'
+    _log_access = False
+
+    workcenter_id = fields.Many2one(
+        'mrp.workcenter',
+        string='Centro de Trabajo',
+        required=True,
+        ondelete='cascade'
+    )
+    metric = fields.Char(string='Métrica', required=True)
+    timestamp = fields.Datetime(string='Instante', required=True)
+    value = fields.Float(string='Valor')
+
+    _sql_constraints = [
+        ('workcenter_metric_unique', 'unique(workcenter_id, metric)',
+         'Solo puede existir un último valor por máquina y métrica.'),
+    ]
+
+    @api.model
+    def _upsert_latest(self, filas):
+        """Guardar la lectura más reciente de cada (máquina, métrica) del lote
+
+        Una lectura atrasada nunca sobrescribe un valor más nuevo.
+        """
+        ultimas = {}
+        for workcenter_id, metrica, instante, valor in filas:
+            clave = (workcenter_id, metrica)
+            if clave not in ultimas or instante >= ultimas[clave][2]:
+                ultimas[clave] = (workcenter_id, metrica, instante, valor)
+
+        execute_values(
+            self._cr._obj,
+            f"""
+            INSERT INTO {self._table} (workcenter_id, metric, timestamp, value) VALUES %s
+            ON CONFLICT (workcenter_id, metric) DO UPDATE
+               SET timestamp = EXCLUDED.timestamp, value = EXCLUDED.value
+             WHERE {self._table}.timestamp <= EXCLUDED.timestamp
+            """,
+            list(ultimas.values()),
+        )
+        self.invalidate_model(['timestamp', 'value'])
+
+    @api.model
+    def get_latest(self, workcenter_ids=None):
+        """Últimos valores agrupados por máquina: {workcenter_id: {metrica: (instante, valor)}}"""
+        query = f"SELECT workcenter_id, metric, timestamp, value FROM {self._table}"
+        params = []
+        if workcenter_ids:
+            query += " WHERE workcenter_id IN %s"
+            params.append(tuple(workcenter_ids))
+        self._cr.execute(query, params)
+
+        resultado = {}
+        for workcenter_id, metrica, instante, valor in self._cr.fetchall():
+            resultado.setdefault(workcenter_id, {})[metrica] = (instante, valor)
+        return resultado
+
+
+class MachineTelemetryRollup(models.Model):
+    """Agregados de telemetría por minuto, hora y día (min, max, promedio, suma)
+
+    Los agregados por minuto se calculan desde las lecturas crudas; los
+    horarios desde los de minuto y los diarios desde los horarios, para que
+    sobrevivan a la retención de los niveles más finos.
+    """
+    _name = 'megastock.machine.telemetry.rollup'
+    _description = 'Agregados de Telemetría MEGASTOCK'
+    _order = 'bucket_start desc'
+    _log_access = False
+
+    workcenter_id = fields.Many2one(
+        'mrp.workcenter',
+        string='Centro de Trabajo',
+        required=True,
+        ondelete='cascade'
+    )
+    metric = fields.Char(string='Métrica', required=True)
+    resolution = fields.Selection([
+        ('1m', '1 Minuto'),
+        ('1h', '1 Hora'),
+        ('1d', '1 Día'),
+    ], string='Resolución', required=True)
+    bucket_start = fields.Datetime(string='Inicio', required=True)
+    value_min = fields.Float(string='Mínimo')
+    value_max = fields.Float(string='Máximo')
+    value_avg = fields.Float(string='Promedio')
+    value_sum = fields.Float(string='Suma')
+    value_count = fields.Integer(string='Lecturas')
+
+    _sql_constraints = [
+        ('rollup_bucket_unique', 'unique(workcenter_id, metric, resolution, bucket_start)',
+         'Solo puede existir un agregado por máquina, métrica, resolución e inicio.'),
+    ]
+
+    def init(self):
+        # Los niveles 1h/1d y la retención recorren una resolución por rango de inicio
+        tools.create_index(
+            self._cr, 'megastock_machine_telemetry_rollup_res_bucket_idx',
+            self._table, ['resolution', 'bucket_start']
+        )
+
+    @api.model
+    def _get_retention_days(self, nivel):
+        """Días de retención del nivel ('raw', '1m', '1h', '1d'); 0 = sin límite"""
+        valor = self.env['ir.config_parameter'].sudo().get_param(
+            f'megastock.telemetry_retencion_{nivel}_dias', RETENCION_DEFAULT[nivel])
+        return int(valor)
+
+    @api.model
+    def _rollup(self, desde):
+        """Recalcular los agregados de todas las resoluciones desde el instante dado"""
+        tabla_raw = self.env['megastock.machine.telemetry']._table
+        conflicto = f"""
+            ON CONFLICT (workcenter_id, metric, resolution, bucket_start) DO UPDATE
+               SET value_min = EXCLUDED.value_min, value_max = EXCLUDED.value_max,
+                   value_avg = EXCLUDED.value_avg, value_sum = EXCLUDED.value_sum,
+                   value_count = EXCLUDED.value_count
+        """
+        self._cr.execute(f"""
+            INSERT INTO {self._table}
+                   (workcenter_id, metric, resolution, bucket_start,
+                    value_min, value_max, value_avg, value_sum, value_count)
+            SELECT workcenter_id, metric, '1m', date_trunc('minute', timestamp),
+                   MIN(value), MAX(value), AVG(value), SUM(value), COUNT(*)
+              FROM {tabla_raw}
+             WHERE timestamp >= date_trunc('minute', %s::timestamp)
+             GROUP BY workcenter_id, metric, date_trunc('minute', timestamp)
+            {conflicto}
+        """, (desde,))
+
+        for (origen, _seg, _unidad), (destino, _seg_destino, unidad) in zip(RESOLUCIONES, RESOLUCIONES[1:]):
+            self._cr.execute(f"""
+                INSERT INTO {self._table}
+                       (workcenter_id, metric, resolution, bucket_start,
+                        value_min, value_max, value_avg, value_sum, value_count)
+                SELECT workcenter_id, metric, %s, date_trunc(%s, bucket_start),
+                       MIN(value_min), MAX(value_max),
+                       SUM(value_sum) / NULLIF(SUM(value_count), 0),
+                       SUM(value_sum), SUM(value_count)
+                  FROM {self._table}
+                 WHERE resolution = %s
+                   AND bucket_start >= date_trunc(%s, %s::timestamp)
+                 GROUP BY workcenter_id, metric, date_trunc(%s, bucket_start)
+                {conflicto}
+            """, (destino, unidad, origen, unidad, desde, unidad))
+        self.invalidate_model()
+
+    @api.model
+    def _apply_retention(self):
+        """Borrar lecturas crudas y agregados más antiguos que su retención"""
+        ahora = fields.Datetime.now()
+        dias_raw = self._get_retention_days('raw')
+        if dias_raw:
+            self._cr.execute(
+                f"DELETE FROM {self.env['megastock.machine.telemetry']._table} WHERE timestamp < %s",
+                (ahora - timedelta(days=dias_raw),))
+        for resolucion, _seg, _unidad in RESOLUCIONES:
+            dias = self._get_retention_days(resolucion)
+            if dias:
+                self._cr.execute(
+                    f"DELETE FROM {self._table} WHERE resolution = %s AND bucket_start < %s",
+                    (resolucion, ahora - timedelta(days=dias)))
+        self.invalidate_model()
+
+    @api.model
+    def _cron_rollup_telemetry(self):
+        """Cron: agregar las lecturas recientes y aplicar la retención"""
+        self._rollup(fields.Datetime.now() - timedelta(minutes=ROLLUP_LOOKBACK_MINUTES))
+        self._apply_retention()
+
+    @api.model
+    def _pick_resolution(self, date_from, date_to, max_points=500):
+        """Resolución más fina que entrega como máximo max_points y aún conserva la ventana
+
+        Las lecturas crudas se suponen a lo sumo una por segundo.
+        """
+        segundos = max((date_to - date_from).total_seconds(), 1)
+        ahora = fields.Datetime.now()
+        for nivel, paso in [('raw', 1)] + [(r, seg) for r, seg, _u in RESOLUCIONES]:
+            dias = self._get_retention_days(nivel)
+            conservado = not dias or date_from >= ahora - timedelta(days=dias)
+            if conservado and segundos / paso <= max_points:
+                return nivel
+        return RESOLUCIONES[-1][0]
+
+    @api.model
+    def query_series(self, workcenter_ids, metric, date_from, date_to, max_points=500):
+        """Serie de una métrica usando el nivel de agregación adecuado para la ventana
+
+        Returns:
+            dict: {'resolution', 'series': {workcenter_id: [(inicio, min, max, avg, sum, count)]}}
+        """
+        resolucion = self._pick_resolution(date_from, date_to, max_points)
+        if resolucion == 'raw':
+            self._cr.execute(f"""
+                SELECT workcenter_id, timestamp, value, value, value, value, 1
+                  FROM {self.env['megastock.machine.telemetry']._table}
+                 WHERE workcenter_id IN %s AND metric = %s AND timestamp >= %s AND timestamp < %s
+                 ORDER BY workcenter_id, timestamp
+            """, (tuple(workcenter_ids), metric, date_from, date_to))
+        else:
+            self._cr.execute(f"""
+                SELECT workcenter_id, bucket_start, value_min, value_max, value_avg, value_sum, value_count
+                  FROM {self._table}
+                 WHERE workcenter_id IN %s AND metric = %s AND resolution = %s
+                   AND bucket_start >= %s AND bucket_start < %s
+                 ORDER BY workcenter_id, bucket_start
+            """, (tuple(workcenter_ids), metric, resolucion, date_from, date_to))
+
+        series = {}
+        for workcenter_id, *punto in self._cr.fetchall():
+            series.setdefault(workcenter_id, []).append(tuple(punto))
+        return {'resolution': resolucion, 'series': series}
+
+    @api.model
+    def get_energy_kwh(self, workcenter_ids, date_from, date_to, metric='power_consumption_kw'):
+        """Energía (kWh) por máquina integrando la potencia promedio de cada bucket
+
+        Pensado para costo energético por orden o turno sobre ventanas largas.
+        """
+        resultado = self.query_series(workcenter_ids, metric, date_from, date_to)
+        pasos = {r: seg for r, seg, _u in RESOLUCIONES}
+        energia = {}
+        for workcenter_id, puntos in resultado['series'].items():
+            if resultado['resolution'] == 'raw':
+                # Potencia constante entre lecturas consecutivas (la última hasta date_to)
+                instantes = [p[0] for p in puntos] + [date_to]
+                energia[workcenter_id] = sum(
+                    punto[3] * (instantes[i + 1] - instantes[i]).total_seconds() / 3600.0
+                    for i, punto in enumerate(puntos)
+                )
+            else:
+                horas_bucket = pasos[resultado['resolution']] / 3600.0
+                energia[workcenter_id] = sum(punto[3] * horas_bucket for punto in puntos)
+        return energia
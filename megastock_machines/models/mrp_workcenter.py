@@ -145,6 +145,18 @@ class MrpWorkcenter(models.Model):
         store=True
     )
     
+    oee_window_hours = fields.Integer(
+        string='Ventana OEE (horas)',
+        help='Horas hacia atrás que se suman de los buckets OEE para las métricas de la máquina',
+        default=24
+    )
+
+    oee_last_update = fields.Datetime(
+        string='Última Actualización OEE',
+        readonly=True,
+        help='Momento del último recálculo de buckets OEE'
+    )
+
     # Operadores Asignados (solo dependencia de HR que ya está incluida)
     operator_ids = fields.Many2many(
         'hr.employee',
@@ -180,10 +192,33 @@ class MrpWorkcenter(models.Model):
             else:
                 record.real_capacity = 0.0
     
-    @api.depends('machine_status', 'time_efficiency')
+    @api.depends('machine_status', 'time_efficiency', 'oee_window_hours', 'oee_last_update')
     def _compute_oee_metrics(self):
-        """Calcular métricas OEE básicas basadas en estado de máquina"""
+        """Calcular métricas OEE desde los buckets de eventos de la ventana configurada
+
+        Las máquinas sin buckets (motor OEE aún sin datos) usan valores básicos
+        según su estado.
+        """
+        Bucket = self.env['megastock.machine.oee.bucket']
+        totales_por_maquina = {}
+        ahora = fields.Datetime.now()
+        maquinas = self.filtered('id')
+        for window_hours in set(maquinas.mapped('oee_window_hours')):
+            grupo = maquinas.filtered(lambda r: r.oee_window_hours == window_hours)
+            totales_por_maquina.update(
+                Bucket._aggregate(grupo, ahora - timedelta(hours=window_hours or 24), ahora)
+            )
+
         for record in self:
+            totales = totales_por_maquina.get(record.id)
+            if totales:
+                oee = Bucket._oee_from_totals(totales, performance_default=record.time_efficiency or 100.0)
+                record.oee_availability = oee['availability']
+                record.oee_performance = oee['performance']
+                record.oee_quality = oee['quality']
+                record.oee_overall = oee['oee']
+                continue
+
             # Valores básicos según estado de máquina
             if record.machine_status == 'operational':
                 record.oee_availability = 95.0
@@ -320,6 +355,52 @@ class MrpWorkcenter(models.Model):
 
         return True, "OK"
 
+    def _get_oee_events(self, date_from, date_to):
+        """Eventos que alimentan los buckets OEE de cada máquina
+
+        Devuelve paradas (planificadas o no) y procesos con sus cantidades.
+        Otros módulos extienden este método para aportar sus procesos.
+
+        Returns:
+            dict: {workcenter_id: [{'start', 'end', 'type', 'planned_qty', 'produced_qty', 'scrap_qty'}]}
+        """
+        ahora = fields.Datetime.now()
+        eventos = {workcenter.id: [] for workcenter in self}
+        paradas = self.env['megastock.machine.downtime'].search([
+            ('workcenter_id', 'in', self.ids),
+            ('state', '!=', 'cancelled'),
+            ('start_time', '<', date_to),
+            '|', ('end_time', '=', False), ('end_time', '>', date_from),
+        ])
+        for parada in paradas:
+            eventos[parada.workcenter_id.id].append({
+                'start': parada.start_time,
+                'end': parada.end_time or ahora,
+                'type': 'planned_downtime' if parada.category == 'planned' else 'downtime',
+            })
+        return eventos
+
+    def get_oee_summary(self, date_from=None, date_to=None):
+        """OEE por máquina en una ventana arbitraria leyendo solo los buckets precalculados"""
+        Bucket = self.env['megastock.machine.oee.bucket']
+        date_to = date_to or fields.Datetime.now()
+        date_from = date_from or date_to - timedelta(hours=24)
+        totales_por_maquina = Bucket._aggregate(self, date_from, date_to)
+
+        resumen = {}
+        for record in self:
+            totales = totales_por_maquina.get(record.id)
+            if not totales:
+                continue
+            oee = Bucket._oee_from_totals(totales, performance_default=record.time_efficiency or 100.0)
+            oee.update({
+                'workcenter_name': record.name,
+                'run_minutes': totales['run_minutes'],
+                'downtime_minutes': totales['downtime_minutes'],
+            })
+            resumen[record.id] = oee
+        return resumen
+
     def action_view_trimming_parameters(self):
         """Mostrar parámetros de trimado en mensaje emergente"""
         self.ensure_one()
@@ -24,6 +24,7 @@ Funcionalidades:
         'mrp',
         'mail',
         'megastock_base',
+        'megastock_machines',
     ],
     'data': [
         'security/ir.model.access.csv',
@@ -39,6 +40,7 @@ Funcionalidades:
         'views/proceso_empaque_views.xml',
         'views/proceso_almacenamiento_views.xml',
         'views/work_order_views.xml',
+        'views/mrp_workcenter_views.xml',
         'wizards/requiere_doblez_wizard_views.xml',
         'wizards/generar_ordenes_wizard_views.xml',
         'views/order_import_wizard_views.xml',
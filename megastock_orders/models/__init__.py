@@ -2,6 +2,7 @@
 
 from . import production_order
 from . import work_order
+from . import mrp_workcenter
 from . import bobina
 from . import paper_recipe
 from . import weight_calculator
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields
+
+# Proceso MEGASTOCK -> (modelo, campo producido, campo desperdicio)
+# Los procesos sin cantidades solo aportan tiempo en proceso al OEE.
+PROCESOS_OEE = {
+    'preprinter': ('megastock.proceso.preprinter', 'planchas_procesadas', 'suma_total_desperdicios'),
+    'microcorrugado': ('megastock.proceso.microcorrugado', 'cantidad_entregada', 'sumatoria_total_desperdicios'),
+    'dobladora': ('megastock.proceso.dobladora', None, None),
+    'corte_ceja': ('megastock.proceso.corte.ceja', None, None),
+    'corte_guillotina': ('megastock.proceso.corte.guillotina', None, None),
+    'empaque': ('megastock.proceso.empaque', None, None),
+}
+
+
+class MrpWorkcenter(models.Model):
+    _inherit = 'mrp.workcenter'
+
+    proceso_oee = fields.Selection([
+        ('preprinter', 'Preprinter'),
+        ('microcorrugado', 'Microcorrugado'),
+        ('dobladora', 'Dobladora'),
+        ('corte_ceja', 'Corte de Ceja'),
+        ('corte_guillotina', 'Corte de Guillotina'),
+        ('empaque', 'Empaque'),
+    ], string='Proceso MEGASTOCK', help='Proceso cuyos inicios y finalizaciones alimentan el OEE de esta máquina')
+
+    def _get_oee_events(self, date_from, date_to):
+        """Agregar los procesos MEGASTOCK como eventos de producción
+
+        Un proceso se imputa a la corrugadora de su orden de trabajo si la tiene;
+        si no, a la máquina configurada con ese proceso.
+        """
+        eventos = super()._get_oee_events(date_from, date_to)
+        ahora = fields.Datetime.now()
+
+        for proceso, (modelo, campo_producido, campo_desperdicio) in PROCESOS_OEE.items():
+            maquinas_proceso = self.filtered(lambda w: w.proceso_oee == proceso)
+            domain = [
+                ('fecha_inicio', '<', date_to),
+                '|', ('fecha_fin', '=', False), ('fecha_fin', '>', date_from),
+            ]
+            if proceso == 'microcorrugado' and not maquinas_proceso:
+                domain.append(('work_order_id.workcenter_id', 'in', self.ids))
+            elif not maquinas_proceso:
+                continue
+
+            for registro in self.env[modelo].search(domain):
+                workcenter = False
+                if proceso == 'microcorrugado':
+                    workcenter = registro.work_order_id.workcenter_id
+                workcenter = workcenter or maquinas_proceso[:1]
+                if not workcenter or workcenter.id not in eventos:
+                    continue
+
+                evento = {
+                    'start': registro.fecha_inicio,
+                    'end': registro.fecha_fin or ahora,
+                    'type': 'run',
+                }
+                if campo_producido:
+                    evento.update({
+                        'planned_qty': sum(registro.work_order_id.production_order_ids.mapped('cantidad_planificada')),
+                        'produced_qty': registro[campo_producido] or 0.0,
+                        'scrap_qty': registro[campo_desperdicio] or 0.0,
+                    })
+                eventos[workcenter.id].append(evento)
+        return eventos
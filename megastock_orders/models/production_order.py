@@ -4,6 +4,12 @@ from odoo import models, fields, api
 from datetime import datetime
 import math
 
+# Tiempos de cambio en corrugadora (minutos) para la secuenciación de grupos.
+# El reposicionamiento de cuchillas usa tiempo_setup_cuchilla_min de cada máquina.
+TIEMPO_CAMBIO_BOBINA_MIN = 10
+TIEMPO_CAMBIO_FLAUTA_MIN = 20
+TIEMPO_CAMBIO_TEST_MIN = 10
+
 class ProductionOrder(models.Model):
     _name = 'megastock.production.order'
     _description = 'Orden de Producción MEGASTOCK'
@@ -249,6 +255,9 @@ class ProductionOrder(models.Model):
     cantidad_planificada = fields.Integer(string='Cantidad Planificada', help='Cantidad que se producirá según la planificación: cortes_planificados * cavidad_efectiva')
     cavidad_optimizada = fields.Integer(string='Cavidad Optimizada', help='Multiplicador de cavidad óptimo encontrado por el algoritmo de optimización', group_operator='max')
     faltante = fields.Integer(string='Faltante', compute='_compute_faltante', store=True, help='Cantidad faltante: cantidad solicitada - cantidad planificada')
+    maquina_id = fields.Many2one('mrp.workcenter', string='Corrugadora Asignada', help='Corrugadora asignada al grupo por la planificación multi-máquina')
+    tiempo_corrida_min = fields.Float(string='Tiempo de Corrida (min)', help='Tiempo estimado de corrida del grupo en la corrugadora asignada; los cambios entre grupos se calculan al secuenciar')
+    secuencia_corrugadora = fields.Integer(string='Secuencia en Corrugadora', help='Posición del grupo en la corrugadora asignada, ordenada para minimizar cambios de cuchillas, bobina, flauta y test')
 
     # Campos para manejo de pedidos temporales en replanificación
     es_temporal = fields.Boolean(string='Es Temporal', default=False, help='Indica si este pedido es temporal creado para replanificar faltantes >= limite_faltante')
@@ -940,6 +949,9 @@ class ProductionOrder(models.Model):
             'cortes_planificados': 0,
             'cantidad_planificada': 0,
             'cavidad_optimizada': False,  # Usar False en lugar de 0 para evitar división por 0
+            'maquina_id': False,
+            'tiempo_corrida_min': 0,
+            'secuencia_corrugadora': 0,
         })
 
     def _eliminar_pedidos_temporales(self, pedidos_temporales):
@@ -1738,6 +1750,195 @@ class ProductionOrder(models.Model):
                 'iteraciones': iteracion
             }
 
+    def _asignar_grupos_a_maquinas(self, ordenes, maquinas):
+        """Asigna los grupos planificados a las corrugadoras balanceando el tiempo de corrida
+
+        Cada grupo se valida contra los parámetros de trimado de cada máquina:
+        el ancho utilizado debe caber en el ancho disponible (can_process_order),
+        la bobina no puede exceder el ancho útil, el refilio estándar debe caber
+        en la bobina, una dupla requiere 2 cuchillas y la máquina debe tener
+        velocidad máxima configurada.
+
+        El tiempo de corrida de un grupo es el largo de la corrida (las pistas de
+        una dupla corren en paralelo) entre la velocidad máxima de la máquina.
+        El setup de cuchillas no se suma aquí: depende del grupo anterior y lo
+        calcula _secuenciar_grupos_por_maquina. Los grupos se asignan con la
+        regla LPT: del más largo al más corto, cada uno a la máquina factible
+        que termina antes.
+
+        Args:
+            ordenes: Recordset de órdenes planificadas (con grupo_planificacion)
+            maquinas: Recordset de mrp.workcenter (corrugadoras)
+
+        Returns:
+            dict: carga en minutos por máquina y grupos sin máquina factible
+        """
+        parametros = [maquina.get_trimming_parameters() for maquina in maquinas]
+        carga = {params['workcenter_id']: 0.0 for params in parametros}
+
+        grupos = {}
+        for orden in ordenes.filtered(lambda o: o.grupo_planificacion):
+            grupos.setdefault(orden.grupo_planificacion, self.env['megastock.production.order'])
+            grupos[orden.grupo_planificacion] |= orden
+
+        # Tiempo de corrida de cada grupo en cada máquina factible
+        candidatos = []
+        for grupo, ordenes_grupo in grupos.items():
+            ancho_utilizado = max(ordenes_grupo.mapped('ancho_utilizado'))
+            bobina = max(ordenes_grupo.mapped('bobina_utilizada'))
+            metros = max(ordenes_grupo.mapped('metros_lineales_planificados'))
+            pistas = len(ordenes_grupo)
+
+            tiempos = {}
+            for maquina, params in zip(maquinas, parametros):
+                puede_procesar, _mensaje = maquina.can_process_order(ancho_utilizado)
+                if not puede_procesar:
+                    continue
+                if params['ancho_util_mm'] and bobina > params['ancho_util_mm']:
+                    continue
+                if ancho_utilizado + params['refilio_estandar_mm'] > bobina:
+                    continue
+                if pistas > (params['num_cuchillas'] or 1):
+                    continue
+                if not params['velocidad_maxima_mmin']:
+                    continue
+                tiempos[params['workcenter_id']] = metros / params['velocidad_maxima_mmin']
+
+            candidatos.append((grupo, ordenes_grupo, tiempos))
+
+        # LPT: primero los grupos con mayor tiempo de corrida
+        candidatos.sort(key=lambda c: max(c[2].values()) if c[2] else 0, reverse=True)
+
+        sin_maquina = []
+        for grupo, ordenes_grupo, tiempos in candidatos:
+            if not tiempos:
+                sin_maquina.append(grupo)
+                ordenes_grupo.write({'maquina_id': False, 'tiempo_corrida_min': 0})
+                continue
+            workcenter_id = min(tiempos, key=lambda wc: (carga[wc] + tiempos[wc], wc))
+            carga[workcenter_id] += tiempos[workcenter_id]
+            ordenes_grupo.write({
+                'maquina_id': workcenter_id,
+                'tiempo_corrida_min': round(tiempos[workcenter_id], 2),
+            })
+
+        return {
+            'carga': carga,
+            'sin_maquina': sin_maquina,
+        }
+
+    def _secuenciar_grupos_por_maquina(self, ordenes):
+        """Ordena los grupos de cada corrugadora para minimizar los tiempos de cambio
+
+        El costo entre dos grupos consecutivos suma el reposicionamiento de cada
+        cuchilla cuyo ancho de pista cambia (tiempo_setup_cuchilla_min), el cambio
+        de bobina y los cambios de flauta o test. La secuencia se construye con
+        vecino más cercano (probando cada grupo como inicio) y se mejora con 2-opt.
+
+        Args:
+            ordenes: Recordset de órdenes planificadas con maquina_id asignada
+
+        Returns:
+            dict: {workcenter_id: (setup_original_min, setup_secuenciado_min)}
+        """
+        grupos_por_maquina = {}
+        for orden in ordenes.filtered(lambda o: o.grupo_planificacion and o.maquina_id):
+            grupos = grupos_por_maquina.setdefault(orden.maquina_id, {})
+            grupos.setdefault(orden.grupo_planificacion, self.env['megastock.production.order'])
+            grupos[orden.grupo_planificacion] |= orden
+
+        resumen = {}
+        for maquina, grupos in grupos_por_maquina.items():
+            setup_cuchilla = maquina.tiempo_setup_cuchilla_min
+            nombres = sorted(grupos)
+            perfiles = [self._perfil_setup_grupo(grupos[nombre]) for nombre in nombres]
+            n = len(perfiles)
+            costo = [[self._costo_setup_entre_grupos(perfiles[i], perfiles[j], setup_cuchilla) for j in range(n)] for i in range(n)]
+
+            ruta = self._ordenar_por_setup(costo)
+            for posicion, indice in enumerate(ruta, 1):
+                grupos[nombres[indice]].write({'secuencia_corrugadora': posicion})
+
+            resumen[maquina.id] = (
+                sum(costo[i][i + 1] for i in range(n - 1)),
+                sum(costo[ruta[i]][ruta[i + 1]] for i in range(n - 1)),
+            )
+        return resumen
+
+    def _perfil_setup_grupo(self, ordenes_grupo):
+        """Datos de un grupo que determinan el setup de la corrugadora"""
+        return {
+            'bobina': max(ordenes_grupo.mapped('bobina_utilizada')),
+            'pistas': sorted(o.ancho_calculado * (o.cavidad_optimizada or 1) for o in ordenes_grupo),
+            'flauta': ordenes_grupo[0].flauta,
+            'test': ordenes_grupo[0].test_name,
+        }
+
+    def _costo_setup_entre_grupos(self, perfil_a, perfil_b, setup_cuchilla):
+        """Minutos de cambio al pasar del grupo A al grupo B (costo simétrico)"""
+        pistas_a = perfil_a['pistas']
+        pistas_b = perfil_b['pistas']
+        cuchillas_movidas = abs(len(pistas_a) - len(pistas_b))
+        cuchillas_movidas += sum(1 for ancho_a, ancho_b in zip(pistas_a, pistas_b) if ancho_a != ancho_b)
+
+        costo = cuchillas_movidas * setup_cuchilla
+        if perfil_a['bobina'] != perfil_b['bobina']:
+            costo += TIEMPO_CAMBIO_BOBINA_MIN
+        if perfil_a['flauta'] != perfil_b['flauta']:
+            costo += TIEMPO_CAMBIO_FLAUTA_MIN
+        if perfil_a['test'] != perfil_b['test']:
+            costo += TIEMPO_CAMBIO_TEST_MIN
+        return costo
+
+    def _ordenar_por_setup(self, costo):
+        """Ruta abierta de costo mínimo sobre una matriz simétrica: vecino más cercano + 2-opt
+
+        Args:
+            costo: Matriz n x n de minutos de cambio entre grupos
+
+        Returns:
+            list: Índices de los grupos en el orden de producción
+        """
+        n = len(costo)
+        if n <= 2:
+            return list(range(n))
+
+        def largo(ruta):
+            return sum(costo[ruta[i]][ruta[i + 1]] for i in range(n - 1))
+
+        mejor_ruta = None
+        mejor_costo = float('inf')
+        for inicio in range(n):
+            ruta = [inicio]
+            pendientes = set(range(n)) - {inicio}
+            while pendientes:
+                actual = ruta[-1]
+                siguiente = min(pendientes, key=lambda j: (costo[actual][j], j))
+                ruta.append(siguiente)
+                pendientes.remove(siguiente)
+            costo_ruta = largo(ruta)
+            if costo_ruta < mejor_costo:
+                mejor_ruta, mejor_costo = ruta, costo_ruta
+
+        # 2-opt: invertir el tramo ruta[i..j] cuando reduce el costo de sus extremos
+        ruta = mejor_ruta
+        mejora = True
+        while mejora:
+            mejora = False
+            for i in range(n - 1):
+                for j in range(i + 1, n):
+                    antes = despues = 0
+                    if i > 0:
+                        antes += costo[ruta[i - 1]][ruta[i]]
+                        despues += costo[ruta[i - 1]][ruta[j]]
+                    if j < n - 1:
+                        antes += costo[ruta[j]][ruta[j + 1]]
+                        despues += costo[ruta[i]][ruta[j + 1]]
+                    if despues < antes:
+                        ruta[i:j + 1] = reversed(ruta[i:j + 1])
+                        mejora = True
+        return ruta
+
     def _encontrar_mejor_combinacion_para_faltante(self, orden_con_faltante, ordenes_disponibles, bobinas, cavidad_limite=1, limite_sobrante=30):
         """Encuentra la mejor combinación para una orden que tiene faltante >= limite_faltante
 
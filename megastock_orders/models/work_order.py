@@ -74,6 +74,8 @@ class WorkOrder(models.Model):
     # Campos de seguimiento
     operador = fields.Many2one('res.users', string='Operador Asignado')
     maquina = fields.Char(string='Máquina')
+    workcenter_id = fields.Many2one('mrp.workcenter', string='Corrugadora', help='Corrugadora asignada por la planificación multi-máquina')
+    secuencia_corrugadora = fields.Integer(string='Secuencia en Corrugadora', help='Orden de producción en la corrugadora que minimiza los cambios de setup')
     turno = fields.Selection([
         ('manana', 'Mañana'),
         ('tarde', 'Tarde'),
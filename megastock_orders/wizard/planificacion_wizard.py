@@ -52,6 +52,15 @@ class PlanificacionWizard(models.TransientModel):
         help='Faltantes mayores o iguales a este valor serán replanificados. Por defecto: 500'
     )
 
+    maquina_ids = fields.Many2many(
+        'mrp.workcenter',
+        string='Corrugadoras',
+        domain="[('name', 'ilike', 'corrugadora')]",
+        help='Corrugadoras disponibles para la planificación. Si se seleccionan, se usan sus '
+             'parámetros de trimado (ancho útil, refilio, cuchillas, velocidad) y los grupos se '
+             'reparten entre ellas balanceando el tiempo de corrida.'
+    )
+
     def action_planificar(self):
         """Ejecuta la planificación con los parámetros ingresados"""
         self.ensure_one()
@@ -85,6 +94,19 @@ class PlanificacionWizard(models.TransientModel):
         # Extraer los anchos de las bobinas seleccionadas y eliminar duplicados
         anchos_seleccionados = list(set(self.bobinas_seleccionadas.mapped('ancho')))
 
+        # Con corrugadoras seleccionadas: descartar bobinas que no entran en ninguna máquina
+        # y usar como margen el mayor refilio estándar para que cada grupo quepa en cualquiera
+        margen = self.margen or 30
+        if self.maquina_ids:
+            ancho_util_maximo = max(self.maquina_ids.mapped('ancho_util_mm'))
+            anchos_seleccionados = [a for a in anchos_seleccionados if a <= ancho_util_maximo]
+            if not anchos_seleccionados:
+                raise UserError(
+                    f'Ninguna de las bobinas seleccionadas cabe en las corrugadoras elegidas '
+                    f'(ancho útil máximo: {ancho_util_maximo}mm).'
+                )
+            margen = max([margen] + self.maquina_ids.mapped('refilio_estandar_mm'))
+
         # Determinar estrategia automáticamente según cantidad de anchos únicos
         bobina_unica = len(anchos_seleccionados) == 1
 
@@ -95,7 +117,7 @@ class PlanificacionWizard(models.TransientModel):
             cavidad_limite=self.cavidad_limite,
             bobina_unica=bobina_unica,
             bobinas_disponibles=anchos_seleccionados,
-            margen_seguridad=self.margen or 30,  # Usar valor ingresado o 30 por defecto
+            margen_seguridad=margen,  # Valor ingresado (30 por defecto) o refilio de las corrugadoras
             limite_faltante=self.limite_faltante,  # Límite configurable para faltantes
             limite_sobrante=self.porcentaje_sobrante  # Límite configurable para sobrante
         )
@@ -113,6 +135,23 @@ class PlanificacionWizard(models.TransientModel):
             mensaje += f'\n\nBobinas disponibles: {bobinas_usadas}'
             mensaje += f'\nCada grupo ha elegido la mejor bobina para minimizar su desperdicio.'
 
+        if self.maquina_ids:
+            # Incluir los pedidos temporales creados para replanificar faltantes
+            ordenes_planificadas = ordenes_pendientes | self.env['megastock.production.order'].search([
+                ('pedido_original_id', 'in', ordenes_pendientes.ids),
+            ])
+            asignacion = ordenes_pendientes[0]._asignar_grupos_a_maquinas(ordenes_planificadas, self.maquina_ids)
+            secuenciacion = ordenes_pendientes[0]._secuenciar_grupos_por_maquina(ordenes_planificadas)
+
+            mensaje += '\n\nCarga por corrugadora:'
+            for maquina in self.maquina_ids:
+                mensaje += f'\n  {maquina.name}: {asignacion["carga"][maquina.id] / 60:.1f}h'
+                if maquina.id in secuenciacion:
+                    setup_original, setup_secuenciado = secuenciacion[maquina.id]
+                    mensaje += f' (cambios: {setup_secuenciado:.0f} min, antes {setup_original:.0f} min)'
+            if asignacion['sin_maquina']:
+                mensaje += f'\nGrupos sin corrugadora compatible: {", ".join(asignacion["sin_maquina"])}'
+
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
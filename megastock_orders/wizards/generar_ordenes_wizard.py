@@ -72,6 +72,9 @@ class GenerarOrdenesWizard(models.TransientModel):
                 'cortes_totales': cortes_totales,
                 'estado': 'programada',
                 'requiere_doblez': self.requiere_doblez,  # Asignar el valor del wizard
+                'workcenter_id': primera_orden.maquina_id.id,
+                'maquina': primera_orden.maquina_id.name or False,
+                'secuencia_corrugadora': primera_orden.secuencia_corrugadora,
             })
 
             # Asociar las órdenes de producción a esta orden de trabajo
@@ -23,6 +23,8 @@
         'data/alert_automation_data.xml',
         'data/cron_jobs_data.xml',
         'views/production_plan_views.xml',
+        'views/scheduling_benchmark_views.xml',
+        'views/setup_matrix_views.xml',
         'views/production_alert_views.xml',
         'views/alert_automation_views.xml',
         'views/dashboard_views.xml',
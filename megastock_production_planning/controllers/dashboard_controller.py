@@ -29,6 +29,9 @@ class ProductionDashboardController(http.Controller):
             # Obtener estadísticas de producción
             production_stats = self._get_production_stats(line_filter)
             
+            # Obtener ocupación programada de los centros
+            occupancy_data = self._get_schedule_occupancy(line_filter)
+            
             return {
                 'success': True,
                 'data': {
@@ -37,6 +40,7 @@ class ProductionDashboardController(http.Controller):
                     'alerts': alerts_data,
                     'queues': queue_data,
                     'production': production_stats,
+                    'occupancy': occupancy_data,
                     'timestamp': fields.Datetime.now().isoformat()
                 }
             }
@@ -240,6 +244,22 @@ class ProductionDashboardController(http.Controller):
             'bottlenecks': bottlenecks
         }
     
+    def _get_schedule_occupancy(self, line_filter, hours=24):
+        """Ocupación programada de cada centro en las próximas horas"""
+        domain = []
+        if line_filter != 'all':
+            domain.append(('production_line_type', '=', line_filter))
+        
+        workcenters = request.env['mrp.workcenter'].search(domain)
+        now = fields.Datetime.now()
+        occupancy = request.env['megastock.production.schedule'].get_workcenter_occupancy(
+            now, now + timedelta(hours=hours), workcenters.ids)
+        
+        names = {workcenter.id: workcenter.name for workcenter in workcenters}
+        for entry in occupancy:
+            entry['workcenter_name'] = names[entry['workcenter_id']]
+        return sorted(occupancy, key=lambda entry: -entry['utilization'])
+    
     def _get_active_alerts(self, line_filter):
         """Obtener alertas activas"""
         alerts = []
@@ -309,13 +329,13 @@ class ProductionDashboardController(http.Controller):
         
         queue_data = []
         for queue in queues:
-            utilization = min(100, (queue.current_items_count / queue.max_capacity * 100)) if queue.max_capacity > 0 else 0
+            utilization = min(100, (queue.current_items_count / queue.max_queue_size * 100)) if queue.max_queue_size > 0 else 0
             
             queue_data.append({
                 'id': queue.id,
                 'name': queue.name,
                 'items_count': queue.current_items_count,
-                'max_capacity': queue.max_capacity,
+                'max_capacity': queue.max_queue_size,
                 'avg_wait_time': queue.average_waiting_time,
                 'utilization': round(utilization, 1),
                 'status': 'active' if queue.state == 'active' else 'inactive'
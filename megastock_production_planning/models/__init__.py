@@ -7,8 +7,12 @@ from . import work_queue
 from . import production_kpi
 from . import planning_rule
 from . import scheduling_algorithm
+from . import scheduling_benchmark
+from . import setup_matrix
 from . import production_analysis
 from . import mrp_production_extended
+from . import mrp_bom
+from . import mrp_workorder
 from . import production_alert
 from . import alert_automation
 from . import production_order
\ No newline at end of file
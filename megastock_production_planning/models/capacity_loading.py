@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Horas por debajo de las cuales un día se considera sin capacidad libre
+CAPACITY_EPSILON = 1e-9
+
+
+def load_finite(jobs, capacity):
+    """Carga finita de trabajos sobre periodos diarios de capacidad
+
+    Los trabajos se cargan en el orden dado. Cada operación de la ruta
+    empieza el día en que terminó la anterior (o en su liberación) y consume
+    las horas libres del centro día por día, partiéndose entre días cuando
+    no cabe en uno. Lo que no cabe antes del fin del horizonte queda como
+    sobrecarga en el último día. Cada operación cuesta O(días) vectorizado
+    con la suma acumulada de horas libres.
+
+    Args:
+        jobs: secuencia de (día de liberación, ((workcenter_id, horas), ...))
+        capacity: {workcenter_id: arreglo (n,) de horas libres por día}; se
+            consume en el lugar. Los centros ausentes no tienen restricción.
+
+    Returns:
+        tuple: (resultados por trabajo {'start', 'end', 'overflow'},
+            {workcenter_id: arreglo (n,) de horas de sobrecarga})
+            overflow es la mayor fracción de una operación que no cupo.
+    """
+    n_days = len(next(iter(capacity.values()))) if capacity else 0
+    overload = {workcenter_id: np.zeros(n_days) for workcenter_id in capacity}
+    results = []
+
+    for release, route in jobs:
+        day = min(max(int(release), 0), max(n_days - 1, 0))
+        start = None
+        overflow = 0.0
+        for workcenter_id, hours in route:
+            free = capacity.get(workcenter_id)
+            if free is None or hours <= 0:
+                continue
+
+            available = np.flatnonzero(free[day:] > CAPACITY_EPSILON)
+            if start is None:
+                start = day + int(available[0]) if len(available) else n_days - 1
+
+            cumulative = np.cumsum(free[day:])
+            last = int(np.searchsorted(cumulative, hours - CAPACITY_EPSILON))
+            if last < len(cumulative):
+                free[day:day + last] = 0.0
+                free[day + last] = max(cumulative[last] - hours, 0.0)
+                day += last
+            else:
+                missing = hours - (cumulative[-1] if len(cumulative) else 0.0)
+                free[day:] = 0.0
+                overload[workcenter_id][-1] += missing
+                overflow = max(overflow, float(missing / hours))
+                day = n_days - 1
+
+        results.append({
+            'start': start if start is not None else day,
+            'end': day,
+            'overflow': overflow,
+        })
+
+    return results, overload
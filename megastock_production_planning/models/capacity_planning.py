@@ -155,7 +155,7 @@ class CapacityPlanning(models.Model):
         """Generar nombre por defecto"""
         return f"Capacidad {datetime.now().strftime('%Y%m%d')}"
     
-    @api.depends('capacity_line_ids')
+    @api.depends('capacity_line_ids.available_hours')
     def _compute_totals(self):
         """Calcular totales de capacidad"""
         for planning in self:
@@ -271,24 +271,47 @@ class CapacityPlanning(models.Model):
     # === MÉTODOS DE ACCIÓN ===
     
     def action_calculate_capacity(self):
-        """Calcular capacidad disponible y requerida"""
-        self.ensure_one()
+        """Calcular capacidad disponible y requerida
         
-        # Limpiar líneas existentes
-        self.capacity_line_ids.unlink()
+        Las líneas existentes se actualizan en su lugar (una por centro de
+        trabajo activo); solo se crean las que faltan y se eliminan las de
+        centros ya inactivos.
+        """
+        self.ensure_one()
         
         # Obtener centros de trabajo activos
         workcenters = self.env['mrp.workcenter'].search([
             ('active', '=', True)
         ])
         
+        required_hours_by_workcenter = self._calculate_required_capacity()
+        
+        lines_by_workcenter = {line.workcenter_id.id: line for line in self.capacity_line_ids}
+        new_lines = []
         for workcenter in workcenters:
-            self._create_capacity_line(workcenter)
+            vals = self._prepare_capacity_line_vals(workcenter)
+            vals['required_hours'] = required_hours_by_workcenter.get(workcenter.id, 0.0)
+            
+            line = lines_by_workcenter.pop(workcenter.id, None)
+            if line is None:
+                vals.update({'capacity_planning_id': self.id, 'workcenter_id': workcenter.id})
+                new_lines.append(vals)
+            else:
+                changed = {name: value for name, value in vals.items() if line[name] != value}
+                if changed:
+                    line.write(changed)
         
-        # Calcular demanda requerida
-        self._calculate_required_capacity()
+        if new_lines:
+            self.env['megastock.capacity.planning.line'].create(new_lines)
+        if lines_by_workcenter:
+            self.env['megastock.capacity.planning.line'].browse(
+                [line.id for line in lines_by_workcenter.values()]
+            ).unlink()
         
-        self.state = 'calculated'
+        self.write({
+            'total_required_hours': sum(required_hours_by_workcenter.values()),
+            'state': 'calculated',
+        })
         
         return {
             'type': 'ir.actions.client',
@@ -300,8 +323,8 @@ class CapacityPlanning(models.Model):
             }
         }
     
-    def _create_capacity_line(self, workcenter):
-        """Crear línea de capacidad para un centro de trabajo"""
+    def _prepare_capacity_line_vals(self, workcenter):
+        """Valores de capacidad disponible de la línea de un centro de trabajo"""
         # Calcular capacidad disponible
         available_hours = self._calculate_available_capacity(workcenter)
         
@@ -310,15 +333,11 @@ class CapacityPlanning(models.Model):
         if self.include_overtime:
             overtime_hours = available_hours * (self.max_overtime_percentage / 100.0)
         
-        return self.env['megastock.capacity.planning.line'].create({
-            'capacity_planning_id': self.id,
-            'workcenter_id': workcenter.id,
+        return {
             'available_hours': available_hours,
             'overtime_hours': overtime_hours,
-            'total_capacity': available_hours + overtime_hours,
             'efficiency_factor': self.efficiency_factor,
-            'effective_capacity': (available_hours + overtime_hours) * (self.efficiency_factor / 100.0)
-        })
+        }
     
     def _calculate_available_capacity(self, workcenter):
         """Calcular capacidad disponible para un centro de trabajo"""
@@ -350,40 +369,34 @@ class CapacityPlanning(models.Model):
             return int(days_diff * 5 / 7)
     
     def _calculate_required_capacity(self):
-        """Calcular capacidad requerida basada en planes de producción"""
-        required_hours_by_workcenter = {}
+        """Calcular capacidad requerida basada en planes de producción
         
-        # Buscar planes de producción activos en el período
-        production_plans = self.env['megastock.production.plan'].search([
-            ('state', 'in', ['confirmed', 'in_progress']),
-            ('date_from', '<=', self.date_to),
-            ('date_to', '>=', self.date_from)
-        ])
+        Una consulta agrupada suma la cantidad planificada por producto en los
+        planes activos del período; las horas por centro salen del mapa
+        BOM→routing en caché (tiempo de ciclo × cantidad).
         
-        for plan in production_plans:
-            for line in plan.plan_line_ids:
-                # Distribuir horas entre centros de trabajo (simplificado)
-                # En implementación real, esto vendría del routing
-                bom = self.env['mrp.bom']._bom_find(product=line.product_id)
-                
-                if bom and bom.routing_id:
-                    for operation in bom.routing_id.operation_ids:
-                        workcenter_id = operation.workcenter_id.id
-                        
-                        if workcenter_id not in required_hours_by_workcenter:
-                            required_hours_by_workcenter[workcenter_id] = 0.0
-                        
-                        # Calcular horas requeridas para esta operación
-                        op_time = (operation.time_cycle * line.planned_quantity) / 60.0
-                        required_hours_by_workcenter[workcenter_id] += op_time
+        Returns:
+            dict: {workcenter_id: horas requeridas}
+        """
+        planned = self.env['megastock.production.plan.line'].read_group([
+            ('plan_id.state', 'in', ['confirmed', 'in_progress']),
+            ('plan_id.date_from', '<=', self.date_to),
+            ('plan_id.date_to', '>=', self.date_from),
+        ], ['planned_quantity:sum'], ['product_id'])
         
-        # Actualizar líneas de capacidad con demanda requerida
-        for line in self.capacity_line_ids:
-            required_hours = required_hours_by_workcenter.get(line.workcenter_id.id, 0.0)
-            line.required_hours = required_hours
+        routing_map = self.env['mrp.bom']._get_routing_load_map()
         
-        # Actualizar total requerido
-        self.total_required_hours = sum(required_hours_by_workcenter.values())
+        required_hours_by_workcenter = {}
+        for group in planned:
+            if not group['product_id']:
+                continue
+            quantity = group['planned_quantity']
+            for workcenter_id, minutes_per_unit in routing_map.get(group['product_id'][0], ()):
+                required_hours_by_workcenter[workcenter_id] = (
+                    required_hours_by_workcenter.get(workcenter_id, 0.0) + minutes_per_unit * quantity / 60.0
+                )
+        
+        return required_hours_by_workcenter
     
     def action_optimize_capacity(self):
         """Optimizar distribución de capacidad"""
@@ -497,6 +510,11 @@ class CapacityPlanningLine(models.Model):
         required=True
     )
     
+    _sql_constraints = [
+        ('planning_workcenter_unique', 'unique(capacity_planning_id, workcenter_id)',
+         'Solo puede existir una línea por centro de trabajo en cada planificación.'),
+    ]
+    
     # === CAPACIDAD DISPONIBLE ===
     available_hours = fields.Float(
         string='Horas Disponibles',
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api, tools
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Campos que entran en el mapa de routing o en los rollups en caché: solo
+# escribirlos invalida las cachés (una nota o el chatter no)
+BOM_CACHE_FIELDS = {
+    'product_qty', 'product_uom_id', 'bom_line_ids', 'routing_id', 'type',
+    'product_id', 'product_tmpl_id', 'active', 'sequence', 'company_id',
+}
+OPERATION_CACHE_FIELDS = {
+    'routing_id', 'workcenter_id', 'time_cycle', 'time_cycle_manual', 'time_mode_batch', 'sequence', 'active',
+}
+BOM_LINE_CACHE_FIELDS = {'bom_id', 'product_id', 'product_qty', 'product_uom_id'}
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    @api.model
+    @tools.ormcache()
+    def _get_routing_load_map(self):
+        """Carga de routing por producto: {product_id: ((workcenter_id, min/unidad), ...)}
+
+        Se arma una sola vez con todas las BOM activas y queda en caché hasta
+        que cambie una BOM u operación. Las BOM de variante tienen prioridad
+        sobre las de plantilla; entre iguales, la de menor secuencia.
+        """
+        boms = self.sudo().search([('type', '=', 'normal')], order='sequence, id')
+        routing_map = {}
+        for variant_specific in (True, False):
+            for bom in boms.filtered(lambda b: bool(b.product_id) == variant_specific):
+                loads = tuple(
+                    (operation.workcenter_id.id, operation.time_cycle)
+                    for operation in bom.routing_id.operation_ids
+                    if operation.workcenter_id
+                )
+                products = bom.product_id or bom.product_tmpl_id.product_variant_ids
+                for product_id in products.ids:
+                    routing_map.setdefault(product_id, loads)
+        _logger.info(f"Mapa BOM→routing construido para {len(routing_map)} productos")
+        return routing_map
+
+    @api.model
+    @tools.ormcache('product_id', 'self.env.company.id')
+    def _get_bom_rollup(self, product_id):
+        """Parte en caché del rollup: solo depende de BOM, operaciones y componentes
+
+        Queda en caché hasta que cambie una BOM, línea de BOM, operación,
+        costo por hora de un centro o precio estándar de un componente. Sin
+        BOM, el costo de material queda en None (ver _get_product_rollup).
+        """
+        product = self.env['product.product'].browse(product_id)
+        bom = self._bom_find(product)[product]
+        rollup = {
+            'has_bom': bool(bom),
+            'has_routing': bool(bom and bom.routing_id),
+            'unit_material_cost': None,
+            'unit_operation_cost': 0.0,
+            'unit_minutes': 0.0,
+            'batch_minutes': 0.0,
+        }
+        if not bom:
+            return rollup
+
+        rollup['unit_material_cost'] = sum(
+            line.product_qty * line.product_id.standard_price for line in bom.bom_line_ids
+        ) / (bom.product_qty or 1.0)
+        for operation in bom.routing_id.operation_ids:
+            rollup['unit_minutes'] += operation.time_cycle
+            rollup['batch_minutes'] += operation.time_mode_batch or 0
+            rollup['unit_operation_cost'] += operation.time_cycle / 60.0 * (operation.workcenter_id.costs_hour or 0)
+        return rollup
+
+    @api.model
+    def _get_product_rollup(self, product_id):
+        """Costos y tiempos unitarios de un producto según su BOM; sin BOM, su precio estándar
+
+        Returns:
+            dict: {'has_bom', 'has_routing', 'unit_material_cost',
+                'unit_operation_cost', 'unit_minutes', 'batch_minutes'}
+        """
+        rollup = self._get_bom_rollup(product_id)
+        if rollup['has_bom']:
+            return rollup
+        return dict(rollup, unit_material_cost=self.env['product.product'].browse(product_id).standard_price)
+
+    @api.model
+    def _get_product_rollups(self, products):
+        """Rollups de varios productos: {product_id: rollup}"""
+        return {product.id: self._get_product_rollup(product.id) for product in products}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if BOM_CACHE_FIELDS.intersection(vals):
+            self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+
+class MrpRoutingWorkcenter(models.Model):
+    _inherit = 'mrp.routing.workcenter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if OPERATION_CACHE_FIELDS.intersection(vals):
+            self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model
+    @tools.ormcache()
+    def _get_component_product_ids(self):
+        """Productos usados como componente en alguna línea de BOM"""
+        groups = self.sudo().read_group([], ['product_id'], ['product_id'])
+        return frozenset(group['product_id'][0] for group in groups if group['product_id'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        result = super().write(vals)
+        if BOM_LINE_CACHE_FIELDS.intersection(vals):
+            self.clear_caches()
+        return result
+
+    def unlink(self):
+        result = super().unlink()
+        self.clear_caches()
+        return result
+
+
+class MrpWorkcenter(models.Model):
+    _inherit = 'mrp.workcenter'
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'costs_hour' in vals:
+            self.clear_caches()
+        return result
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    def write(self, vals):
+        result = super().write(vals)
+        # La valorización AVCO/FIFO escribe el precio en cada recepción: solo
+        # los componentes de alguna BOM entran en los rollups en caché
+        if 'standard_price' in vals and \
+                not self.env['mrp.bom.line']._get_component_product_ids().isdisjoint(self.ids):
+            self.clear_caches()
+        return result
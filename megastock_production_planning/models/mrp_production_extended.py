@@ -1,7 +1,36 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from collections import defaultdict
 from datetime import datetime, timedelta
+import logging
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from .occupancy import BusyCalendar
+from .production_scoring import RISK_LEVELS, score_productions
+from .scheduling_problem import BUSY_SCHEDULE_STATES
+
+_logger = logging.getLogger(__name__)
+
+# Estados de órdenes abiertas que recalcula el servicio de indicadores
+OPEN_PRODUCTION_STATES = ['confirmed', 'planned', 'progress', 'to_close']
+
+# Campos de la orden que cambian sus indicadores al escribirse
+SCORE_TRIGGER_FIELDS = {'date_planned_start', 'date_planned_finished', 'product_qty', 'state'}
+
+# Indicadores que guarda _update_production_scores
+SCORE_FIELDS = [
+    'capacity_utilization', 'risk_level', 'delay_probability', 'priority_score',
+    'production_alerts', 'estimated_completion_date', 'scores_updated_at',
+]
+
+# Margen desde ahora antes de reprogramar una orden retrasada
+RESCHEDULE_BUFFER_HOURS = 2
+
+# Duración asumida de una orden sin routing
+DEFAULT_PRODUCTION_HOURS = 8
 
 class MrpProductionExtended(models.Model):
     _inherit = 'mrp.production'
@@ -51,7 +80,7 @@ class MrpProductionExtended(models.Model):
     # === ANÁLISIS DE CAPACIDAD ===
     capacity_utilization = fields.Float(
         string='Utilización de Capacidad (%)',
-        compute='_compute_capacity_metrics',
+        readonly=True,
         help='Porcentaje de utilización de capacidad planificada'
     )
     
@@ -64,7 +93,7 @@ class MrpProductionExtended(models.Model):
     
     estimated_completion_date = fields.Datetime(
         string='Finalización Estimada',
-        compute='_compute_estimated_completion',
+        readonly=True,
         help='Fecha estimada de finalización basada en capacidad'
     )
     
@@ -90,7 +119,7 @@ class MrpProductionExtended(models.Model):
     # === ALERTAS Y CONTROL ===
     production_alerts = fields.Text(
         string='Alertas de Producción',
-        compute='_compute_production_alerts',
+        readonly=True,
         help='Alertas generadas automáticamente'
     )
     
@@ -99,11 +128,11 @@ class MrpProductionExtended(models.Model):
         ('medium', 'Medio'),
         ('high', 'Alto'),
         ('critical', 'Crítico')
-    ], string='Nivel de Riesgo', compute='_compute_risk_level')
+    ], string='Nivel de Riesgo', readonly=True, index=True)
     
     delay_probability = fields.Float(
         string='Probabilidad de Retraso (%)',
-        compute='_compute_delay_probability',
+        readonly=True,
         help='Probabilidad calculada de retraso'
     )
     
@@ -116,10 +145,16 @@ class MrpProductionExtended(models.Model):
     
     priority_score = fields.Float(
         string='Score de Prioridad',
-        compute='_compute_priority_score',
+        readonly=True,
         help='Score calculado para priorización'
     )
     
+    scores_updated_at = fields.Datetime(
+        string='Indicadores Actualizados',
+        readonly=True,
+        help='Momento del último cálculo de riesgo, prioridad y alertas'
+    )
+    
     # === INTEGRACIÓN CON BOM INTELIGENTES ===
     uses_intelligent_bom = fields.Boolean(
         string='Usa BOM Inteligente',
@@ -166,21 +201,6 @@ class MrpProductionExtended(models.Model):
             else:
                 production.queue_position = 0
     
-    def _compute_capacity_metrics(self):
-        """Calcular métricas de capacidad"""
-        for production in self:
-            if production.routing_id:
-                # Calcular utilización basada en tiempo planificado vs disponible
-                total_time = sum(
-                    (op.time_cycle * production.product_qty) / 60.0
-                    for op in production.routing_id.operation_ids
-                )
-                
-                # Simplificado - en implementación real vendría de análisis de capacidad
-                production.capacity_utilization = min(100.0, total_time / 8.0 * 100)
-            else:
-                production.capacity_utilization = 0.0
-    
     @api.depends('routing_id')
     def _compute_bottleneck_operation(self):
         """Identificar operación cuello de botella"""
@@ -200,28 +220,15 @@ class MrpProductionExtended(models.Model):
             else:
                 production.bottleneck_operation_id = False
     
-    def _compute_estimated_completion(self):
-        """Calcular fecha estimada de finalización"""
-        for production in self:
-            if production.date_planned_start and production.routing_id:
-                total_minutes = sum(
-                    (op.time_cycle * production.product_qty) + (op.time_mode_batch or 0)
-                    for op in production.routing_id.operation_ids
-                )
-                
-                production.estimated_completion_date = production.date_planned_start + \
-                    timedelta(minutes=total_minutes)
-            else:
-                production.estimated_completion_date = production.date_planned_finished
-    
     def _compute_actual_oee(self):
         """Calcular OEE real"""
+        pass_rates = self._get_quality_pass_rates()
         for production in self:
             if production.workorder_ids and production.state == 'done':
                 # Calcular componentes del OEE
                 availability = production._calculate_availability()
                 performance = production._calculate_performance()
-                quality = production._calculate_quality()
+                quality = production._calculate_quality(pass_rates)
                 
                 production.actual_oee = (availability * performance * quality) / 10000.0
             else:
@@ -249,17 +256,30 @@ class MrpProductionExtended(models.Model):
                 return min(100.0, (theoretical_time / actual_time) * 100)
         return 0.0
     
-    def _calculate_quality(self):
+    def _calculate_quality(self, pass_rates=None):
         """Calcular calidad para OEE"""
-        quality_checks = self.env['quality.check'].search([
-            ('production_id', '=', self.id)
-        ])
-        
-        if quality_checks:
-            passed = quality_checks.filtered(lambda c: c.quality_state == 'pass')
-            return (len(passed) / len(quality_checks)) * 100
-        
-        return 100.0  # Si no hay controles, asumir 100%
+        if pass_rates is None:
+            pass_rates = self._get_quality_pass_rates()
+        return pass_rates.get(self.id, 100.0)  # Si no hay controles, asumir 100%
+    
+    def _get_quality_pass_rates(self):
+        """Porcentaje de controles de calidad aprobados por producción (una consulta)"""
+        if 'quality.check' not in self.env or not self.ids:
+            return {}
+        totals = {}
+        passed = {}
+        for group in self.env['quality.check'].read_group(
+            [('production_id', 'in', self.ids)],
+            ['production_id'], ['production_id', 'quality_state'], lazy=False,
+        ):
+            production_id = group['production_id'][0]
+            totals[production_id] = totals.get(production_id, 0) + group['__count']
+            if group['quality_state'] == 'pass':
+                passed[production_id] = passed.get(production_id, 0) + group['__count']
+        return {
+            production_id: passed.get(production_id, 0) / total * 100
+            for production_id, total in totals.items()
+        }
     
     @api.depends('planned_efficiency', 'actual_efficiency')
     def _compute_efficiency_variance(self):
@@ -267,133 +287,142 @@ class MrpProductionExtended(models.Model):
         for production in self:
             production.efficiency_variance = production.actual_efficiency - production.planned_efficiency
     
-    def _compute_production_alerts(self):
-        """Generar alertas de producción"""
-        for production in self:
+    # === INDICADORES DE RIESGO Y PRIORIDAD ===
+    
+    def _get_routing_totals(self):
+        """Minutos por unidad y de lote de cada routing (una consulta)
+        
+        Returns:
+            dict: {routing_id: (minutos por unidad, minutos de lote)}
+        """
+        totals = {}
+        routing_ids = self.routing_id.ids
+        if not routing_ids:
+            return totals
+        for operation in self.env['mrp.routing.workcenter'].search_read(
+            [('routing_id', 'in', routing_ids)], ['routing_id', 'time_cycle', 'time_mode_batch'],
+        ):
+            unit_minutes, batch_minutes = totals.get(operation['routing_id'][0], (0.0, 0.0))
+            totals[operation['routing_id'][0]] = (
+                unit_minutes + operation['time_cycle'],
+                batch_minutes + (operation['time_mode_batch'] or 0),
+            )
+        return totals
+    
+    def _get_material_shortages(self):
+        """Movimientos de materia prima y faltantes de reserva por producción
+        
+        Returns:
+            dict: {production_id: (movimientos, faltantes)}
+        """
+        counts = {}
+        if not self.ids:
+            return counts
+        for move in self.env['stock.move'].search_read(
+            [('raw_material_production_id', 'in', self.ids)],
+            ['raw_material_production_id', 'product_uom_qty', 'reserved_availability'],
+        ):
+            production_id = move['raw_material_production_id'][0]
+            total, missing = counts.get(production_id, (0, 0))
+            counts[production_id] = (total + 1, missing + (move['product_uom_qty'] > move['reserved_availability']))
+        return counts
+    
+    def _update_production_scores(self):
+        """Calcular y guardar en lote riesgo, prioridad, alertas y capacidad
+        
+        Una pasada vectorizada (ver production_scoring) con tiempos de
+        routing y faltantes de material agregados por consulta; los
+        resultados quedan con su marca scores_updated_at y se escriben en un
+        solo UPDATE, sin pasar por write.
+        """
+        if not self:
+            return 0
+        
+        now = fields.Datetime.now()
+        routing_totals = self._get_routing_totals()
+        shortages = self._get_material_shortages()
+        has_partner = 'partner_id' in self._fields
+        
+        quantity = np.array(self.mapped('product_qty'), dtype=float)
+        routing = [routing_totals.get(production.routing_id.id, (0.0, 0.0)) for production in self]
+        unit_minutes = np.array([minutes for minutes, _batch in routing])
+        moves = np.array([shortages.get(production.id, (0, 0)) for production in self], dtype=float)
+        days_remaining = np.array([
+            (production.date_planned_finished - now).days if production.date_planned_finished else np.nan
+            for production in self
+        ], dtype=float)
+        is_company = np.array([
+            bool(has_partner and production.partner_id and production.partner_id.is_company)
+            for production in self
+        ])
+        
+        scores = score_productions(days_remaining, quantity, unit_minutes, moves[:, 0], moves[:, 1], is_company)
+        
+        rows = []
+        for index, production in enumerate(self):
+            capacity_utilization = float(scores['capacity_utilization'][index])
             alerts = []
             
             # Alerta por retraso
-            if production.date_planned_finished and datetime.now() > production.date_planned_finished:
-                days_late = (datetime.now() - production.date_planned_finished).days
-                alerts.append(f"🔴 RETRASO: {days_late} días de retraso")
+            if production.date_planned_finished and now > production.date_planned_finished:
+                alerts.append(f"🔴 RETRASO: {(now - production.date_planned_finished).days} días de retraso")
             
             # Alerta por materiales
-            missing_materials = production.move_raw_ids.filtered(
-                lambda m: m.product_uom_qty > m.reserved_availability
-            )
-            if missing_materials:
-                alerts.append(f"🟡 MATERIALES: {len(missing_materials)} materiales insuficientes")
+            if moves[index, 1]:
+                alerts.append(f"🟡 MATERIALES: {int(moves[index, 1])} materiales insuficientes")
             
             # Alerta por capacidad
-            if production.capacity_utilization > 95:
+            if capacity_utilization > 95:
                 alerts.append("🟠 CAPACIDAD: Utilización crítica (>95%)")
             
             # Alerta por calidad
-            if production.actual_oee < 70 and production.state == 'done':
+            if production.state == 'done' and production.actual_oee < 70:
                 alerts.append(f"🔴 CALIDAD: OEE bajo ({production.actual_oee:.1f}%)")
             
-            production.production_alerts = '\n'.join(alerts) if alerts else 'Sin alertas'
-    
-    @api.depends('date_planned_finished', 'capacity_utilization', 'move_raw_ids.reserved_availability')
-    def _compute_risk_level(self):
-        """Calcular nivel de riesgo"""
-        for production in self:
-            risk_factors = 0
-            
-            # Factor: Proximidad a fecha límite
-            if production.date_planned_finished:
-                days_remaining = (production.date_planned_finished - datetime.now()).days
-                if days_remaining < 1:
-                    risk_factors += 3
-                elif days_remaining < 3:
-                    risk_factors += 2
-                elif days_remaining < 7:
-                    risk_factors += 1
-            
-            # Factor: Disponibilidad de materiales
-            if production.move_raw_ids:
-                materials_available = production.move_raw_ids.filtered(
-                    lambda m: m.product_uom_qty <= m.reserved_availability
-                )
-                availability_rate = len(materials_available) / len(production.move_raw_ids)
-                if availability_rate < 0.8:
-                    risk_factors += 2
-                elif availability_rate < 0.9:
-                    risk_factors += 1
-            
-            # Factor: Utilización de capacidad
-            if production.capacity_utilization > 95:
-                risk_factors += 2
-            elif production.capacity_utilization > 85:
-                risk_factors += 1
-            
-            # Determinar nivel de riesgo
-            if risk_factors >= 5:
-                production.risk_level = 'critical'
-            elif risk_factors >= 3:
-                production.risk_level = 'high'
-            elif risk_factors >= 1:
-                production.risk_level = 'medium'
+            if production.date_planned_start and production.routing_id:
+                unit, batch = routing[index]
+                estimated_completion = production.date_planned_start + timedelta(
+                    minutes=unit * production.product_qty + batch)
             else:
-                production.risk_level = 'low'
-    
-    def _compute_delay_probability(self):
-        """Calcular probabilidad de retraso usando modelo simplificado"""
-        for production in self:
-            probability = 0.0
-            
-            # Basado en nivel de riesgo
-            risk_multipliers = {
-                'low': 0.1,
-                'medium': 0.3,
-                'high': 0.6,
-                'critical': 0.9
-            }
-            probability += risk_multipliers.get(production.risk_level, 0.1) * 50
-            
-            # Basado en disponibilidad de materiales
-            if production.move_raw_ids:
-                missing_materials = production.move_raw_ids.filtered(
-                    lambda m: m.product_uom_qty > m.reserved_availability
-                )
-                if missing_materials:
-                    probability += (len(missing_materials) / len(production.move_raw_ids)) * 30
-            
-            # Basado en capacidad
-            if production.capacity_utilization > 90:
-                probability += (production.capacity_utilization - 90) * 2
+                estimated_completion = production.date_planned_finished
             
-            production.delay_probability = min(100.0, probability)
+            rows.append((
+                production.id,
+                capacity_utilization,
+                RISK_LEVELS[scores['risk_code'][index]],
+                float(scores['delay_probability'][index]),
+                float(scores['priority_score'][index]),
+                '\n'.join(alerts) if alerts else 'Sin alertas',
+                estimated_completion,
+                now,
+            ))
+        
+        self.flush_recordset(SCORE_FIELDS)
+        execute_values(self._cr._obj, f"""
+            UPDATE {self._table} AS production
+               SET capacity_utilization = data.capacity_utilization,
+                   risk_level = data.risk_level,
+                   delay_probability = data.delay_probability,
+                   priority_score = data.priority_score,
+                   production_alerts = data.production_alerts,
+                   estimated_completion_date = data.estimated_completion_date::timestamp,
+                   scores_updated_at = data.scores_updated_at::timestamp
+              FROM (VALUES %s) AS data(id, capacity_utilization, risk_level, delay_probability,
+                                       priority_score, production_alerts, estimated_completion_date,
+                                       scores_updated_at)
+             WHERE production.id = data.id
+        """, rows, page_size=1000)
+        self.invalidate_recordset(SCORE_FIELDS)
+        
+        return len(self)
     
-    def _compute_priority_score(self):
-        """Calcular score de prioridad dinámico"""
-        for production in self:
-            score = 5.0  # Base score
-            
-            # Incrementar por urgencia
-            if production.date_planned_finished:
-                days_remaining = (production.date_planned_finished - datetime.now()).days
-                if days_remaining <= 1:
-                    score += 5
-                elif days_remaining <= 3:
-                    score += 3
-                elif days_remaining <= 7:
-                    score += 1
-            
-            # Incrementar por cantidad
-            if production.product_qty > 1000:
-                score += 2
-            
-            # Incrementar por cliente VIP (si existe el campo)
-            if hasattr(production, 'partner_id') and production.partner_id:
-                if production.partner_id.is_company:
-                    score += 1
-            
-            # Incrementar por riesgo
-            risk_scores = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
-            score += risk_scores.get(production.risk_level, 0)
-            
-            production.priority_score = min(10.0, score)
+    @api.model
+    def cron_update_production_scores(self):
+        """Recalcular los indicadores de todas las órdenes abiertas"""
+        productions = self.search([('state', 'in', OPEN_PRODUCTION_STATES)])
+        updated_count = productions._update_production_scores()
+        _logger.info(f"Indicadores actualizados para {updated_count} órdenes de producción")
+        return updated_count
     
     @api.depends('bom_id')
     def _compute_bom_intelligence(self):
@@ -463,20 +492,53 @@ class MrpProductionExtended(models.Model):
             
             production.material_waste_estimated = waste
     
+    # === SINCRONIZACIÓN DE CRONOGRAMAS ===
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        productions = super().create(vals_list)
+        productions._update_production_scores()
+        return productions
+    
+    def write(self, vals):
+        result = super().write(vals)
+        if 'state' in vals:
+            self.env['megastock.production.schedule']._sync_productions(self)
+        if SCORE_TRIGGER_FIELDS.intersection(vals) and not self.env.context.get('skip_production_scores'):
+            self._update_production_scores()
+        return result
+    
+    def action_confirm(self):
+        result = super().action_confirm()
+        self._update_production_scores()
+        return result
+    
+    def button_mark_done(self):
+        result = super().button_mark_done()
+        self.env['megastock.production.schedule']._sync_productions(self)
+        self._update_production_scores()
+        return result
+    
     # === MÉTODOS DE ACCIÓN ===
     
     def action_smart_schedule(self):
         """Programar inteligentemente usando algoritmo óptimo"""
         self.ensure_one()
         
-        # Seleccionar algoritmo basado en características
-        if self.corrugated_line_type == 'papel_periodico':
+        # Preferir el algoritmo elegido por benchmark ('all' ordena después de la línea propia)
+        algorithm = self.env['megastock.scheduling.algorithm'].search([
+            ('line_default', '=', True),
+            ('applicable_lines', 'in', [self.corrugated_line_type, 'all'])
+        ], order='applicable_lines desc', limit=1)
+        
+        # Sin benchmark, seleccionar algoritmo basado en características
+        if not algorithm and self.corrugated_line_type == 'papel_periodico':
             # Para papel periódico, minimizar setup
             algorithm = self.env['megastock.scheduling.algorithm'].search([
                 ('algorithm_type', '=', 'custom'),
                 ('applicable_lines', 'in', ['papel_periodico', 'all'])
             ], limit=1)
-        else:
+        elif not algorithm:
             # Para otros, usar SPT por defecto
             algorithm = self.env['megastock.scheduling.algorithm'].search([
                 ('algorithm_type', '=', 'spt')
@@ -518,6 +580,9 @@ class MrpProductionExtended(models.Model):
         """Agregar a cola de trabajo apropiada"""
         self.ensure_one()
         
+        if not self.scores_updated_at:
+            self._update_production_scores()
+        
         # Buscar cola apropiada
         queue = self.env['megastock.work.queue'].search([
             ('production_line', '=', self.corrugated_line_type),
@@ -598,45 +663,198 @@ class MrpProductionExtended(models.Model):
                 }
             }
     
+    def _get_routing_operations(self):
+        """Operaciones de cada routing en secuencia (una consulta)
+        
+        Returns:
+            dict: {routing_id: [(workcenter_id, minutos por unidad, minutos de lote), ...]}
+        """
+        operations = {}
+        if not self.routing_id:
+            return operations
+        for operation in self.env['mrp.routing.workcenter'].search_read(
+            [('routing_id', 'in', self.routing_id.ids)],
+            ['routing_id', 'workcenter_id', 'time_cycle', 'time_mode_batch'],
+            order='sequence, id',
+        ):
+            if operation['workcenter_id']:
+                operations.setdefault(operation['routing_id'][0], []).append((
+                    operation['workcenter_id'][0], operation['time_cycle'], operation['time_mode_batch'] or 0,
+                ))
+        return operations
+    
+    def _plan_finite_capacity(self, start):
+        """Ubicar las órdenes, en el orden dado, en los primeros huecos libres de cada centro
+        
+        Carga hacia adelante: cada operación empieza cuando terminó la
+        anterior y su centro tiene un hueco del largo necesario, según la
+        ocupación de las programaciones vigentes de otras órdenes (índice de
+        ocupación por centro). Las órdenes ya ubicadas ocupan sus huecos para
+        las siguientes.
+        
+        Returns:
+            dict: {production_id: {'start', 'finish', 'operations': [(workcenter_id, inicio, fin)]}}
+        """
+        routing_operations = self._get_routing_operations()
+        workcenter_ids = {
+            workcenter_id for operations in routing_operations.values() for workcenter_id, _unit, _batch in operations
+        }
+        Schedule = self.env['megastock.production.schedule']
+        own_schedule_ids = set(Schedule.search([('production_id', 'in', self.ids)]).ids)
+        indexes = Schedule._get_occupancy_index(workcenter_ids)
+        calendars = {
+            workcenter_id: BusyCalendar(index.busy_intervals(start, own_schedule_ids))
+            for workcenter_id, index in indexes.items()
+        }
+        
+        plan = {}
+        for production in self:
+            operations = routing_operations.get(production.routing_id.id)
+            if not operations:
+                plan[production.id] = {
+                    'start': start,
+                    'finish': start + timedelta(hours=DEFAULT_PRODUCTION_HOURS),
+                    'operations': [],
+                }
+                continue
+            
+            ready = start
+            placed = []
+            for workcenter_id, unit_minutes, batch_minutes in operations:
+                duration = timedelta(minutes=unit_minutes * production.product_qty + batch_minutes)
+                slot = calendars[workcenter_id].earliest_slot(ready, duration)
+                calendars[workcenter_id].add(slot, slot + duration)
+                placed.append((workcenter_id, slot, slot + duration))
+                ready = slot + duration
+            plan[production.id] = {'start': placed[0][1], 'finish': ready, 'operations': placed}
+        return plan
+    
+    @api.model
+    def _assign_schedule_slots(self, schedules, operations):
+        """Repartir los huecos ubicados de una orden entre sus programaciones
+        
+        Las programaciones de cada centro se asignan en orden a las
+        operaciones de ese centro; las que sobran comparten el hueco de la
+        última, en proporción a su duración actual, para no solaparse.
+        
+        Args:
+            schedules: {workcenter_id: [programaciones en orden de inicio]}
+            operations: [(workcenter_id, inicio, fin)] de la orden
+        
+        Returns:
+            list: [(programación, inicio, fin)]
+        """
+        slots_by_workcenter = defaultdict(list)
+        for workcenter_id, operation_start, operation_end in operations:
+            slots_by_workcenter[workcenter_id].append((operation_start, operation_end))
+        
+        assigned = []
+        for workcenter_id, slots in slots_by_workcenter.items():
+            pending = schedules.get(workcenter_id, [])
+            for position, (slot_start, slot_end) in enumerate(slots):
+                if not pending:
+                    break
+                group = pending if position == len(slots) - 1 else pending[:1]
+                pending = pending[len(group):]
+                weights = [
+                    max((schedule.end_datetime - schedule.start_datetime).total_seconds(), 0.0)
+                    if schedule.start_datetime and schedule.end_datetime else 0.0
+                    for schedule in group
+                ]
+                if not sum(weights):
+                    weights = [1.0] * len(group)
+                total = sum(weights)
+                begin = slot_start
+                for schedule, weight in zip(group, weights):
+                    end = begin + (slot_end - slot_start) * (weight / total)
+                    assigned.append((schedule, begin, end))
+                    begin = end
+        return assigned
+    
     @api.model
     def auto_reschedule_delayed_productions(self):
-        """Reprogramar automáticamente producciones retrasadas"""
-        delayed_productions = self.search([
+        """Reprogramar las producciones retrasadas con capacidad finita
+        
+        Las órdenes se ubican por prioridad (indicadores guardados) en los
+        primeros huecos libres de sus centros, desde ahora más un margen.
+        Las fechas se escriben por orden (cada una en su savepoint), pero los
+        indicadores y el índice de ocupación se actualizan una sola vez al
+        final para todo el lote. Se informan los sucesores que quedan
+        afectados.
+        
+        Returns:
+            dict: {'rescheduled', 'productions': [...], 'cascaded': [...]}
+        """
+        # El rescore y el parche del índice se hacen en lote al final
+        batch = self.with_context(skip_production_scores=True, skip_occupancy_patch=True)
+        delayed_productions = batch.search([
             ('state', 'in', ['confirmed', 'planned', 'progress']),
             ('date_planned_finished', '<', datetime.now()),
             ('allow_rescheduling', '=', True)
-        ])
+        ], order='priority_score desc, date_planned_finished, id')
+        report = {'rescheduled': 0, 'productions': [], 'cascaded': []}
+        if not delayed_productions:
+            return report
+        
+        start = fields.Datetime.now() + timedelta(hours=RESCHEDULE_BUFFER_HOURS)
+        plan = delayed_productions._plan_finite_capacity(start)
         
-        rescheduled_count = 0
+        Schedule = batch.env['megastock.production.schedule']
+        schedules_by_production = defaultdict(lambda: defaultdict(list))
+        for schedule in Schedule.search([
+            ('production_id', 'in', delayed_productions.ids),
+            ('state', 'in', list(BUSY_SCHEDULE_STATES)),
+        ], order='start_datetime, id'):
+            schedules_by_production[schedule.production_id.id][schedule.workcenter_id.id].append(schedule)
         
+        rescheduled = self.browse()
+        moved_schedules = Schedule.browse()
         for production in delayed_productions:
+            placement = plan[production.id]
             try:
-                # Calcular nueva fecha basada en capacidad disponible
-                new_start_date = datetime.now() + timedelta(hours=2)  # Buffer de 2 horas
-                
-                # Ajustar por tiempo de producción
-                if production.routing_id:
-                    total_hours = sum(
-                        (op.time_cycle * production.product_qty) / 60.0
-                        for op in production.routing_id.operation_ids
-                    )
-                    new_finish_date = new_start_date + timedelta(hours=total_hours)
-                else:
-                    new_finish_date = new_start_date + timedelta(hours=8)  # Default 8 horas
-                
-                # Actualizar fechas
-                production.write({
-                    'date_planned_start': new_start_date,
-                    'date_planned_finished': new_finish_date,
-                    'auto_scheduled': True
+                with self.env.cr.savepoint():
+                    previous_finish = production.date_planned_finished
+                    production.write({
+                        'date_planned_start': placement['start'],
+                        'date_planned_finished': placement['finish'],
+                        'auto_scheduled': True
+                    })
+                    moved = Schedule.browse()
+                    for schedule, operation_start, operation_end in self._assign_schedule_slots(
+                            schedules_by_production[production.id], placement['operations']):
+                        schedule.write({'start_datetime': operation_start, 'end_datetime': operation_end})
+                        moved |= schedule
+                rescheduled |= production
+                moved_schedules |= moved
+                report['productions'].append({
+                    'production_id': production.id,
+                    'name': production.name,
+                    'start': placement['start'],
+                    'finish': placement['finish'],
+                    'delay_hours': (placement['finish'] - previous_finish).total_seconds() / 3600.0,
                 })
-                
-                rescheduled_count += 1
-                
             except Exception as e:
                 _logger.error(f"Error reprogramando producción {production.name}: {str(e)}")
         
-        if rescheduled_count > 0:
-            _logger.info(f"Reprogramadas {rescheduled_count} producciones retrasadas")
+        # Una sola pasada de indicadores y un solo parche del índice (y de su firma)
+        rescheduled._update_production_scores()
+        moved_schedules._patch_occupancy_index()
         
-        return rescheduled_count
\ No newline at end of file
+        # Impacto en cascada: sucesores que ahora empiezan antes de que termine su predecesor
+        for schedule in moved_schedules:
+            for successor in schedule.successor_ids:
+                if successor.state in BUSY_SCHEDULE_STATES and successor.start_datetime < schedule.end_datetime:
+                    report['cascaded'].append({
+                        'schedule_id': successor.id,
+                        'name': successor.name,
+                        'predecessor_id': schedule.id,
+                        'shift_hours': (schedule.end_datetime - successor.start_datetime).total_seconds() / 3600.0,
+                    })
+        
+        report['rescheduled'] = len(report['productions'])
+        if report['rescheduled'] > 0:
+            _logger.info(
+                f"Reprogramadas {report['rescheduled']} producciones retrasadas; "
+                f"{len(report['cascaded'])} programaciones sucesoras afectadas"
+            )
+        return report
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+
+
+class MrpWorkorder(models.Model):
+    _inherit = 'mrp.workorder'
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'state' in vals:
+            self.env['megastock.production.schedule']._sync_workorders(self)
+        return result
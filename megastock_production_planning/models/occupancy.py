@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+
+class BusyCalendar:
+    """Ocupación de un centro de trabajo como intervalos disjuntos ordenados
+
+    Los intervalos que se solapan o tocan se fusionan al agregarlos, así la
+    búsqueda de huecos recorre solo los intervalos a partir del instante
+    pedido (ubicados por bisección).
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            elif start < end:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def add(self, start, end):
+        """Marcar ocupado [start, end), fusionando con los intervalos vecinos"""
+        if not start < end:
+            return
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+
+    def earliest_slot(self, earliest, duration):
+        """Inicio del primer hueco libre de al menos duration a partir de earliest"""
+        position = bisect_right(self.ends, earliest)
+        candidate = earliest
+        while position < len(self.starts):
+            # Con duración cero, un intervalo que empieza en candidate igual lo ocupa
+            if self.starts[position] > candidate and self.starts[position] - candidate >= duration:
+                break
+            candidate = max(candidate, self.ends[position])
+            position += 1
+        return candidate
+
+
+class _MaxTree:
+    """Árbol de segmentos de máximos: primer índice desde una posición con valor sobre un umbral"""
+
+    def __init__(self, values):
+        self.size = 1
+        while self.size < max(len(values), 1):
+            self.size *= 2
+        self.tree = [float('-inf')] * (2 * self.size)
+        self.tree[self.size:self.size + len(values)] = values
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def first_above(self, position, threshold, strict=True, limit=None):
+        """Primer índice i >= position (y < limit) con valor > threshold (>= si no strict), o None"""
+        limit = self.size if limit is None else limit
+        tree = self.tree
+
+        def passes(value):
+            return value > threshold if strict else value >= threshold
+
+        def search(node, low, high):
+            if high <= position or low >= limit or not passes(tree[node]):
+                return None
+            if node >= self.size:
+                return low
+            middle = (low + high) // 2
+            found = search(2 * node, low, middle)
+            return found if found is not None else search(2 * node + 1, middle, high)
+
+        return search(1, 0, self.size)
+
+
+class IntervalIndex:
+    """Índice de los intervalos programados de un centro de trabajo
+
+    Guarda los intervalos por id y los parchea en O(1); las estructuras de
+    consulta se reconstruyen perezosamente en la siguiente consulta
+    (O(n log n)). Ya construido, responde en O(log n):
+        - overlapping: ids que se solapan con una ventana (O(log n) por id)
+        - next_free_slot: primer hueco libre de un largo dado
+        - utilization: fracción ocupada de una ventana (unión de intervalos)
+
+    Los tiempos son datetimes; internamente, segundos desde EPOCH. El índice
+    se comparte entre los hilos del proceso: parches, reconstrucción y
+    consultas se serializan con un lock.
+    """
+
+    EPOCH = datetime(1970, 1, 1)
+
+    def __init__(self, entries=(), signature=None):
+        self.intervals = {record_id: (start, end) for record_id, start, end in entries if start < end}
+        self.signature = signature
+        self._built = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _seconds(cls, moment):
+        return (moment - cls.EPOCH).total_seconds()
+
+    @classmethod
+    def _moment(cls, seconds):
+        return cls.EPOCH + timedelta(seconds=seconds)
+
+    def patch(self, record_id, start=None, end=None):
+        """Agregar, mover o (sin fechas) quitar un intervalo"""
+        with self._lock:
+            if start and end and start < end:
+                self.intervals[record_id] = (start, end)
+            else:
+                self.intervals.pop(record_id, None)
+            self._built = False
+
+    def _build(self):
+        """Reconstruir las estructuras de consulta (con el lock tomado)"""
+        if self._built:
+            return
+        ordered = sorted(
+            (self._seconds(start), self._seconds(end), record_id)
+            for record_id, (start, end) in self.intervals.items()
+        )
+        self._starts = [start for start, _end, _id in ordered]
+        self._ids = [record_id for _start, _end, record_id in ordered]
+        self._end_tree = _MaxTree([end for _start, end, _id in ordered])
+
+        # Unión de intervalos ocupados, huecos entre ellos y ocupación acumulada
+        self._busy = BusyCalendar((start, end) for start, end, _id in ordered)
+        busy_starts, busy_ends = self._busy.starts, self._busy.ends
+        self._gap_tree = _MaxTree([
+            busy_starts[i + 1] - busy_ends[i] for i in range(len(busy_starts) - 1)
+        ])
+        self._cumulative = [0.0]
+        for start, end in zip(busy_starts, busy_ends):
+            self._cumulative.append(self._cumulative[-1] + end - start)
+        self._built = True
+
+    def overlapping(self, start, end, exclude=None):
+        """Ids de los intervalos que se solapan con [start, end)"""
+        start, end = self._seconds(start), self._seconds(end)
+        with self._lock:
+            self._build()
+            limit = bisect_left(self._starts, end)
+            found = []
+            position = 0
+            while True:
+                index = self._end_tree.first_above(position, start, limit=limit)
+                if index is None:
+                    break
+                if self._ids[index] != exclude:
+                    found.append(self._ids[index])
+                position = index + 1
+        return found
+
+    def next_free_slot(self, earliest, duration):
+        """Inicio del primer hueco libre de al menos duration desde earliest"""
+        earliest, length = self._seconds(earliest), duration.total_seconds()
+        with self._lock:
+            self._build()
+            starts, ends = self._busy.starts, self._busy.ends
+            position = bisect_right(ends, earliest)
+            # Con largo cero, un intervalo que empieza justo en earliest igual lo ocupa
+            if position == len(starts) or (starts[position] > earliest and starts[position] - earliest >= length):
+                return self._moment(earliest)
+            gap = self._gap_tree.first_above(position, length, strict=not length, limit=len(starts) - 1)
+            return self._moment(ends[gap] if gap is not None else ends[-1])
+
+    def _busy_before(self, moment):
+        """Segundos ocupados antes de moment"""
+        position = bisect_right(self._busy.starts, moment) - 1
+        if position < 0:
+            return 0.0
+        return self._cumulative[position] + min(moment, self._busy.ends[position]) - self._busy.starts[position]
+
+    def utilization(self, start, end):
+        """Fracción de [start, end) ocupada (0 a 1)"""
+        start, end = self._seconds(start), self._seconds(end)
+        if end <= start:
+            return 0.0
+        with self._lock:
+            self._build()
+            return (self._busy_before(end) - self._busy_before(start)) / (end - start)
+
+    def busy_intervals(self, after, exclude_ids=()):
+        """Intervalos (inicio, fin) que terminan después de after, sin los ids excluidos"""
+        with self._lock:
+            return [
+                (start, end) for record_id, (start, end) in self.intervals.items()
+                if end > after and record_id not in exclude_ids
+            ]
@@ -3,7 +3,16 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError, ValidationError
 from datetime import datetime, timedelta
+from collections import defaultdict
+import json
 import logging
+import math
+
+import numpy as np
+
+from .mrp_engine import plan_requirements
+from .capacity_loading import CAPACITY_EPSILON, load_finite
+from .scheduling_heuristics import setup_aware_sequence
 
 _logger = logging.getLogger(__name__)
 
@@ -112,12 +121,25 @@ class ProductionPlan(models.Model):
         help='Precisión histórica del pronóstico'
     )
     
+    bucket_size = fields.Selection([
+        ('day', 'Diario'),
+        ('week', 'Semanal')
+    ], string='Periodos MRP', default='week', required=True,
+       help='Tamaño de los periodos de la grilla MRP')
+    
     safety_stock_days = fields.Integer(
         string='Stock de Seguridad (días)',
         default=7,
         help='Días de stock de seguridad a mantener'
     )
     
+    # === GRILLA MRP ===
+    mrp_grid_ids = fields.One2many(
+        'megastock.production.plan.grid',
+        'plan_id',
+        string='Grilla MRP'
+    )
+    
     # === LÍNEAS DEL PLAN ===
     plan_line_ids = fields.One2many(
         'megastock.production.plan.line',
@@ -201,6 +223,18 @@ class ProductionPlan(models.Model):
     )
     
     # === ANÁLISIS Y SEGUIMIENTO ===
+    overload_hours = fields.Float(
+        string='Horas de Sobrecarga',
+        readonly=True,
+        help='Horas que no caben en la capacidad finita del horizonte'
+    )
+    
+    capacity_load_report = fields.Text(
+        string='Reporte de Carga',
+        readonly=True,
+        help='Capacidad, carga y sobrecarga por centro de trabajo y día (JSON)'
+    )
+    
     last_calculation_date = fields.Datetime(
         string='Última Actualización',
         readonly=True
@@ -401,238 +435,421 @@ class ProductionPlan(models.Model):
         log_entries = []
         log_entries.append("=== INICIANDO PLANIFICACIÓN MRP ===")
         
+        # Caché de la corrida: estructuras de BOM y existencias se leen una vez
+        run = {'structure': {}, 'boms': {}}
+        
         # 1. Obtener demanda
         demand_data = self._get_demand_requirements()
         log_entries.append(f"Demanda obtenida: {len(demand_data)} productos")
         
-        # 2. Explotar BOM y calcular necesidades
-        material_requirements = self._explode_bom_requirements(demand_data)
-        log_entries.append(f"Explosión BOM: {len(material_requirements)} materiales")
+        # 2. Explotar BOM multinivel y netear contra existencias y recepciones
+        mrp_records = self._explode_bom_requirements(demand_data, run)
+        log_entries.append(
+            f"Explosión BOM: {len(mrp_records)} productos en "
+            f"{len(set(record['level'] for record in mrp_records.values()))} niveles"
+        )
         
-        # 3. Verificar disponibilidad
-        availability_data = self._check_material_availability(material_requirements)
-        log_entries.append("Disponibilidad verificada")
+        # 3. Guardar la grilla por periodos
+        self._store_mrp_grid(mrp_records)
         
-        # 4. Generar plan de producción
-        production_items = self._generate_production_items(availability_data)
+        # 4. Generar plan de producción (una línea por liberación planificada)
+        production_items, purchase_items = self._generate_production_items(mrp_records, run)
         log_entries.append(f"Items de producción: {len(production_items)}")
         
         # 5. Crear líneas del plan
-        for item in production_items:
-            self._create_plan_line(item)
+        self._create_plan_lines(production_items)
+        
+        if purchase_items:
+            log_entries.append(f"Compras necesarias: {len(purchase_items)} liberaciones")
+            for item in purchase_items:
+                log_entries.append(
+                    f"  - {item['product'].display_name}: {item['quantity']:.2f} "
+                    f"(pedir el {item['start_date'].strftime('%d/%m/%Y')})"
+                )
+        
+        past_due = [record for record in mrp_records.values() if record['past_due'] > 0]
+        if past_due:
+            log_entries.append(f"ATENCIÓN: {len(past_due)} productos con liberaciones atrasadas")
         
         log_entries.append("=== PLANIFICACIÓN MRP COMPLETADA ===")
         self.optimization_log = '\n'.join(log_entries)
     
+    # === PERIODOS MRP ===
+    
+    def _get_bucket_days(self):
+        """Días por periodo de la grilla MRP"""
+        return 7 if self.bucket_size == 'week' else 1
+    
+    def _get_bucket_count(self):
+        """Número de periodos que cubren el horizonte del plan"""
+        days = (self.date_to - self.date_from).days + 1
+        return max(1, int(math.ceil(days / float(self._get_bucket_days()))))
+    
+    def _get_bucket_dates(self):
+        """Fecha de inicio de cada periodo"""
+        bucket_days = self._get_bucket_days()
+        return [self.date_from + timedelta(days=bucket_days * index) for index in range(self._get_bucket_count())]
+    
+    def _get_bucket_index(self, date):
+        """Periodo de una fecha; lo anterior al plan cae en el primero y lo posterior en el último"""
+        if isinstance(date, datetime):
+            date = date.date()
+        index = (date - self.date_from).days // self._get_bucket_days()
+        return min(max(index, 0), self._get_bucket_count() - 1)
+    
+    def _spread_over_buckets(self, quantity):
+        """Repartir una cantidad del horizonte en proporción a los días de cada periodo"""
+        bucket_days = self._get_bucket_days()
+        total_days = (self.date_to - self.date_from).days + 1
+        days = np.full(self._get_bucket_count(), float(bucket_days))
+        days[-1] = total_days - bucket_days * (len(days) - 1)
+        return quantity * days / total_days
+    
     def _get_demand_requirements(self):
-        """Obtener requerimientos de demanda"""
+        """Obtener requerimientos de demanda por periodo
+        
+        Returns:
+            dict: {product_id: arreglo con la demanda de cada periodo}
+        """
         demand_data = {}
+        sources = []
         
         # Demanda de órdenes de venta
         if self.demand_source in ['sales_orders', 'mixed']:
-            sales_demand = self._get_sales_demand()
-            for product_id, qty in sales_demand.items():
-                if product_id not in demand_data:
-                    demand_data[product_id] = 0.0
-                demand_data[product_id] += qty
+            sources.append(self._get_sales_demand())
         
         # Demanda de pronósticos
         if self.demand_source in ['forecast', 'mixed'] and self.include_forecast:
-            forecast_demand = self._get_forecast_demand()
-            for product_id, qty in forecast_demand.items():
-                if product_id not in demand_data:
-                    demand_data[product_id] = 0.0
-                demand_data[product_id] += qty
+            sources.append(self._get_forecast_demand())
         
         # Demanda por punto de reorden
         if self.demand_source in ['stock_min', 'mixed']:
-            reorder_demand = self._get_reorder_demand()
-            for product_id, qty in reorder_demand.items():
+            sources.append(self._get_reorder_demand())
+        
+        for source in sources:
+            for product_id, quantities in source.items():
                 if product_id not in demand_data:
-                    demand_data[product_id] = 0.0
-                demand_data[product_id] += qty
+                    demand_data[product_id] = np.zeros(self._get_bucket_count())
+                demand_data[product_id] += quantities
         
         return demand_data
     
     def _get_sales_demand(self):
-        """Obtener demanda de órdenes de venta"""
-        sales_lines = self.env['sale.order.line'].search([
+        """Obtener demanda de órdenes de venta en el periodo de su fecha de compromiso
+        
+        Un read_group por producto y orden, más una lectura de las fechas de
+        compromiso de esas órdenes.
+        """
+        groups = self.env['sale.order.line'].read_group([
             ('order_id.state', 'in', ['sale', 'done']),
             ('order_id.commitment_date', '>=', self.date_from),
             ('order_id.commitment_date', '<=', self.date_to),
             ('product_id.type', '=', 'product')
-        ])
+        ], ['product_uom_qty:sum', 'qty_delivered:sum'], ['product_id', 'order_id'], lazy=False)
+        
+        order_ids = list({group['order_id'][0] for group in groups})
+        commitment_dates = {
+            order['id']: order['commitment_date']
+            for order in self.env['sale.order'].search_read([('id', 'in', order_ids)], ['commitment_date'])
+        }
         
         demand = {}
-        for line in sales_lines:
-            remaining_qty = line.product_uom_qty - line.qty_delivered
+        for group in groups:
+            remaining_qty = group['product_uom_qty'] - group['qty_delivered']
             if remaining_qty > 0:
-                if line.product_id.id not in demand:
-                    demand[line.product_id.id] = 0.0
-                demand[line.product_id.id] += remaining_qty
+                product_id = group['product_id'][0]
+                if product_id not in demand:
+                    demand[product_id] = np.zeros(self._get_bucket_count())
+                bucket = self._get_bucket_index(commitment_dates[group['order_id'][0]])
+                demand[product_id][bucket] += remaining_qty
         
         return demand
     
     def _get_forecast_demand(self):
-        """Obtener demanda pronosticada"""
+        """Obtener demanda pronosticada, repartida uniformemente en el horizonte"""
         # Implementación simplificada - en producción esto vendría de un módulo de pronósticos
-        products = self.env['product.product'].search([
-            ('type', '=', 'product'),
-            ('megastock_category', '=', 'cajas')
+        historical = self._get_historical_average_sales([
+            ('product_id.type', '=', 'product'),
+            ('product_id.megastock_category', '=', 'cajas')
         ])
         
         forecast = {}
-        for product in products:
+        for product_id, historical_avg in historical.items():
             # Pronóstico basado en ventas históricas (simplificado)
-            historical_avg = self._get_historical_average_sales(product)
             adjusted_forecast = historical_avg * (self.forecast_accuracy / 100.0)
             
             if adjusted_forecast > 0:
-                forecast[product.id] = adjusted_forecast
+                forecast[product_id] = self._spread_over_buckets(adjusted_forecast)
         
         return forecast
     
-    def _get_historical_average_sales(self, product):
-        """Obtener promedio histórico de ventas"""
+    def _get_historical_average_sales(self, product_domain):
+        """Obtener promedio histórico de ventas proyectado al horizonte
+        
+        Un solo read_group de los últimos 90 días para todos los productos
+        del dominio.
+        
+        Returns:
+            dict: {product_id: cantidad proyectada para el horizonte}
+        """
         # Buscar ventas de los últimos 90 días
         ninety_days_ago = self.date_from - timedelta(days=90)
         
-        sales_lines = self.env['sale.order.line'].search([
-            ('product_id', '=', product.id),
+        groups = self.env['sale.order.line'].read_group(product_domain + [
             ('order_id.state', 'in', ['sale', 'done']),
             ('order_id.date_order', '>=', ninety_days_ago),
             ('order_id.date_order', '<', self.date_from)
-        ])
+        ], ['qty_delivered:sum'], ['product_id'])
         
-        total_sold = sum(sales_lines.mapped('qty_delivered'))
-        daily_avg = total_sold / 90 if total_sold > 0 else 0
+        averages = {}
+        for group in groups:
+            total_sold = group['qty_delivered']
+            daily_avg = total_sold / 90 if total_sold > 0 else 0
+            
+            # Proyectar para el horizonte de planificación
+            averages[group['product_id'][0]] = daily_avg * self.horizon_days
         
-        # Proyectar para el horizonte de planificación
-        return daily_avg * self.horizon_days
+        return averages
     
     def _get_reorder_demand(self):
-        """Obtener demanda por punto de reorden"""
+        """Obtener demanda por punto de reorden
+        
+        Las reglas de reabastecimiento y las existencias internas se agregan
+        con un read_group cada una.
+        """
         reorder_demand = {}
         
-        # Buscar productos con stock bajo el punto de reorden
-        products = self.env['product.product'].search([
-            ('type', '=', 'product'),
-            ('active', '=', True)
-        ])
+        # Mínimos y máximos de las reglas activas por producto
+        rules = self.env['stock.warehouse.orderpoint'].read_group([
+            ('product_id.type', '=', 'product'),
+            ('product_id.active', '=', True),
+            ('trigger', '=', 'auto'),
+        ], ['product_min_qty:sum', 'product_max_qty:sum'], ['product_id'])
+        if not rules:
+            return reorder_demand
+        
+        stock = {
+            group['product_id'][0]: group['quantity']
+            for group in self.env['stock.quant'].read_group([
+                ('product_id', 'in', [rule['product_id'][0] for rule in rules]),
+                ('location_id.usage', '=', 'internal'),
+            ], ['quantity:sum'], ['product_id'])
+        }
         
-        for product in products:
-            current_stock = product.qty_available
-            min_stock = getattr(product, 'reordering_min_qty', 0) or 0
+        for rule in rules:
+            product_id = rule['product_id'][0]
+            current_stock = stock.get(product_id, 0.0)
+            min_stock = rule['product_min_qty'] or 0
             
             if current_stock < min_stock:
                 # Calcular cantidad para reponer hasta el máximo
-                max_stock = getattr(product, 'reordering_max_qty', 0) or min_stock * 2
+                max_stock = rule['product_max_qty'] or min_stock * 2
                 reorder_qty = max_stock - current_stock
                 
                 if reorder_qty > 0:
-                    reorder_demand[product.id] = reorder_qty
+                    # La reposición se necesita de inmediato: primer periodo
+                    reorder_demand[product_id] = np.zeros(self._get_bucket_count())
+                    reorder_demand[product_id][0] = reorder_qty
         
         return reorder_demand
     
-    def _explode_bom_requirements(self, demand_data):
-        """Explotar BOM para obtener requerimientos de materiales"""
-        requirements = {}
+    def _load_bom_structure(self, product_ids, run):
+        """Cargar la estructura multinivel de BOM en la caché de la corrida
+        
+        Se recorre nivel por nivel con un solo _bom_find en lote por nivel;
+        los productos ya cargados no se vuelven a consultar.
+        
+        Returns:
+            dict: {product_id: ((component_id, cantidad por unidad), ...)}
+        """
+        structure = run['structure']
+        boms = run['boms']
+        loaded = run.setdefault('loaded', set())
+        Product = self.env['product.product']
+        
+        frontier = set(product_ids) - loaded
+        while frontier:
+            loaded |= frontier
+            products = Product.browse(sorted(frontier))
+            found = self.env['mrp.bom']._bom_find(products, bom_type='normal')
+            frontier = set()
+            for product in products:
+                bom = found.get(product)
+                if not bom:
+                    continue
+                boms[product.id] = bom
+                bom_qty = bom.product_uom_id._compute_quantity(bom.product_qty, product.uom_id) or 1.0
+                lines = []
+                for line in bom.bom_line_ids:
+                    if line._skip_bom_line(product):
+                        continue
+                    line_qty = line.product_uom_id._compute_quantity(line.product_qty, line.product_id.uom_id)
+                    lines.append((line.product_id.id, line_qty / bom_qty))
+                    if line.product_id.id not in loaded:
+                        frontier.add(line.product_id.id)
+                structure[product.id] = tuple(lines)
+        return structure
+    
+    def _explode_bom_requirements(self, demand_data, run):
+        """Explotar BOM multinivel y netear necesidades por nivel y periodo
+        
+        Returns:
+            dict: {product_id: registro MRP} (ver mrp_engine.plan_requirements)
+        """
+        structure = self._load_bom_structure(demand_data.keys(), run)
+        
+        product_ids = set(demand_data) | set(structure)
+        for lines in structure.values():
+            product_ids.update(component_id for component_id, _qty in lines)
+        on_hand, receipts = self._check_material_availability(product_ids, run)
+        lead_times = self._get_lead_times(product_ids, structure)
         
-        for product_id, quantity in demand_data.items():
-            product = self.env['product.product'].browse(product_id)
-            
-            # Buscar BOM para el producto
-            bom = self.env['mrp.bom']._bom_find(product=product)
-            
-            if bom:
-                # Explotar BOM
-                bom_data = bom.explode(product, quantity)
-                
-                for line_data in bom_data[0]:  # line_data es (bom_line, dict)
-                    bom_line, line_info = line_data
-                    material_id = bom_line.product_id.id
-                    required_qty = line_info['qty']
-                    
-                    if material_id not in requirements:
-                        requirements[material_id] = {
-                            'total_required': 0.0,
-                            'bom_lines': []
-                        }
-                    
-                    requirements[material_id]['total_required'] += required_qty
-                    requirements[material_id]['bom_lines'].append({
-                        'product_id': product_id,
-                        'bom_line': bom_line,
-                        'qty': required_qty
-                    })
+        try:
+            return plan_requirements(
+                demand_data, structure, on_hand, receipts, lead_times, self._get_bucket_count())
+        except ValueError as e:
+            raise UserError(str(e))
+    
+    def _check_material_availability(self, product_ids, run):
+        """Existencias actuales y recepciones programadas por periodo
+        
+        qty_available se calcula en lote para todo el conjunto de productos;
+        las recepciones son los movimientos entrantes abiertos (compras y
+        producciones) leídos en una sola consulta y ubicados en el periodo
+        de su fecha prevista.
+        """
+        products = self.env['product.product'].browse(sorted(product_ids))
+        on_hand = {product.id: product.qty_available for product in products}
+        
+        receipts = {}
+        horizon_end = fields.Datetime.to_datetime(self.date_to) + timedelta(days=1)
+        for move in self.env['stock.move'].search_read([
+            ('product_id', 'in', products.ids),
+            ('state', 'in', ['waiting', 'confirmed', 'partially_available', 'assigned']),
+            ('location_dest_id.usage', '=', 'internal'),
+            ('location_id.usage', '!=', 'internal'),
+            ('date', '<', horizon_end),
+        ], ['product_id', 'product_qty', 'date']):
+            product_id = move['product_id'][0]
+            if product_id not in receipts:
+                receipts[product_id] = np.zeros(self._get_bucket_count())
+            receipts[product_id][self._get_bucket_index(move['date'])] += move['product_qty']
+        
+        run['on_hand'] = on_hand
+        return on_hand, receipts
+    
+    def _get_lead_times(self, product_ids, structure):
+        """Lead time en periodos: días de fabricación o de entrega del proveedor"""
+        bucket_days = float(self._get_bucket_days())
+        lead_times = {}
+        for product in self.env['product.product'].browse(sorted(product_ids)):
+            if product.id in structure:
+                days = product.produce_delay or 0.0
             else:
-                # Si no hay BOM, el producto se produce directamente
-                if product_id not in requirements:
-                    requirements[product_id] = {
-                        'total_required': 0.0,
-                        'bom_lines': []
-                    }
-                requirements[product_id]['total_required'] += quantity
-        
-        return requirements
-    
-    def _check_material_availability(self, requirements):
-        """Verificar disponibilidad de materiales"""
-        availability_data = {}
-        
-        for material_id, req_data in requirements.items():
-            material = self.env['product.product'].browse(material_id)
-            current_stock = material.qty_available
-            required_qty = req_data['total_required']
-            
-            availability_data[material_id] = {
-                'material': material,
-                'required_qty': required_qty,
-                'current_stock': current_stock,
-                'shortage': max(0, required_qty - current_stock),
-                'available_for_production': min(current_stock, required_qty),
-                'bom_lines': req_data['bom_lines']
-            }
-        
-        return availability_data
+                days = min(product.seller_ids.mapped('delay'), default=0)
+            lead_times[product.id] = int(math.ceil(days / bucket_days))
+        return lead_times
+    
+    def _store_mrp_grid(self, mrp_records):
+        """Reemplazar la grilla MRP del plan (un registro compacto por producto)"""
+        self.mrp_grid_ids.unlink()
+        
+        def encode(values):
+            return json.dumps([round(float(value), 4) for value in values])
+        
+        bucket_dates = self._get_bucket_dates()
+        vals_list = []
+        for product_id, record in mrp_records.items():
+            releases = record['planned_releases']
+            first_release = np.flatnonzero(releases > 0)
+            vals_list.append({
+                'plan_id': self.id,
+                'product_id': product_id,
+                'low_level_code': record['level'],
+                'make': record['make'],
+                'lead_time_buckets': record['lead_time'],
+                'on_hand': record['on_hand'],
+                'past_due_quantity': record['past_due'],
+                'total_gross': float(record['gross'].sum()),
+                'total_planned': float(record['planned_receipts'].sum()),
+                'first_release_date': bucket_dates[first_release[0]] if len(first_release) else False,
+                'gross_requirements': encode(record['gross']),
+                'scheduled_receipts': encode(record['receipts']),
+                'projected_on_hand': encode(record['projected']),
+                'net_requirements': encode(record['net']),
+                'planned_releases': encode(releases),
+            })
+        return self.env['megastock.production.plan.grid'].create(vals_list)
     
-    def _generate_production_items(self, availability_data):
-        """Generar items de producción"""
+    def get_mrp_grid(self):
+        """Grilla MRP por periodos para la interfaz"""
+        self.ensure_one()
+        return {
+            'buckets': [date.isoformat() for date in self._get_bucket_dates()],
+            'rows': [row.get_arrays() for row in self.mrp_grid_ids],
+        }
+    
+    def _generate_production_items(self, mrp_records, run):
+        """Generar items de producción y compra desde las liberaciones planificadas
+        
+        Cada periodo con liberación genera un item con su fecha de inicio.
+        
+        Returns:
+            tuple: (items de producción, items de compra)
+        """
         production_items = []
+        purchase_items = []
+        bucket_dates = self._get_bucket_dates()
         
-        # Lista de productos finales (que tienen demanda directa)
-        final_products = set()
-        for material_id, data in availability_data.items():
-            for bom_line in data['bom_lines']:
-                final_products.add(bom_line['product_id'])
+        planned = {product_id: record for product_id, record in mrp_records.items()
+                   if record['planned_releases'].any()}
+        products = self.env['product.product'].browse(sorted(planned))
+        pending_sales = self._get_pending_sales_count(products.ids)
+        rollups = self.env['mrp.bom']._get_product_rollups(products)
         
-        for product_id in final_products:
-            product = self.env['product.product'].browse(product_id)
-            
-            # Calcular cantidad total demandada para este producto
-            total_demand = 0.0
-            for material_id, data in availability_data.items():
-                for bom_line in data['bom_lines']:
-                    if bom_line['product_id'] == product_id:
-                        # Esto es simplificado, en realidad debería considerar la disponibilidad
-                        total_demand += bom_line['qty']
-            
-            if total_demand > 0:
+        for product in products:
+            record = planned[product.id]
+            for bucket in np.flatnonzero(record['planned_releases'] > 0):
+                quantity = float(record['planned_releases'][bucket])
+                start_date = datetime.combine(bucket_dates[bucket], datetime.min.time())
+                if not record['make']:
+                    purchase_items.append({'product': product, 'quantity': quantity, 'start_date': start_date})
+                    continue
+                
                 production_items.append({
                     'product': product,
-                    'quantity': total_demand,
-                    'priority': self._calculate_item_priority(product),
-                    'estimated_cost': self._estimate_production_cost(product, total_demand),
-                    'estimated_hours': self._estimate_production_time(product, total_demand)
+                    'quantity': quantity,
+                    'level': record['level'],
+                    'start_date': start_date,
+                    'priority': self._calculate_item_priority(
+                        product, pending_sales=pending_sales.get(product.id, 0),
+                        on_hand=run.get('on_hand', {}).get(product.id)),
+                    'estimated_cost': self._estimate_production_cost(product, quantity, rollup=rollups[product.id]),
+                    'estimated_hours': self._estimate_production_time(product, quantity, rollup=rollups[product.id])
                 })
         
-        # Ordenar por prioridad
-        production_items.sort(key=lambda x: x['priority'], reverse=True)
+        # Ordenar por prioridad (los subensambles antes que sus padres en empate)
+        production_items.sort(key=lambda x: (x['priority'], x['level']), reverse=True)
         
-        return production_items
+        return production_items, purchase_items
     
-    def _calculate_item_priority(self, product):
-        """Calcular prioridad del item"""
+    def _get_pending_sales_count(self, product_ids):
+        """Líneas de venta confirmadas con cantidad pendiente, por producto (una consulta)"""
+        counts = {}
+        for line in self.env['sale.order.line'].search_read([
+            ('product_id', 'in', product_ids),
+            ('order_id.state', '=', 'sale'),
+        ], ['product_id', 'product_uom_qty', 'qty_delivered']):
+            if line['qty_delivered'] < line['product_uom_qty']:
+                product_id = line['product_id'][0]
+                counts[product_id] = counts.get(product_id, 0) + 1
+        return counts
+    
+    def _calculate_item_priority(self, product, pending_sales=None, on_hand=None):
+        """Calcular prioridad del item
+        
+        pending_sales y on_hand permiten pasar valores ya leídos en lote.
+        """
         priority_score = 0
         
         # Prioridad por categoría
@@ -642,75 +859,67 @@ class ProductionPlan(models.Model):
             priority_score += 50
         
         # Prioridad por stock
-        if product.qty_available <= 0:
+        if (product.qty_available if on_hand is None else on_hand) <= 0:
             priority_score += 30
         
         # Prioridad por órdenes de venta pendientes
-        pending_sales = self.env['sale.order.line'].search_count([
-            ('product_id', '=', product.id),
-            ('order_id.state', '=', 'sale'),
-            ('qty_delivered', '<', 'product_uom_qty')
-        ])
+        if pending_sales is None:
+            pending_sales = self._get_pending_sales_count(product.ids).get(product.id, 0)
         priority_score += pending_sales * 10
         
         return priority_score
     
-    def _estimate_production_cost(self, product, quantity):
-        """Estimar costo de producción"""
-        # Buscar BOM para calcular costo
-        bom = self.env['mrp.bom']._bom_find(product=product)
+    def _estimate_production_cost(self, product, quantity, rollup=None):
+        """Estimar costo de producción
         
-        if bom:
-            material_cost = 0.0
-            for line in bom.bom_line_ids:
-                line_qty = (quantity / bom.product_qty) * line.product_qty
-                material_cost += line_qty * line.product_id.standard_price
-            
-            # Agregar costo de operaciones (simplificado)
-            operation_cost = 0.0
-            if bom.routing_id:
-                for operation in bom.routing_id.operation_ids:
-                    op_time = (operation.time_cycle * quantity) / 60.0  # Convertir a horas
-                    op_cost = op_time * (operation.workcenter_id.costs_hour or 0)
-                    operation_cost += op_cost
-            
-            return material_cost + operation_cost
-        else:
-            # Si no hay BOM, usar precio estándar
-            return quantity * product.standard_price
+        Escala el rollup en caché del producto (ver mrp.bom._get_product_rollup):
+        materiales de la BOM más operaciones; sin BOM, precio estándar.
+        """
+        if rollup is None:
+            rollup = self.env['mrp.bom']._get_product_rollup(product.id)
+        return quantity * (rollup['unit_material_cost'] + rollup['unit_operation_cost'])
     
-    def _estimate_production_time(self, product, quantity):
+    def _estimate_production_time(self, product, quantity, rollup=None):
         """Estimar tiempo de producción en horas"""
-        bom = self.env['mrp.bom']._bom_find(product=product)
+        if rollup is None:
+            rollup = self.env['mrp.bom']._get_product_rollup(product.id)
         
-        if bom and bom.routing_id:
-            total_minutes = 0.0
-            for operation in bom.routing_id.operation_ids:
-                op_minutes = (operation.time_cycle * quantity) + (operation.time_mode_batch or 0)
-                total_minutes += op_minutes
-            
-            return total_minutes / 60.0  # Convertir a horas
+        if rollup['has_routing']:
+            return (rollup['unit_minutes'] * quantity + rollup['batch_minutes']) / 60.0  # Convertir a horas
         else:
             # Tiempo estimado por defecto
             return quantity * 0.1  # 0.1 horas por unidad
     
-    def _create_plan_line(self, item_data):
-        """Crear línea del plan de producción"""
-        return self.env['megastock.production.plan.line'].create({
+    def _prepare_plan_line_vals(self, item_data):
+        """Valores de la línea del plan de producción"""
+        return {
             'plan_id': self.id,
             'product_id': item_data['product'].id,
             'planned_quantity': item_data['quantity'],
             'priority_score': item_data['priority'],
             'estimated_cost': item_data['estimated_cost'],
             'estimated_hours': item_data['estimated_hours'],
-            'suggested_start_date': self.date_from,
+            'suggested_start_date': item_data.get('start_date') or self.date_from,
             'state': 'planned'
-        })
+        }
+    
+    def _create_plan_line(self, item_data):
+        """Crear línea del plan de producción"""
+        return self.env['megastock.production.plan.line'].create(self._prepare_plan_line_vals(item_data))
+    
+    def _create_plan_lines(self, items):
+        """Crear en lote las líneas del plan de producción"""
+        return self.env['megastock.production.plan.line'].create(
+            [self._prepare_plan_line_vals(item_data) for item_data in items]
+        )
     
     def _execute_capacity_planning(self):
-        """Ejecutar planificación por capacidad"""
-        # Implementación simplificada de planificación por capacidad
-        pass
+        """Ejecutar planificación por capacidad
+        
+        Las necesidades del MRP se cargan siempre con capacidad finita.
+        """
+        self._execute_mrp_planning()
+        self._apply_capacity_constraints()
     
     def _execute_mixed_planning(self):
         """Ejecutar planificación mixta"""
@@ -720,17 +929,210 @@ class ProductionPlan(models.Model):
         if self.consider_capacity_constraints:
             self._apply_capacity_constraints()
     
+    def _get_daily_capacity(self, workcenter_ids):
+        """Horas efectivas por día de cada centro en el horizonte del plan
+        
+        Se toman de la planificación de capacidad vigente más reciente que
+        cubre el plan: la capacidad efectiva de cada línea se reparte entre
+        sus días laborales.
+        
+        Returns:
+            tuple: (planificación de capacidad, {workcenter_id: arreglo por día})
+        """
+        capacity_plan = self.env['megastock.capacity.planning'].search([
+            ('state', 'in', ['calculated', 'approved', 'active']),
+            ('date_from', '<=', self.date_to),
+            ('date_to', '>=', self.date_from),
+        ], order='planning_date desc, id desc', limit=1)
+        if not capacity_plan:
+            return capacity_plan, {}
+        
+        n_days = (self.date_to - self.date_from).days + 1
+        weekdays = int(capacity_plan.working_days or 7)
+        days = [self.date_from + timedelta(days=day) for day in range(n_days)]
+        working = np.array([
+            day.weekday() < weekdays and capacity_plan.date_from <= day <= capacity_plan.date_to
+            for day in days
+        ], dtype=float)
+        working_days = capacity_plan._get_working_days_count() or 1
+        
+        capacity = {}
+        for line in capacity_plan.capacity_line_ids:
+            if line.workcenter_id.id in workcenter_ids:
+                capacity[line.workcenter_id.id] = working * (line.effective_capacity / working_days)
+        return capacity_plan, capacity
+    
     def _apply_capacity_constraints(self):
-        """Aplicar restricciones de capacidad"""
-        # Verificar si las líneas del plan exceden la capacidad disponible
-        # y ajustar fechas o cantidades según sea necesario
-        pass
+        """Aplicar restricciones de capacidad
+        
+        Carga las líneas planificadas en orden de prioridad sobre la capacidad
+        diaria de cada centro de su ruta: las que no caben el día de su
+        liberación se desplazan y las que exceden el horizonte se parten
+        (el resto queda en una línea nueva al final del horizonte). La
+        sobrecarga por centro y día queda en capacity_load_report.
+        """
+        self.write({'capacity_load_report': False, 'overload_hours': 0.0})
+        lines = self.plan_line_ids.filtered(lambda l: l.state == 'planned')
+        if not lines:
+            return
+        
+        routing_map = self.env['mrp.bom']._get_routing_load_map()
+        workcenter_ids = {
+            workcenter_id for line in lines
+            for workcenter_id, _minutes in routing_map.get(line.product_id.id, ())
+        }
+        capacity_plan, capacity = self._get_daily_capacity(workcenter_ids)
+        if not capacity:
+            self.optimization_log = (
+                f"{self.optimization_log or ''}\n"
+                "Sin planificación de capacidad vigente: líneas sin restricciones de capacidad"
+            )
+            return
+        initial = {workcenter_id: free.copy() for workcenter_id, free in capacity.items()}
+        
+        ordered = lines.sorted(lambda l: (-l.priority_score, l.suggested_start_date or datetime.min, l.id))
+        jobs = []
+        for line in ordered:
+            release = (line.suggested_start_date.date() - self.date_from).days if line.suggested_start_date else 0
+            route = tuple(
+                (workcenter_id, minutes * line.planned_quantity / 60.0)
+                for workcenter_id, minutes in routing_map.get(line.product_id.id, ())
+            )
+            jobs.append((release, route))
+        results, overload = load_finite(jobs, capacity)
+        
+        shifted = split = 0
+        remainder_lines = []
+        end_of_horizon = datetime.combine(self.date_to, datetime.min.time())
+        for line, result in zip(ordered, results):
+            vals = {}
+            route = routing_map.get(line.product_id.id)
+            if route and not line.workcenter_id:
+                vals['workcenter_id'] = route[0][0]
+            
+            start_day = self.date_from + timedelta(days=result['start'])
+            if not line.suggested_start_date or line.suggested_start_date.date() != start_day:
+                vals['suggested_start_date'] = datetime.combine(start_day, datetime.min.time())
+                shifted += 1
+            
+            if result['overflow'] >= 1.0 - CAPACITY_EPSILON:
+                vals.update({
+                    'suggested_start_date': end_of_horizon,
+                    'notes': 'Excede la capacidad del horizonte',
+                })
+                split += 1
+            elif result['overflow'] > 0:
+                fitted = 1.0 - result['overflow']
+                remainder_lines.append({
+                    'plan_id': self.id,
+                    'product_id': line.product_id.id,
+                    'planned_quantity': line.planned_quantity * result['overflow'],
+                    'priority_score': line.priority_score,
+                    'estimated_cost': line.estimated_cost * result['overflow'],
+                    'estimated_hours': line.estimated_hours * result['overflow'],
+                    'suggested_start_date': end_of_horizon,
+                    'workcenter_id': vals.get('workcenter_id', line.workcenter_id.id),
+                    'notes': 'Excede la capacidad del horizonte',
+                    'state': 'planned',
+                })
+                vals.update({
+                    'planned_quantity': line.planned_quantity * fitted,
+                    'estimated_cost': line.estimated_cost * fitted,
+                    'estimated_hours': line.estimated_hours * fitted,
+                })
+                split += 1
+            
+            if vals:
+                line.write(vals)
+        
+        if remainder_lines:
+            self.env['megastock.production.plan.line'].create(remainder_lines)
+        
+        self._store_capacity_load_report(capacity_plan, initial, capacity, overload, shifted, split)
+    
+    def _store_capacity_load_report(self, capacity_plan, initial, remaining, overload, shifted, split):
+        """Guardar capacidad, carga y sobrecarga por centro y día"""
+        n_days = (self.date_to - self.date_from).days + 1
+        names = {workcenter.id: workcenter.name for workcenter in self.env['mrp.workcenter'].browse(list(initial))}
+        
+        report = {
+            'capacity_planning': capacity_plan.name,
+            'days': [(self.date_from + timedelta(days=day)).isoformat() for day in range(n_days)],
+            'workcenters': [],
+        }
+        log_entries = [
+            "=== CARGA A CAPACIDAD FINITA ===",
+            f"Capacidad: {capacity_plan.name}",
+            f"Líneas desplazadas: {shifted}, partidas: {split}",
+        ]
+        total_overload = 0.0
+        for workcenter_id, capacity in initial.items():
+            load = capacity - remaining[workcenter_id] + overload[workcenter_id]
+            overloaded = float(overload[workcenter_id].sum())
+            total_overload += overloaded
+            report['workcenters'].append({
+                'workcenter_id': workcenter_id,
+                'name': names.get(workcenter_id),
+                'capacity': np.round(capacity, 2).tolist(),
+                'load': np.round(load, 2).tolist(),
+                'overload': np.round(overload[workcenter_id], 2).tolist(),
+            })
+            if overloaded > 0:
+                log_entries.append(f"  - {names.get(workcenter_id)}: {overloaded:.1f} h sin capacidad")
+        
+        self.write({
+            'capacity_load_report': json.dumps(report),
+            'overload_hours': total_overload,
+            'optimization_log': '\n'.join(filter(None, [self.optimization_log] + log_entries)),
+        })
+    
+    def get_capacity_load_report(self):
+        """Reporte de carga a capacidad finita para la interfaz"""
+        self.ensure_one()
+        return json.loads(self.capacity_load_report or '{}')
     
     def _optimize_sequence(self):
-        """Optimizar secuencia de producción"""
-        # Aplicar algoritmos de optimización de secuencia
-        # como minimizar setup times, balancear cargas, etc.
-        pass
+        """Optimizar secuencia de producción
+        
+        Dentro de cada centro y día, ordena las líneas con la matriz de setup
+        de la máquina (mínimo cambio de formato, desempate por prioridad) y
+        escalona sus inicios con las horas de ese centro y los setups.
+        """
+        lines = self.plan_line_ids.filtered(
+            lambda l: l.state == 'planned' and l.workcenter_id and l.suggested_start_date
+        )
+        groups = defaultdict(list)
+        for line in lines:
+            groups[(line.workcenter_id, line.suggested_start_date.date())].append(line)
+        
+        routing_map = self.env['mrp.bom']._get_routing_load_map()
+        SetupMatrix = self.env['megastock.setup.matrix']
+        for (workcenter, day), group in groups.items():
+            if len(group) < 2:
+                continue
+            
+            profiles = [SetupMatrix._profile_from_product(line.product_id) for line in group]
+            codes = {}
+            classes = [codes.setdefault(profile, len(codes)) for profile in profiles]
+            matrix = SetupMatrix._build_matrix(workcenter, list(codes))
+            hours = [
+                sum(minutes for workcenter_id, minutes in routing_map.get(line.product_id.id, ())
+                    if workcenter_id == workcenter.id) * line.planned_quantity / 60.0
+                for line in group
+            ]
+            
+            order = setup_aware_sequence(
+                hours, [float('inf')] * len(group), [line.priority_score for line in group],
+                classes, lambda before, after: matrix[before][after] / 60.0)
+            
+            start = datetime.combine(day, datetime.min.time())
+            previous = None
+            for index in order:
+                if previous is not None:
+                    start += timedelta(minutes=matrix[previous][classes[index]])
+                group[index].suggested_start_date = start
+                start += timedelta(hours=hours[index])
+                previous = classes[index]
     
     def action_generate_productions(self):
         """Generar órdenes de producción desde el plan"""
@@ -1047,4 +1449,60 @@ class ProductionPlanLine(models.Model):
             if line.suggested_start_date and line.estimated_hours:
                 line.suggested_end_date = line.suggested_start_date + timedelta(hours=line.estimated_hours)
             else:
-                line.suggested_end_date = line.suggested_start_date
\ No newline at end of file
+                line.suggested_end_date = line.suggested_start_date
+
+
+class ProductionPlanGrid(models.Model):
+    _name = 'megastock.production.plan.grid'
+    _description = 'Grilla MRP por Periodos'
+    _order = 'plan_id, low_level_code, product_id'
+    
+    plan_id = fields.Many2one(
+        'megastock.production.plan',
+        string='Plan de Producción',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    
+    product_id = fields.Many2one(
+        'product.product',
+        string='Producto',
+        required=True
+    )
+    
+    low_level_code = fields.Integer(string='Nivel')
+    make = fields.Boolean(string='Fabricar', help='Con BOM: se fabrica; sin BOM: se compra')
+    lead_time_buckets = fields.Integer(string='Lead Time (periodos)')
+    on_hand = fields.Float(string='Existencias')
+    past_due_quantity = fields.Float(
+        string='Atrasado',
+        help='Cantidad que debía liberarse antes del inicio del plan'
+    )
+    total_gross = fields.Float(string='Necesidad Bruta Total')
+    total_planned = fields.Float(string='Total Planificado')
+    first_release_date = fields.Date(string='Primera Liberación')
+    
+    # Arreglos por periodo (JSON), alineados con los periodos del plan
+    gross_requirements = fields.Text(string='Necesidades Brutas')
+    scheduled_receipts = fields.Text(string='Recepciones Programadas')
+    projected_on_hand = fields.Text(string='Disponible Proyectado')
+    net_requirements = fields.Text(string='Necesidades Netas')
+    planned_releases = fields.Text(string='Liberaciones Planificadas')
+    
+    def get_arrays(self):
+        """Fila de la grilla con sus arreglos decodificados"""
+        self.ensure_one()
+        return {
+            'product_id': self.product_id.id,
+            'product_name': self.product_id.display_name,
+            'level': self.low_level_code,
+            'make': self.make,
+            'lead_time': self.lead_time_buckets,
+            'past_due': self.past_due_quantity,
+            'gross': json.loads(self.gross_requirements or '[]'),
+            'receipts': json.loads(self.scheduled_receipts or '[]'),
+            'projected': json.loads(self.projected_on_hand or '[]'),
+            'net': json.loads(self.net_requirements or '[]'),
+            'releases': json.loads(self.planned_releases or '[]'),
+        }
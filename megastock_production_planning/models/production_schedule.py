@@ -1,7 +1,37 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api
+from odoo.exceptions import UserError
 from datetime import datetime, timedelta
+from collections import defaultdict
+import logging
+
+from .occupancy import IntervalIndex
+
+_logger = logging.getLogger(__name__)
+
+# Estados de programación que siguen a la orden de producción
+ACTIVE_SCHEDULE_STATES = ['scheduled', 'confirmed', 'in_progress']
+
+# Estados visibles en el Gantt
+GANTT_STATES = ['scheduled', 'confirmed', 'in_progress', 'completed']
+
+# Programaciones por página del Gantt
+GANTT_PAGE_SIZE = 2000
+
+# Margen hacia atrás de las consultas incrementales: cubre transacciones
+# que empezaron antes del último corte y confirmaron después
+GANTT_SINCE_OVERLAP_SECONDS = 60
+
+# Horas antes del inicio en que se avisa la proximidad
+START_WARNING_HOURS = 2
+
+# Índices de ocupación de este proceso: {(base de datos, workcenter_id): IntervalIndex}
+_occupancy_indexes = {}
+
+# Campos que mueven una programación en el índice de ocupación
+OCCUPANCY_FIELDS = {'start_datetime', 'end_datetime', 'state', 'workcenter_id'}
+
 
 class ProductionSchedule(models.Model):
     _name = 'megastock.production.schedule'
@@ -208,6 +238,13 @@ class ProductionSchedule(models.Model):
         help='Alertas generadas automáticamente'
     )
     
+    alerts_count = fields.Integer(
+        string='Nº Alertas',
+        compute='_compute_alerts_count',
+        store=True,
+        help='Cantidad de alertas activas (las de proximidad de inicio las refresca el cron)'
+    )
+    
     risk_factors = fields.Text(
         string='Factores de Riesgo',
         compute='_compute_risk_factors',
@@ -225,6 +262,14 @@ class ProductionSchedule(models.Model):
         help='Registro de cambios en la programación'
     )
     
+    status_dirty = fields.Boolean(
+        string='Estado por Sincronizar',
+        default=False,
+        index=True,
+        copy=False,
+        help='La transición de estado quedó pendiente y la revisa el cron de barrido'
+    )
+    
     # === MÉTODOS COMPUTADOS ===
     
     @api.depends('production_id', 'workcenter_id', 'start_datetime')
@@ -286,51 +331,72 @@ class ProductionSchedule(models.Model):
             else:
                 schedule.delay_hours = 0.0
     
+    def _get_alert_messages(self):
+        """Alertas automáticas de la programación"""
+        self.ensure_one()
+        alerts = []
+        
+        # Alerta por retraso
+        if self.delay_hours > 0:
+            alerts.append(f"🔴 RETRASO: {self.delay_hours:.1f} horas")
+        
+        # Alerta por proximidad a inicio
+        if self.state == 'scheduled' and self.start_datetime:
+            hours_to_start = (self.start_datetime - datetime.now()).total_seconds() / 3600.0
+            if 0 < hours_to_start <= START_WARNING_HOURS:
+                alerts.append(f"🟡 PRÓXIMO INICIO: En {hours_to_start:.1f} horas")
+            elif hours_to_start <= 0:
+                alerts.append("🔴 INICIO VENCIDO: Debería haber iniciado")
+        
+        # Alerta por recursos
+        if not self.operator_ids and self.state in ['scheduled', 'confirmed']:
+            alerts.append("🟠 RECURSOS: Sin operadores asignados")
+        
+        # Alerta por dependencias
+        unfinished_predecessors = self.predecessor_ids.filtered(
+            lambda p: p.state not in ['completed', 'cancelled']
+        )
+        if unfinished_predecessors:
+            alerts.append(f"⚠️ DEPENDENCIAS: {len(unfinished_predecessors)} predecesores pendientes")
+        
+        return alerts
+    
     def _compute_alerts(self):
         """Generar alertas automáticas"""
         for schedule in self:
-            alerts = []
-            
-            # Alerta por retraso
-            if schedule.delay_hours > 0:
-                alerts.append(f"🔴 RETRASO: {schedule.delay_hours:.1f} horas")
-            
-            # Alerta por proximidad a inicio
-            if schedule.state == 'scheduled' and schedule.start_datetime:
-                hours_to_start = (schedule.start_datetime - datetime.now()).total_seconds() / 3600.0
-                if 0 < hours_to_start <= 2:
-                    alerts.append(f"🟡 PRÓXIMO INICIO: En {hours_to_start:.1f} horas")
-                elif hours_to_start <= 0:
-                    alerts.append("🔴 INICIO VENCIDO: Debería haber iniciado")
-            
-            # Alerta por recursos
-            if not schedule.operator_ids and schedule.state in ['scheduled', 'confirmed']:
-                alerts.append("🟠 RECURSOS: Sin operadores asignados")
-            
-            # Alerta por dependencias
-            unfinished_predecessors = schedule.predecessor_ids.filtered(
-                lambda p: p.state not in ['completed', 'cancelled']
-            )
-            if unfinished_predecessors:
-                alerts.append(f"⚠️ DEPENDENCIAS: {len(unfinished_predecessors)} predecesores pendientes")
-            
+            alerts = schedule._get_alert_messages()
             schedule.alerts = '\n'.join(alerts) if alerts else 'Sin alertas'
     
+    @api.depends('delay_hours', 'state', 'start_datetime', 'operator_ids', 'predecessor_ids.state')
+    def _compute_alerts_count(self):
+        """Contar alertas activas"""
+        for schedule in self:
+            schedule.alerts_count = len(schedule._get_alert_messages())
+    
+    @api.model
+    def _refresh_start_alerts(self):
+        """Recalcular el conteo de las programaciones que entraron en la ventana de aviso de inicio"""
+        now = fields.Datetime.now()
+        schedules = self.search([
+            ('state', '=', 'scheduled'),
+            ('start_datetime', '>', now),
+            ('start_datetime', '<=', now + timedelta(hours=START_WARNING_HOURS)),
+        ])
+        if schedules:
+            self.env.add_to_compute(self._fields['alerts_count'], schedules)
+            schedules.flush_recordset(['alerts_count'])
+        return schedules
+    
     def _compute_risk_factors(self):
         """Identificar factores de riesgo"""
+        indexes = self._get_occupancy_index(self.workcenter_id.ids)
         for schedule in self:
             risks = []
             
-            # Riesgo por capacidad
-            if schedule.workcenter_id:
-                # Buscar otras programaciones en el mismo período
-                overlapping = self.search([
-                    ('workcenter_id', '=', schedule.workcenter_id.id),
-                    ('start_datetime', '<', schedule.end_datetime),
-                    ('end_datetime', '>', schedule.start_datetime),
-                    ('id', '!=', schedule.id),
-                    ('state', 'in', ['scheduled', 'confirmed', 'in_progress'])
-                ])
+            # Riesgo por capacidad: otras programaciones en el mismo período
+            if schedule.workcenter_id and schedule.start_datetime and schedule.end_datetime:
+                overlapping = indexes[schedule.workcenter_id.id].overlapping(
+                    schedule.start_datetime, schedule.end_datetime, exclude=schedule.id)
                 
                 if overlapping:
                     risks.append(f"Conflicto de recursos: {len(overlapping)} programaciones superpuestas")
@@ -375,6 +441,20 @@ class ProductionSchedule(models.Model):
                 }
             }
         
+        # Verificar capacidad del centro en el período
+        index = self._get_occupancy_index(self.workcenter_id.ids)[self.workcenter_id.id]
+        conflicts = self.browse(index.overlapping(self.start_datetime, self.end_datetime, exclude=self.id))
+        if conflicts.filtered(lambda s: s.state in ['confirmed', 'in_progress']):
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Conflicto de Capacidad',
+                    'message': f'{self.workcenter_id.name} ya tiene programaciones confirmadas en ese período.',
+                    'type': 'warning'
+                }
+            }
+        
         self.state = 'confirmed'
         self._log_change('Programación confirmada')
         
@@ -524,36 +604,124 @@ class ProductionSchedule(models.Model):
         }
     
     @api.model
-    def get_gantt_data(self, date_from, date_to, workcenter_ids=None):
-        """Obtener datos para gráfico Gantt"""
-        domain = [
-            ('start_datetime', '>=', date_from),
-            ('end_datetime', '<=', date_to),
-            ('state', 'in', ['scheduled', 'confirmed', 'in_progress', 'completed'])
-        ]
+    def get_gantt_window(self, date_from, date_to, workcenter_ids=None, line_filter=None,
+                         since=None, known_ids=None, offset=0, limit=GANTT_PAGE_SIZE):
+        """Datos del Gantt para una ventana visible, en columnas
         
+        Devuelve las programaciones que se superponen con la ventana, como
+        arreglos paralelos (un índice por programación) más diccionarios de
+        nombres, leídos con un solo read por modelo. Con since solo vuelven
+        las modificadas desde ese momento (incluidas las canceladas, para
+        quitarlas); de los known_ids, en removed_ids van los borrados y los
+        modificados que salieron de la ventana (otro horario, centro o línea).
+        
+        Args:
+            date_from, date_to: límites de la ventana
+            workcenter_ids: centros visibles (opcional)
+            line_filter: línea de producción ('all' o None para todas)
+            since: server_time de una respuesta anterior para pedir solo cambios
+            known_ids: ids que el cliente tiene en pantalla (para informar los que ya no van)
+            offset, limit: paginación por programación (orden centro, inicio)
+        
+        Returns:
+            dict: {'server_time', 'total', 'next_offset', 'columns',
+                'workcenters', 'productions', 'products', 'operators',
+                'colors', 'removed_ids'}
+        """
+        server_time = fields.Datetime.now()
+        window_domain = [
+            ('start_datetime', '<', date_to),
+            ('end_datetime', '>', date_from),
+        ]
         if workcenter_ids:
-            domain.append(('workcenter_id', 'in', workcenter_ids))
+            window_domain.append(('workcenter_id', 'in', workcenter_ids))
+        if line_filter and line_filter != 'all':
+            window_domain.append(('production_line', '=', line_filter))
         
-        schedules = self.search(domain)
+        removed_ids = []
+        if since:
+            since = fields.Datetime.to_datetime(since) - timedelta(seconds=GANTT_SINCE_OVERLAP_SECONDS)
+            domain = window_domain + [('write_date', '>=', since)]
+            if known_ids:
+                changed = self.search([('id', 'in', known_ids), ('write_date', '>=', since)])
+                still_visible = self.search([('id', 'in', changed.ids)] + window_domain)
+                removed_ids = sorted(
+                    set(known_ids) - set(self.browse(known_ids).exists().ids)
+                    | set((changed - still_visible).ids)
+                )
+        else:
+            domain = window_domain + [('state', 'in', GANTT_STATES)]
         
-        gantt_data = []
+        total = self.search_count(domain)
+        records = self.search_read(
+            domain,
+            ['name', 'production_id', 'workcenter_id', 'product_id', 'start_datetime', 'end_datetime',
+             'duration_hours', 'state', 'quantity', 'operator_ids', 'alerts_count'],
+            offset=offset, limit=limit, order='workcenter_id, start_datetime, id',
+        )
         
-        for schedule in schedules:
+        def names(field_name):
+            return dict(record[field_name] for record in records if record[field_name])
+        
+        operator_ids = sorted({operator_id for record in records for operator_id in record['operator_ids']})
+        operators = {
+            operator['id']: operator['name']
+            for operator in self.env['hr.employee'].browse(operator_ids).read(['name'])
+        }
+        
+        def many2one_ids(field_name):
+            return [record[field_name][0] if record[field_name] else False for record in records]
+        
+        return {
+            'server_time': fields.Datetime.to_string(server_time),
+            'total': total,
+            'next_offset': offset + len(records) if offset + len(records) < total else False,
+            'columns': {
+                'id': [record['id'] for record in records],
+                'name': [record['name'] for record in records],
+                'production_id': many2one_ids('production_id'),
+                'workcenter_id': many2one_ids('workcenter_id'),
+                'product_id': many2one_ids('product_id'),
+                'start': [record['start_datetime'].isoformat() for record in records],
+                'end': [record['end_datetime'].isoformat() for record in records],
+                'duration': [record['duration_hours'] for record in records],
+                'state': [record['state'] for record in records],
+                'quantity': [record['quantity'] for record in records],
+                'operator_ids': [record['operator_ids'] for record in records],
+                'alerts_count': [record['alerts_count'] for record in records],
+            },
+            'workcenters': names('workcenter_id'),
+            'productions': names('production_id'),
+            'products': names('product_id'),
+            'operators': operators,
+            'colors': {state: self._get_state_color(state) for state in GANTT_STATES + ['cancelled']},
+            'removed_ids': removed_ids,
+        }
+    
+    @api.model
+    def get_gantt_data(self, date_from, date_to, workcenter_ids=None, line_filter=None):
+        """Obtener datos para gráfico Gantt (una fila por programación)"""
+        window = self.get_gantt_window(
+            date_from, date_to, workcenter_ids=workcenter_ids, line_filter=line_filter, limit=None)
+        columns = window['columns']
+        
+        gantt_data = []
+        for index, schedule_id in enumerate(columns['id']):
             gantt_data.append({
-                'id': schedule.id,
-                'name': schedule.name,
-                'production_name': schedule.production_id.name,
-                'workcenter_name': schedule.workcenter_id.name,
-                'start': schedule.start_datetime.isoformat(),
-                'end': schedule.end_datetime.isoformat(),
-                'duration': schedule.duration_hours,
-                'state': schedule.state,
-                'color': self._get_state_color(schedule.state),
-                'product_name': schedule.product_id.name,
-                'quantity': schedule.quantity,
-                'operators': [op.name for op in schedule.operator_ids],
-                'alerts_count': len(schedule.alerts.split('\n')) if schedule.alerts != 'Sin alertas' else 0
+                'id': schedule_id,
+                'name': columns['name'][index],
+                'production_name': window['productions'].get(columns['production_id'][index]),
+                'workcenter_id': columns['workcenter_id'][index],
+                'workcenter_name': window['workcenters'].get(columns['workcenter_id'][index]),
+                'start': columns['start'][index],
+                'end': columns['end'][index],
+                'duration': columns['duration'][index],
+                'state': columns['state'][index],
+                'color': window['colors'][columns['state'][index]],
+                'product_name': window['products'].get(columns['product_id'][index]),
+                'quantity': columns['quantity'][index],
+                'operators': [window['operators'][operator_id] for operator_id in columns['operator_ids'][index]],
+                'alerts_count': columns['alerts_count'][index]
             })
         
         return gantt_data
@@ -569,35 +737,275 @@ class ProductionSchedule(models.Model):
         }
         return colors.get(state, '#95a5a6')  # Gris por defecto
     
+    # === ÍNDICE DE OCUPACIÓN POR CENTRO ===
+    
     @api.model
-    def auto_update_schedules(self):
-        """Actualizar automáticamente programaciones basadas en progreso real"""
-        active_schedules = self.search([
-            ('state', 'in', ['scheduled', 'confirmed', 'in_progress'])
-        ])
+    def _get_occupancy_signatures(self, workcenter_ids):
+        """Firma de las programaciones de cada centro: (cantidad, última escritura)"""
+        return {
+            group['workcenter_id'][0]: (group['__count'], group['write_date'])
+            for group in self.read_group(
+                [('workcenter_id', 'in', list(workcenter_ids))],
+                ['write_date:max'], ['workcenter_id'], lazy=False,
+            )
+        }
+    
+    @api.model
+    def _get_occupancy_index(self, workcenter_ids):
+        """Índices de ocupación de los centros (ver occupancy.IntervalIndex)
+        
+        Se guardan en memoria del proceso y se reconstruyen solo cuando la
+        firma de sus programaciones en la base cambió (escrituras de otros
+        procesos o transacciones revertidas).
+        
+        Returns:
+            dict: {workcenter_id: IntervalIndex}
+        """
+        workcenter_ids = set(workcenter_ids)
+        if not workcenter_ids:
+            return {}
+        self.flush_model()
+        dbname = self.env.cr.dbname
+        signatures = self._get_occupancy_signatures(workcenter_ids)
+        
+        indexes = {}
+        stale = []
+        for workcenter_id in workcenter_ids:
+            index = _occupancy_indexes.get((dbname, workcenter_id))
+            if index is not None and index.signature == signatures.get(workcenter_id):
+                indexes[workcenter_id] = index
+            else:
+                stale.append(workcenter_id)
+        
+        if stale:
+            entries = defaultdict(list)
+            for schedule in self.search_read(
+                [('workcenter_id', 'in', stale), ('state', 'in', ACTIVE_SCHEDULE_STATES)],
+                ['workcenter_id', 'start_datetime', 'end_datetime'],
+            ):
+                entries[schedule['workcenter_id'][0]].append(
+                    (schedule['id'], schedule['start_datetime'], schedule['end_datetime']))
+            for workcenter_id in stale:
+                index = IntervalIndex(entries[workcenter_id], signatures.get(workcenter_id))
+                _occupancy_indexes[(dbname, workcenter_id)] = indexes[workcenter_id] = index
+        return indexes
+    
+    def _patch_occupancy_index(self, previous_workcenters=None):
+        """Parchear los índices en memoria con las programaciones escritas
+        
+        Args:
+            previous_workcenters: {schedule_id: workcenter_id} antes de la escritura
+        """
+        dbname = self.env.cr.dbname
+        previous_workcenters = previous_workcenters or {}
+        touched = set()
+        for schedule in self:
+            previous_id = previous_workcenters.get(schedule.id)
+            if previous_id and previous_id != schedule.workcenter_id.id and (dbname, previous_id) in _occupancy_indexes:
+                _occupancy_indexes[(dbname, previous_id)].patch(schedule.id)
+                touched.add(previous_id)
+            index = _occupancy_indexes.get((dbname, schedule.workcenter_id.id))
+            if index is not None:
+                if schedule.state in ACTIVE_SCHEDULE_STATES:
+                    index.patch(schedule.id, schedule.start_datetime, schedule.end_datetime)
+                else:
+                    index.patch(schedule.id)
+                touched.add(schedule.workcenter_id.id)
+        
+        self._refresh_occupancy_signatures(touched)
+    
+    @api.model
+    def _refresh_occupancy_signatures(self, workcenter_ids):
+        """Alinear la firma de los índices parcheados con la base"""
+        if not workcenter_ids:
+            return
+        dbname = self.env.cr.dbname
+        self.flush_model()
+        signatures = self._get_occupancy_signatures(workcenter_ids)
+        for workcenter_id in workcenter_ids:
+            _occupancy_indexes[(dbname, workcenter_id)].signature = signatures.get(workcenter_id)
+    
+    @api.model
+    def detect_schedule_conflicts(self, date_from, date_to, line_filter=None):
+        """Programaciones de la ventana que se solapan con otras del mismo centro"""
+        domain = [
+            ('start_datetime', '<', date_to),
+            ('end_datetime', '>', date_from),
+            ('state', 'in', ACTIVE_SCHEDULE_STATES),
+        ]
+        if line_filter and line_filter != 'all':
+            domain.append(('production_line', '=', line_filter))
+        schedules = self.search_read(domain, ['workcenter_id', 'start_datetime', 'end_datetime'])
+        indexes = self._get_occupancy_index({schedule['workcenter_id'][0] for schedule in schedules})
+        
+        conflicts = []
+        for schedule in schedules:
+            overlapping = indexes[schedule['workcenter_id'][0]].overlapping(
+                schedule['start_datetime'], schedule['end_datetime'], exclude=schedule['id'])
+            if overlapping:
+                conflicts.append({
+                    'schedule_id': schedule['id'],
+                    'conflicting_ids': overlapping,
+                    'reason': f"{len(overlapping)} programaciones superpuestas en el centro",
+                })
+        return conflicts
+    
+    @api.model
+    def get_workcenter_occupancy(self, date_from, date_to, workcenter_ids):
+        """Utilización programada y próximo hueco libre de cada centro en una ventana
+        
+        Returns:
+            list: [{'workcenter_id', 'utilization' (%), 'next_free_slot'}]
+        """
+        date_from = fields.Datetime.to_datetime(date_from)
+        date_to = fields.Datetime.to_datetime(date_to)
+        indexes = self._get_occupancy_index(workcenter_ids)
+        return [{
+            'workcenter_id': workcenter_id,
+            'utilization': round(index.utilization(date_from, date_to) * 100, 1),
+            'next_free_slot': fields.Datetime.to_string(index.next_free_slot(date_from, timedelta(0))),
+        } for workcenter_id, index in indexes.items()]
+    
+    # === SINCRONIZACIÓN CON LA ORDEN ===
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        schedules = super().create(vals_list)
+        schedules._patch_occupancy_index()
+        schedules._sync_production_state()
+        return schedules
+    
+    def write(self, vals):
+        previous_workcenters = {schedule.id: schedule.workcenter_id.id for schedule in self} \
+            if 'workcenter_id' in vals else None
+        result = super().write(vals)
+        # skip_occupancy_patch: el llamador parchea el lote al final (sin cambiar de centro)
+        if OCCUPANCY_FIELDS.intersection(vals) and not self.env.context.get('skip_occupancy_patch'):
+            self._patch_occupancy_index(previous_workcenters)
+        return result
+    
+    def unlink(self):
+        dbname = self.env.cr.dbname
+        removed = [(schedule.id, schedule.workcenter_id.id) for schedule in self]
+        result = super().unlink()
+        touched = set()
+        for schedule_id, workcenter_id in removed:
+            index = _occupancy_indexes.get((dbname, workcenter_id))
+            if index is not None:
+                index.patch(schedule_id)
+                touched.add(workcenter_id)
+        self._refresh_occupancy_signatures(touched)
+        return result
+    
+    def _get_status_transition(self):
+        """Transición que corresponde según el estado de la orden
         
+        Returns:
+            str: 'start', 'complete', 'wait' (la orden está lista pero el
+                inicio programado aún no llegó) o False
+        """
+        self.ensure_one()
+        production_state = self.production_id.state
+        if self.state in ['scheduled', 'confirmed'] and production_state in ['assigned', 'progress']:
+            return 'start' if self.start_datetime <= fields.Datetime.now() else 'wait'
+        if self.state == 'in_progress' and production_state == 'done':
+            return 'complete'
+        return False
+    
+    def _apply_status_transition(self, transition):
+        """Ejecutar una transición sin interrumpir la operación que la disparó"""
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                if transition == 'start':
+                    self.action_start_execution()
+                elif transition == 'complete':
+                    self.action_complete_execution()
+        except Exception as e:
+            _logger.error(f"Error actualizando programación {self.name}: {str(e)}")
+    
+    def _sync_production_state(self):
+        """Aplicar las transiciones que corresponden al estado de cada orden
+        
+        Las que no pueden aplicarse aún (inicio futuro, predecesores
+        pendientes, errores) quedan marcadas en status_dirty.
+        
+        Returns:
+            int: programaciones actualizadas
+        """
         updated_count = 0
+        pending = self.browse()
+        for schedule in self.filtered(lambda s: s.state in ACTIVE_SCHEDULE_STATES):
+            transition = schedule._get_status_transition()
+            if transition in ['start', 'complete']:
+                state = schedule.state
+                schedule._apply_status_transition(transition)
+                updated_count += schedule.state != state
+            if schedule._get_status_transition():
+                pending |= schedule
         
-        for schedule in active_schedules:
-            try:
-                # Verificar si la programación debería haber iniciado
-                if (schedule.state in ['scheduled', 'confirmed'] and 
-                    schedule.start_datetime < datetime.now()):
-                    
-                    # Marcar como retrasada o iniciar automáticamente
-                    if schedule.production_id.state in ['assigned', 'progress']:
-                        schedule.action_start_execution()
-                        updated_count += 1
-                
-                # Verificar si la programación debería haber terminado
-                elif (schedule.state == 'in_progress' and 
-                      schedule.production_id.state == 'done'):
-                    
-                    schedule.action_complete_execution()
-                    updated_count += 1
-                    
-            except Exception as e:
-                _logger.error(f"Error actualizando programación {schedule.name}: {str(e)}")
+        (self - pending).filtered('status_dirty').write({'status_dirty': False})
+        pending.filtered(lambda s: not s.status_dirty).write({'status_dirty': True})
+        return updated_count
+    
+    @api.model
+    def _sync_productions(self, productions):
+        """Hook de mrp.production: sincronizar sus programaciones activas"""
+        schedules = self.search([
+            ('production_id', 'in', productions.ids),
+            ('state', 'in', ACTIVE_SCHEDULE_STATES),
+        ])
+        return schedules._sync_production_state()
+    
+    @api.model
+    def _sync_workorders(self, workorders):
+        """Hook de mrp.workorder: la programación del mismo centro sigue a su orden de trabajo
+        
+        Iniciar una orden de trabajo inicia la programación aunque su inicio
+        programado no haya llegado; terminarla la completa.
+        """
+        workorder_states = {
+            (workorder.production_id.id, workorder.workcenter_id.id): workorder.state
+            for workorder in workorders
+        }
+        schedules = self.search([
+            ('production_id', 'in', workorders.production_id.ids),
+            ('workcenter_id', 'in', workorders.workcenter_id.ids),
+            ('state', 'in', ACTIVE_SCHEDULE_STATES),
+        ])
+        for schedule in schedules:
+            workorder_state = workorder_states.get((schedule.production_id.id, schedule.workcenter_id.id))
+            if workorder_state == 'progress' and schedule.state in ['scheduled', 'confirmed']:
+                schedule._apply_status_transition('start')
+            elif workorder_state == 'done' and schedule.state == 'in_progress':
+                schedule._apply_status_transition('complete')
+        return schedules._sync_production_state()
+    
+    @api.model
+    def auto_update_schedules(self):
+        """Barrido de transiciones perdidas por los hooks
+        
+        Las transiciones se aplican al cambiar de estado la orden o sus
+        órdenes de trabajo; este cron revisa solo las programaciones marcadas
+        como pendientes y las que aún corresponde mover (p. ej. cambios de
+        estado calculados que no pasan por write).
+        """
+        now = fields.Datetime.now()
+        schedules = self.search([
+            ('state', 'in', ACTIVE_SCHEDULE_STATES),
+            '|', '|',
+            ('status_dirty', '=', True),
+            '&', '&',
+            ('state', 'in', ['scheduled', 'confirmed']),
+            ('start_datetime', '<=', now),
+            ('production_id.state', 'in', ['assigned', 'progress']),
+            '&',
+            ('state', '=', 'in_progress'),
+            ('production_id.state', '=', 'done'),
+        ])
+        
+        updated_count = schedules._sync_production_state()
+        self._refresh_start_alerts()
         
         if updated_count > 0:
             _logger.info(f"Actualizadas {updated_count} programaciones automáticamente")
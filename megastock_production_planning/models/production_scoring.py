@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Niveles de riesgo en orden creciente (índice = código del arreglo)
+RISK_LEVELS = ['low', 'medium', 'high', 'critical']
+
+# Peso de cada nivel en la probabilidad de retraso
+RISK_DELAY_MULTIPLIERS = np.array([0.1, 0.3, 0.6, 0.9])
+
+# Horas de un turno contra las que se mide la utilización de capacidad
+SHIFT_HOURS = 8.0
+
+
+def score_productions(days_remaining, quantity, unit_minutes, move_count, missing_count, is_company):
+    """Indicadores de riesgo y prioridad de un lote de órdenes de producción
+
+    Todas las entradas son arreglos (n,) alineados por orden; las reglas son
+    las mismas que aplicaba cada orden por separado.
+
+    Args:
+        days_remaining: días completos hasta el fin planificado (nan sin fecha)
+        quantity: cantidad a producir
+        unit_minutes: minutos de routing por unidad (0 sin routing)
+        move_count: movimientos de materia prima
+        missing_count: movimientos con reserva insuficiente
+        is_company: el cliente es una empresa
+
+    Returns:
+        dict: arreglos 'capacity_utilization', 'risk_code' (índice en
+            RISK_LEVELS), 'delay_probability' y 'priority_score'
+    """
+    has_date = ~np.isnan(days_remaining)
+    days = np.where(has_date, days_remaining, np.inf)
+
+    capacity_utilization = np.minimum(100.0, unit_minutes * quantity / 60.0 / SHIFT_HOURS * 100)
+
+    # Factores de riesgo: fecha límite, materiales y capacidad
+    risk = np.select([days < 1, days < 3, days < 7], [3, 2, 1], 0)
+    has_moves = move_count > 0
+    availability = np.divide(move_count - missing_count, move_count,
+                             out=np.ones_like(quantity, dtype=float), where=has_moves)
+    risk = risk + np.select([has_moves & (availability < 0.8), has_moves & (availability < 0.9)], [2, 1], 0)
+    risk = risk + np.select([capacity_utilization > 95, capacity_utilization > 85], [2, 1], 0)
+    risk_code = np.select([risk >= 5, risk >= 3, risk >= 1], [3, 2, 1], 0)
+
+    missing_rate = np.divide(missing_count, move_count,
+                             out=np.zeros_like(quantity, dtype=float), where=has_moves)
+    delay_probability = np.minimum(
+        100.0,
+        RISK_DELAY_MULTIPLIERS[risk_code] * 50
+        + missing_rate * 30
+        + np.where(capacity_utilization > 90, (capacity_utilization - 90) * 2, 0.0)
+    )
+
+    priority_score = np.minimum(
+        10.0,
+        5.0
+        + np.select([days <= 1, days <= 3, days <= 7], [5, 3, 1], 0)
+        + np.where(quantity > 1000, 2, 0)
+        + np.where(is_company, 1, 0)
+        + risk_code
+    )
+
+    return {
+        'capacity_utilization': capacity_utilization,
+        'risk_code': risk_code,
+        'delay_probability': delay_probability,
+        'priority_score': priority_score,
+    }
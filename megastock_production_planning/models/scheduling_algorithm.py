@@ -3,6 +3,15 @@
 from odoo import models, fields, api
 from datetime import datetime, timedelta
 import logging
+import math
+import os
+import random
+import time
+import numpy as np
+
+from .scheduling_problem import SchedulingProblem, SequenceState, SwapMove, objective_value
+from .scheduling_islands import order_crossover, swap_mutation, random_move, run_islands
+from .scheduling_heuristics import johnson_order, cds_candidates, palmer_sequence, neh_sequence, setup_aware_sequence
 
 _logger = logging.getLogger(__name__)
 
@@ -35,6 +44,9 @@ class SchedulingAlgorithm(models.Model):
         ('simulated_annealing', 'Simulated Annealing'),
         ('tabu_search', 'Búsqueda Tabú'),
         ('johnson', 'Regla de Johnson'),
+        ('cds', 'CDS - Campbell-Dudek-Smith'),
+        ('neh', 'NEH - Nawaz-Enscore-Ham'),
+        ('palmer', 'Palmer - Índice de Pendiente'),
         ('custom', 'Personalizado')
     ], string='Tipo de Algoritmo', required=True)
     
@@ -118,6 +130,43 @@ class SchedulingAlgorithm(models.Model):
         help='Máximo número de iteraciones'
     )
     
+    # Modelo de islas (genético / simulated annealing)
+    island_count = fields.Integer(
+        string='Islas',
+        default=1,
+        help='Poblaciones o cadenas independientes; con más de una se ejecutan en paralelo con migración de élites'
+    )
+    
+    migration_interval = fields.Integer(
+        string='Intervalo de Migración',
+        default=10,
+        help='Generaciones (o pasos de enfriamiento) entre migraciones'
+    )
+    
+    migration_size = fields.Integer(
+        string='Élites por Migración',
+        default=2,
+        help='Individuos que cada isla envía a la siguiente en cada migración'
+    )
+    
+    random_seed = fields.Integer(
+        string='Semilla',
+        default=0,
+        help='Semilla de la corrida en modo islas; con el mismo valor el resultado es idéntico. 0 = aleatoria'
+    )
+    
+    max_processes = fields.Integer(
+        string='Procesos Máximos',
+        default=0,
+        help='Procesos del pool para las islas. 0 = uno por núcleo disponible'
+    )
+    
+    seed_with_heuristics = fields.Boolean(
+        string='Sembrar con Heurísticas',
+        default=True,
+        help='Iniciar GA, SA y tabú con las secuencias NEH, CDS y Palmer en lugar de solo aleatorias'
+    )
+    
     # === RESTRICCIONES ===
     consider_setup_times = fields.Boolean(
         string='Considerar Tiempos Setup',
@@ -151,6 +200,12 @@ class SchedulingAlgorithm(models.Model):
         ('lamina_micro', 'Lámina Micro Corrugada')
     ], string='Líneas Aplicables', default='all')
     
+    line_default = fields.Boolean(
+        string='Predeterminado de la Línea',
+        default=False,
+        help='Algoritmo elegido por benchmark para programar las órdenes de sus líneas aplicables'
+    )
+    
     # === ESTADÍSTICAS DE USO ===
     usage_count = fields.Integer(
         string='Veces Utilizado',
@@ -185,36 +240,19 @@ class SchedulingAlgorithm(models.Model):
     # === MÉTODOS DE PROGRAMACIÓN ===
     
     def execute_algorithm(self, production_orders, workcenters=None, context=None):
-        """Ejecutar algoritmo de programación"""
+        """Ejecutar algoritmo de programación
+        
+        El problema se captura una sola vez en una instantánea numpy
+        (SchedulingProblem) y todos los algoritmos evalúan contra ella.
+        """
         self.ensure_one()
         
         start_time = datetime.now()
         
         try:
-            if self.algorithm_type == 'fifo':
-                result = self._execute_fifo(production_orders)
-            elif self.algorithm_type == 'lifo':
-                result = self._execute_lifo(production_orders)
-            elif self.algorithm_type == 'spt':
-                result = self._execute_spt(production_orders)
-            elif self.algorithm_type == 'lpt':
-                result = self._execute_lpt(production_orders)
-            elif self.algorithm_type == 'edd':
-                result = self._execute_edd(production_orders)
-            elif self.algorithm_type == 'cr':
-                result = self._execute_critical_ratio(production_orders)
-            elif self.algorithm_type == 'slack':
-                result = self._execute_slack_time(production_orders)
-            elif self.algorithm_type == 'genetic':
-                result = self._execute_genetic_algorithm(production_orders, workcenters)
-            elif self.algorithm_type == 'simulated_annealing':
-                result = self._execute_simulated_annealing(production_orders, workcenters)
-            elif self.algorithm_type == 'tabu_search':
-                result = self._execute_tabu_search(production_orders, workcenters)
-            elif self.algorithm_type == 'johnson':
-                result = self._execute_johnson_rule(production_orders, workcenters)
-            else:
-                result = self._execute_custom_algorithm(production_orders, workcenters, context)
+            problem = SchedulingProblem.from_orders(production_orders, workcenters, start=start_time)
+            
+            result = self._dispatch(problem, context)
             
             # Registrar estadísticas
             end_time = datetime.now()
@@ -240,262 +278,142 @@ class SchedulingAlgorithm(models.Model):
                 'schedule': []
             }
     
-    def _execute_fifo(self, production_orders):
-        """Ejecutar algoritmo FIFO"""
-        # Ordenar por fecha de creación
-        sorted_orders = production_orders.sorted('create_date')
-        
-        schedule = []
-        current_time = datetime.now()
-        
-        for order in sorted_orders:
-            duration = self._estimate_production_duration(order)
-            
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
+    def _dispatch(self, problem, context=None):
+        """Ejecutar el algoritmo configurado sobre una instantánea ya construida
+        
+        No toca la base de datos: el benchmark lo llama en procesos separados.
+        """
+        if self.algorithm_type in ('genetic', 'simulated_annealing') and self.island_count > 1:
+            return self._execute_island_model(problem)
+        elif self.algorithm_type == 'fifo':
+            return self._execute_fifo(problem)
+        elif self.algorithm_type == 'lifo':
+            return self._execute_lifo(problem)
+        elif self.algorithm_type == 'spt':
+            return self._execute_spt(problem)
+        elif self.algorithm_type == 'lpt':
+            return self._execute_lpt(problem)
+        elif self.algorithm_type == 'edd':
+            return self._execute_edd(problem)
+        elif self.algorithm_type == 'cr':
+            return self._execute_critical_ratio(problem)
+        elif self.algorithm_type == 'slack':
+            return self._execute_slack_time(problem)
+        elif self.algorithm_type == 'genetic':
+            return self._execute_genetic_algorithm(problem)
+        elif self.algorithm_type == 'simulated_annealing':
+            return self._execute_simulated_annealing(problem)
+        elif self.algorithm_type == 'tabu_search':
+            return self._execute_tabu_search(problem)
+        elif self.algorithm_type == 'johnson':
+            return self._execute_johnson_rule(problem)
+        elif self.algorithm_type == 'cds':
+            return self._execute_cds(problem)
+        elif self.algorithm_type == 'neh':
+            return self._execute_neh(problem)
+        elif self.algorithm_type == 'palmer':
+            return self._execute_palmer(problem)
+        return self._execute_custom_algorithm(problem, context)
+    
+    def _get_deadline(self):
+        """Instante (time.monotonic) en que las metaheurísticas deben parar
+        
+        El presupuesto en segundos llega por contexto (scheduling_time_budget),
+        p. ej. desde el benchmark; sin él no hay límite de tiempo.
+        """
+        budget = self.env.context.get('scheduling_time_budget')
+        return time.monotonic() + budget if budget else None
+    
+    def _build_result(self, problem, sequence, algorithm, **extra):
+        """Armar el resultado estándar de un algoritmo desde una secuencia de índices"""
+        schedule = self._generate_schedule_from_sequence(problem, sequence)
+        evaluation = problem.evaluate(sequence, self.consider_setup_times)
+        result = {
             'success': True,
-            'algorithm': 'FIFO',
+            'algorithm': algorithm,
             'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
+            'sequence': list(sequence),
+            'makespan': evaluation.makespan,
+            'weighted_tardiness': evaluation.weighted_tardiness,
+            'setup_time': evaluation.setup_time,
+            'objective_value': self._objective_value(evaluation),
         }
+        result.update(extra)
+        return result
     
-    def _execute_lifo(self, production_orders):
-        """Ejecutar algoritmo LIFO"""
-        # Ordenar por fecha de creación (inverso)
-        sorted_orders = production_orders.sorted('create_date', reverse=True)
-        
-        schedule = []
-        current_time = datetime.now()
-        
-        for order in sorted_orders:
-            duration = self._estimate_production_duration(order)
-            
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
-            'success': True,
-            'algorithm': 'LIFO',
-            'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
-        }
+    def _execute_fifo(self, problem):
+        """Ejecutar algoritmo FIFO (por fecha de creación)"""
+        sequence = np.argsort(problem.create_rank, kind='stable').tolist()
+        return self._build_result(problem, sequence, 'FIFO')
+    
+    def _execute_lifo(self, problem):
+        """Ejecutar algoritmo LIFO (por fecha de creación, inverso)"""
+        sequence = np.argsort(-problem.create_rank, kind='stable').tolist()
+        return self._build_result(problem, sequence, 'LIFO')
     
-    def _execute_spt(self, production_orders):
+    def _execute_spt(self, problem):
         """Ejecutar algoritmo SPT (Shortest Processing Time)"""
-        # Calcular duraciones y ordenar
-        order_durations = []
-        for order in production_orders:
-            duration = self._estimate_production_duration(order)
-            order_durations.append((order, duration))
-        
-        # Ordenar por duración ascendente
-        order_durations.sort(key=lambda x: x[1])
-        
-        schedule = []
-        current_time = datetime.now()
-        
-        for order, duration in order_durations:
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
-            'success': True,
-            'algorithm': 'SPT',
-            'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
-        }
+        sequence = np.argsort(problem.total, kind='stable').tolist()
+        return self._build_result(problem, sequence, 'SPT')
     
-    def _execute_lpt(self, production_orders):
+    def _execute_lpt(self, problem):
         """Ejecutar algoritmo LPT (Longest Processing Time)"""
-        # Calcular duraciones y ordenar
-        order_durations = []
-        for order in production_orders:
-            duration = self._estimate_production_duration(order)
-            order_durations.append((order, duration))
-        
-        # Ordenar por duración descendente
-        order_durations.sort(key=lambda x: x[1], reverse=True)
-        
-        schedule = []
-        current_time = datetime.now()
-        
-        for order, duration in order_durations:
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
-            'success': True,
-            'algorithm': 'LPT',
-            'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
-        }
+        sequence = np.argsort(-problem.total, kind='stable').tolist()
+        return self._build_result(problem, sequence, 'LPT')
     
-    def _execute_edd(self, production_orders):
+    def _execute_edd(self, problem):
         """Ejecutar algoritmo EDD (Earliest Due Date)"""
-        # Ordenar por fecha de entrega
-        sorted_orders = production_orders.sorted('date_planned_finished')
-        
-        schedule = []
-        current_time = datetime.now()
-        
-        for order in sorted_orders:
-            duration = self._estimate_production_duration(order)
-            
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1,
-                'due_date': order.date_planned_finished
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
-            'success': True,
-            'algorithm': 'EDD',
-            'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
-        }
-    
-    def _execute_critical_ratio(self, production_orders):
-        """Ejecutar algoritmo Critical Ratio"""
-        current_time = datetime.now()
-        
-        # Calcular ratio crítico para cada orden
-        order_ratios = []
-        for order in production_orders:
-            duration = self._estimate_production_duration(order)
-            
-            if order.date_planned_finished:
-                time_remaining = (order.date_planned_finished - current_time).total_seconds() / 3600.0
-                critical_ratio = time_remaining / duration if duration > 0 else float('inf')
-            else:
-                critical_ratio = float('inf')
-            
-            order_ratios.append((order, duration, critical_ratio))
-        
-        # Ordenar por ratio crítico ascendente (más crítico primero)
-        order_ratios.sort(key=lambda x: x[2])
-        
-        schedule = []
-        
-        for order, duration, ratio in order_ratios:
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1,
-                'critical_ratio': ratio
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
-            'success': True,
-            'algorithm': 'Critical Ratio',
-            'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
-        }
-    
-    def _execute_slack_time(self, production_orders):
-        """Ejecutar algoritmo Slack Time"""
-        current_time = datetime.now()
-        
-        # Calcular slack time para cada orden
-        order_slacks = []
-        for order in production_orders:
-            duration = self._estimate_production_duration(order)
-            
-            if order.date_planned_finished:
-                time_available = (order.date_planned_finished - current_time).total_seconds() / 3600.0
-                slack_time = time_available - duration
-            else:
-                slack_time = float('inf')
-            
-            order_slacks.append((order, duration, slack_time))
-        
-        # Ordenar por slack time ascendente (menos holgura primero)
-        order_slacks.sort(key=lambda x: x[2])
-        
-        schedule = []
-        
-        for order, duration, slack in order_slacks:
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': len(schedule) + 1,
-                'slack_time': slack
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return {
-            'success': True,
-            'algorithm': 'Slack Time',
-            'schedule': schedule,
-            'makespan': (current_time - datetime.now()).total_seconds() / 3600.0
-        }
-    
-    def _execute_genetic_algorithm(self, production_orders, workcenters):
-        """Ejecutar algoritmo genético (simplificado)"""
-        import random
-        
-        # Implementación simplificada de algoritmo genético
-        orders_list = list(production_orders)
-        n_orders = len(orders_list)
+        sequence = np.argsort(problem.due, kind='stable').tolist()
+        result = self._build_result(problem, sequence, 'EDD')
+        for item, i in zip(result['schedule'], sequence):
+            due = problem.due[i]
+            item['due_date'] = problem.start + timedelta(hours=float(due)) if np.isfinite(due) else False
+        return result
+    
+    def _execute_critical_ratio(self, problem):
+        """Ejecutar algoritmo Critical Ratio (tiempo restante / duración, más crítico primero)"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(problem.total > 0, problem.due / problem.total, np.inf)
+        ratios[~np.isfinite(problem.due)] = np.inf
+        sequence = np.argsort(ratios, kind='stable').tolist()
+        result = self._build_result(problem, sequence, 'Critical Ratio')
+        for item, i in zip(result['schedule'], sequence):
+            item['critical_ratio'] = float(ratios[i])
+        return result
+    
+    def _execute_slack_time(self, problem):
+        """Ejecutar algoritmo Slack Time (menos holgura primero)"""
+        slacks = problem.due - problem.total
+        sequence = np.argsort(slacks, kind='stable').tolist()
+        result = self._build_result(problem, sequence, 'Slack Time')
+        for item, i in zip(result['schedule'], sequence):
+            item['slack_time'] = float(slacks[i])
+        return result
+    
+    def _execute_genetic_algorithm(self, problem):
+        """Ejecutar algoritmo genético sobre secuencias de índices"""
+        n_orders = problem.n_orders
         
         if n_orders <= 1:
-            return self._execute_fifo(production_orders)
+            return self._execute_fifo(problem)
         
-        # Generar población inicial
-        population = []
-        for _ in range(self.population_size):
-            individual = orders_list.copy()
+        # Generar población inicial (semillas heurísticas + aleatorios)
+        population = [seed[:] for seed in self._heuristic_seeds(problem)][:self.population_size]
+        while len(population) < self.population_size:
+            individual = list(range(n_orders))
             random.shuffle(individual)
             population.append(individual)
         
+        deadline = self._get_deadline()
+        
         # Evolución
         for generation in range(self.generations):
+            if deadline and time.monotonic() > deadline:
+                break
+            
             # Evaluar fitness de cada individuo
-            fitness_scores = []
-            for individual in population:
-                fitness = self._calculate_fitness(individual)
-                fitness_scores.append((individual, fitness))
+            fitness_scores = [(individual, self._calculate_fitness(problem, individual))
+                              for individual in population]
             
             # Seleccionar mejores individuos
             fitness_scores.sort(key=lambda x: x[1])
@@ -524,121 +442,114 @@ class SchedulingAlgorithm(models.Model):
             population = new_population
         
         # Obtener mejor solución
-        best_individual = min(population, key=self._calculate_fitness)
-        
-        # Generar programa
-        schedule = self._generate_schedule_from_sequence(best_individual)
-        
-        return {
-            'success': True,
-            'algorithm': 'Genetic Algorithm',
-            'schedule': schedule,
+        best_individual = min(population, key=lambda ind: self._calculate_fitness(problem, ind))
+        
+        return self._build_result(
+            problem, best_individual, 'Genetic Algorithm',
+            generations=self.generations,
+            population_size=self.population_size,
+        )
+    
+    def _execute_island_model(self, problem):
+        """Ejecutar GA o SA como modelo de islas en un pool de procesos
+        
+        Cada isla usa su propio generador sembrado desde random_seed, así que
+        la misma semilla reproduce el mismo programa. La semilla usada se
+        devuelve en el resultado para poder repetir una corrida aleatoria.
+        """
+        if problem.n_orders <= 1:
+            return self._execute_fifo(problem)
+        
+        seed = self.random_seed or random.SystemRandom().randint(1, 2 ** 31 - 1)
+        # Las semillas heurísticas (NEH/CDS) no consumen el presupuesto de la búsqueda
+        seeds = self._heuristic_seeds(problem)
+        params = {
+            'mode': self.algorithm_type,
+            'objective': self.optimization_objective,
+            'consider_setup': self.consider_setup_times,
+            'migration_interval': self.migration_interval,
+            'migration_size': self.migration_size,
+            'population_size': max(self.population_size, 2),
             'generations': self.generations,
-            'population_size': self.population_size
+            'crossover_rate': self.crossover_rate,
+            'mutation_rate': self.mutation_rate,
+            'initial_temperature': self.initial_temperature,
+            'cooling_rate': self.cooling_rate,
+            'min_temperature': self.min_temperature,
+            'seeds': seeds,
+            'deadline': self._get_deadline(),
         }
-    
-    def _calculate_fitness(self, individual):
-        """Calcular fitness de un individuo (secuencia de órdenes)"""
-        # Fitness basado en makespan (menor es mejor)
-        current_time = datetime.now()
-        total_time = 0
+        processes = min(self.max_processes or os.cpu_count() or 1, self.island_count)
         
-        for order in individual:
-            duration = self._estimate_production_duration(order)
-            total_time += duration
+        best_sequence, best_cost, island_stats = run_islands(
+            problem, params, self.island_count, seed, processes)
         
-        return total_time
+        label = 'Genetic Algorithm' if self.algorithm_type == 'genetic' else 'Simulated Annealing'
+        return self._build_result(
+            problem, best_sequence, f'{label} (Islas)',
+            best_cost=best_cost,
+            seed=seed,
+            island_count=self.island_count,
+            processes=processes,
+            islands=island_stats,
+        )
+    
+    def _calculate_fitness(self, problem, individual):
+        """Calcular fitness de un individuo simulando el flow-shop (menor es mejor)"""
+        return self._objective_value(problem.evaluate(individual, self.consider_setup_times))
+    
+    def _objective_value(self, evaluation):
+        """Reducir una Evaluation al escalar del objetivo configurado"""
+        return objective_value(evaluation, self.optimization_objective)
     
     def _crossover(self, parent1, parent2):
         """Operador de cruzamiento (Order Crossover - OX)"""
-        n = len(parent1)
-        
-        # Seleccionar puntos de cruce
-        start = random.randint(0, n - 1)
-        end = random.randint(start + 1, n)
-        
-        # Crear hijo con segmento del padre1
-        child = [None] * n
-        for i in range(start, end):
-            child[i] = parent1[i]
-        
-        # Completar con elementos del padre2 en orden
-        pointer = 0
-        for i in range(n):
-            if child[i] is None:
-                while parent2[pointer] in child:
-                    pointer += 1
-                child[i] = parent2[pointer]
-                pointer += 1
-        
-        return child
+        return order_crossover(parent1, parent2, random)
     
     def _mutate(self, individual):
         """Operador de mutación (intercambio)"""
-        child = individual.copy()
-        
-        # Intercambiar dos elementos aleatorios
-        i, j = random.sample(range(len(child)), 2)
-        child[i], child[j] = child[j], child[i]
-        
-        return child
+        return swap_mutation(individual, random)
     
-    def _generate_schedule_from_sequence(self, sequence):
-        """Generar programa desde secuencia de órdenes"""
-        schedule = []
-        current_time = datetime.now()
-        
-        for idx, order in enumerate(sequence):
-            duration = self._estimate_production_duration(order)
-            
-            schedule.append({
-                'production_id': order.id,
-                'start_time': current_time,
-                'end_time': current_time + timedelta(hours=duration),
-                'duration': duration,
-                'sequence': idx + 1
-            })
-            
-            current_time += timedelta(hours=duration)
-        
-        return schedule
+    def _generate_schedule_from_sequence(self, problem, sequence):
+        """Generar programa desde secuencia de índices de la instantánea"""
+        return problem.to_schedule(sequence, self.consider_setup_times)
     
-    def _execute_simulated_annealing(self, production_orders, workcenters):
-        """Ejecutar algoritmo Simulated Annealing (simplificado)"""
-        import random
-        import math
+    def _execute_simulated_annealing(self, problem):
+        """Ejecutar algoritmo Simulated Annealing sobre secuencias de índices
         
-        orders_list = list(production_orders)
-        
-        if len(orders_list) <= 1:
-            return self._execute_fifo(production_orders)
+        Los vecinos (intercambio o inserción) se evalúan de forma incremental
+        sobre SequenceState, sin copiar la secuencia por movimiento.
+        """
+        if problem.n_orders <= 1:
+            return self._execute_fifo(problem)
         
         # Solución inicial (aleatoria)
-        current_solution = orders_list.copy()
-        random.shuffle(current_solution)
-        current_cost = self._calculate_fitness(current_solution)
+        initial_solution = self._initial_solution(problem)
+        state = SequenceState(problem, initial_solution, self.consider_setup_times)
+        current_cost = self._objective_value(state.evaluation)
         
-        best_solution = current_solution.copy()
+        best_solution = state.sequence.copy()
         best_cost = current_cost
         
         temperature = self.initial_temperature
+        deadline = self._get_deadline()
         
         while temperature > self.min_temperature:
-            # Generar vecino (intercambiar dos elementos)
-            neighbor = current_solution.copy()
-            i, j = random.sample(range(len(neighbor)), 2)
-            neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+            if deadline and time.monotonic() > deadline:
+                break
             
-            neighbor_cost = self._calculate_fitness(neighbor)
+            # Generar vecino (intercambio o inserción)
+            move = random_move(problem.n_orders, random)
+            neighbor_cost = self._objective_value(state.evaluate_move(move))
             
             # Decidir si aceptar la nueva solución
             if neighbor_cost < current_cost:
                 # Mejor solución - siempre aceptar
-                current_solution = neighbor
+                state.apply(move)
                 current_cost = neighbor_cost
                 
                 if neighbor_cost < best_cost:
-                    best_solution = neighbor.copy()
+                    best_solution = state.sequence.copy()
                     best_cost = neighbor_cost
             else:
                 # Peor solución - aceptar con probabilidad
@@ -646,67 +557,64 @@ class SchedulingAlgorithm(models.Model):
                 probability = math.exp(-delta / temperature)
                 
                 if random.random() < probability:
-                    current_solution = neighbor
+                    state.apply(move)
                     current_cost = neighbor_cost
             
             # Enfriar
             temperature *= self.cooling_rate
         
-        # Generar programa final
-        schedule = self._generate_schedule_from_sequence(best_solution)
-        
-        return {
-            'success': True,
-            'algorithm': 'Simulated Annealing',
-            'schedule': schedule,
-            'best_cost': best_cost,
-            'initial_temperature': self.initial_temperature
-        }
+        return self._build_result(
+            problem, best_solution, 'Simulated Annealing',
+            best_cost=best_cost,
+            initial_temperature=self.initial_temperature,
+        )
     
-    def _execute_tabu_search(self, production_orders, workcenters):
-        """Ejecutar búsqueda tabú (simplificado)"""
-        import random
+    def _execute_tabu_search(self, problem):
+        """Ejecutar búsqueda tabú sobre secuencias de índices
         
-        orders_list = list(production_orders)
-        
-        if len(orders_list) <= 1:
-            return self._execute_fifo(production_orders)
+        Cada vecino de intercambio se evalúa de forma incremental desde su
+        primera posición cambiada; solo el movimiento elegido se aplica.
+        """
+        if problem.n_orders <= 1:
+            return self._execute_fifo(problem)
         
         # Solución inicial
-        current_solution = orders_list.copy()
-        random.shuffle(current_solution)
+        initial_solution = self._initial_solution(problem)
+        state = SequenceState(problem, initial_solution, self.consider_setup_times)
         
-        best_solution = current_solution.copy()
-        best_cost = self._calculate_fitness(best_solution)
+        best_solution = state.sequence.copy()
+        best_cost = self._objective_value(state.evaluation)
         
+        n = problem.n_orders
         tabu_list = []
+        iteration = 0
+        deadline = self._get_deadline()
         
         for iteration in range(self.max_iterations):
-            # Generar vecindario (todas las permutaciones de 2 elementos)
-            neighbors = []
-            for i in range(len(current_solution)):
-                for j in range(i + 1, len(current_solution)):
-                    neighbor = current_solution.copy()
-                    neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                    
-                    # Verificar si no está en lista tabú
-                    move = (i, j)
-                    if move not in tabu_list:
-                        neighbors.append((neighbor, move))
-            
-            if not neighbors:
+            if deadline and time.monotonic() > deadline:
                 break
             
-            # Encontrar mejor vecino
-            best_neighbor, best_move = min(neighbors, 
-                                         key=lambda x: self._calculate_fitness(x[0]))
+            # Evaluar vecindario de intercambios
+            best_move = None
+            best_move_cost = float('inf')
+            for i in range(n):
+                for j in range(i + 1, n):
+                    move = SwapMove(i, j)
+                    if move in tabu_list:
+                        continue
+                    cost = self._objective_value(state.evaluate_move(move))
+                    if cost < best_move_cost:
+                        best_move, best_move_cost = move, cost
+            
+            if best_move is None:
+                break
             
-            current_solution = best_neighbor
-            current_cost = self._calculate_fitness(current_solution)
+            state.apply(best_move)
+            current_cost = best_move_cost
             
             # Actualizar mejor solución global
             if current_cost < best_cost:
-                best_solution = current_solution.copy()
+                best_solution = state.sequence.copy()
                 best_cost = current_cost
             
             # Actualizar lista tabú
@@ -714,112 +622,79 @@ class SchedulingAlgorithm(models.Model):
             if len(tabu_list) > self.tabu_list_size:
                 tabu_list.pop(0)
         
-        # Generar programa final
-        schedule = self._generate_schedule_from_sequence(best_solution)
-        
-        return {
-            'success': True,
-            'algorithm': 'Tabu Search',
-            'schedule': schedule,
-            'best_cost': best_cost,
-            'iterations': iteration + 1
-        }
-    
-    def _execute_johnson_rule(self, production_orders, workcenters):
-        """Ejecutar regla de Johnson para 2 máquinas"""
-        # Implementación simplificada para 2 estaciones
-        if not workcenters or len(workcenters) != 2:
-            return self._execute_spt(production_orders)
-        
-        # Agrupar órdenes por tiempos en cada máquina
-        orders_with_times = []
-        
-        for order in production_orders:
-            time_1 = self._get_operation_time(order, workcenters[0])
-            time_2 = self._get_operation_time(order, workcenters[1])
-            orders_with_times.append((order, time_1, time_2))
-        
-        # Aplicar regla de Johnson
-        set_1 = []  # min(time_1, time_2) = time_1
-        set_2 = []  # min(time_1, time_2) = time_2
-        
-        for order, time_1, time_2 in orders_with_times:
-            if time_1 <= time_2:
-                set_1.append((order, time_1, time_2))
-            else:
-                set_2.append((order, time_1, time_2))
-        
-        # Ordenar set_1 por tiempo en máquina 1
-        set_1.sort(key=lambda x: x[1])
-        
-        # Ordenar set_2 por tiempo en máquina 2 (descendente)
-        set_2.sort(key=lambda x: x[2], reverse=True)
-        
-        # Combinar secuencias
-        final_sequence = [item[0] for item in set_1] + [item[0] for item in set_2]
-        
-        # Generar programa
-        schedule = self._generate_schedule_from_sequence(final_sequence)
-        
-        return {
-            'success': True,
-            'algorithm': 'Johnson Rule',
-            'schedule': schedule,
-            'workcenters': len(workcenters)
-        }
-    
-    def _execute_custom_algorithm(self, production_orders, workcenters, context):
-        """Ejecutar algoritmo personalizado"""
-        # Implementar lógica específica de MEGASTOCK
-        # Por ejemplo: minimizar setup times por tipo de producto
-        
-        # Agrupar por categoría de producto
-        grouped_orders = {}
-        for order in production_orders:
-            category = order.product_id.categ_id.name
-            if category not in grouped_orders:
-                grouped_orders[category] = []
-            grouped_orders[category].append(order)
-        
-        # Ordenar cada grupo por prioridad
-        final_sequence = []
-        for category, orders in grouped_orders.items():
-            sorted_orders = sorted(orders, key=lambda o: getattr(o, 'priority', 5), reverse=True)
-            final_sequence.extend(sorted_orders)
-        
-        # Generar programa
-        schedule = self._generate_schedule_from_sequence(final_sequence)
-        
-        return {
-            'success': True,
-            'algorithm': 'Custom MEGASTOCK',
-            'schedule': schedule,
-            'categories_grouped': len(grouped_orders)
-        }
-    
-    def _estimate_production_duration(self, production_order):
-        """Estimar duración de una orden de producción"""
-        if production_order.routing_id:
-            total_minutes = 0.0
-            for operation in production_order.routing_id.operation_ids:
-                op_minutes = (operation.time_cycle * production_order.product_qty) + \
-                           (operation.time_mode_batch or 0)
-                total_minutes += op_minutes
-            return total_minutes / 60.0  # Convertir a horas
-        else:
-            # Estimación por defecto
-            return production_order.product_qty * 0.1  # 0.1 horas por unidad
-    
-    def _get_operation_time(self, production_order, workcenter):
-        """Obtener tiempo de operación en un centro específico"""
-        if production_order.routing_id:
-            operation = production_order.routing_id.operation_ids.filtered(
-                lambda op: op.workcenter_id == workcenter
-            )
-            if operation:
-                return (operation[0].time_cycle * production_order.product_qty) / 60.0
-        
-        return 1.0  # Tiempo por defecto
+        return self._build_result(
+            problem, best_solution, 'Tabu Search',
+            best_cost=best_cost,
+            iterations=iteration + 1,
+        )
+    
+    def _execute_johnson_rule(self, problem):
+        """Ejecutar regla de Johnson para 2 máquinas (con más etapas, CDS)"""
+        if problem.n_workcenters != 2:
+            return self._execute_cds(problem)
+        
+        final_sequence = johnson_order(problem.processing[:, 0], problem.processing[:, 1])
+        
+        return self._build_result(problem, final_sequence, 'Johnson Rule', workcenters=problem.n_workcenters)
+    
+    def _execute_cds(self, problem):
+        """Ejecutar CDS: la mejor de las m-1 secuencias de Johnson según el objetivo"""
+        candidates = cds_candidates(problem.processing)
+        costs = [self._calculate_fitness(problem, candidate) for candidate in candidates]
+        best = int(np.argmin(costs))
+        
+        return self._build_result(
+            problem, candidates[best], 'CDS',
+            workcenters=problem.n_workcenters,
+            subproblem=best + 1,
+        )
+    
+    def _execute_neh(self, problem):
+        """Ejecutar NEH con aceleración de Taillard"""
+        return self._build_result(problem, neh_sequence(problem), 'NEH')
+    
+    def _execute_palmer(self, problem):
+        """Ejecutar heurística de Palmer"""
+        return self._build_result(problem, palmer_sequence(problem.processing), 'Palmer')
+    
+    def _heuristic_seeds(self, problem):
+        """Secuencias NEH, mejor CDS y Palmer para sembrar las metaheurísticas"""
+        if not self.seed_with_heuristics or problem.n_orders <= 1:
+            return []
+        candidates = cds_candidates(problem.processing)
+        best_cds = min(candidates, key=lambda candidate: self._calculate_fitness(problem, candidate))
+        return [neh_sequence(problem), best_cds, palmer_sequence(problem.processing)]
+    
+    def _initial_solution(self, problem):
+        """Solución inicial de SA y tabú: la mejor semilla heurística, o aleatoria"""
+        seeds = self._heuristic_seeds(problem)
+        if seeds:
+            return min(seeds, key=lambda seed: self._calculate_fitness(problem, seed))
+        solution = list(range(problem.n_orders))
+        random.shuffle(solution)
+        return solution
+    
+    def _execute_custom_algorithm(self, problem, context):
+        """Ejecutar algoritmo personalizado
+        
+        Lógica MEGASTOCK: mínimo setup según la matriz aprendida por máquina
+        (sumada sobre las etapas), sin dejar atrasar la orden más urgente.
+        """
+        classes = problem.setup_class.tolist()
+        combined = np.sum(np.asarray(problem.setup_matrix, dtype=float), axis=0) if problem.setup_matrix else None
+        
+        def setup(before, after):
+            if combined is None or before == after:
+                return 0.0
+            return combined[before][after]
+        
+        final_sequence = setup_aware_sequence(
+            problem.total.tolist(), problem.due.tolist(), problem.weight.tolist(), classes, setup)
+        
+        return self._build_result(
+            problem, final_sequence, 'Custom MEGASTOCK',
+            categories_grouped=len(set(classes)),
+        )
     
     # === MÉTODOS DE UTILIDAD ===
     
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import logging
+import multiprocessing
+import os
+import time
+import tracemalloc
+
+from .scheduling_problem import SchedulingProblem, objective_value
+
+_logger = logging.getLogger(__name__)
+
+# Parámetros del algoritmo copiados al registro desconectado que corre en el pool
+BENCHMARK_ALGORITHM_FIELDS = [
+    'name', 'algorithm_type', 'optimization_objective', 'population_size', 'generations',
+    'mutation_rate', 'crossover_rate', 'initial_temperature', 'cooling_rate',
+    'min_temperature', 'tabu_list_size', 'max_iterations', 'consider_setup_times',
+    'island_count', 'migration_interval', 'migration_size', 'random_seed',
+    'seed_with_heuristics',
+]
+
+# Trabajos del benchmark en un proceso del pool (los fija _init_benchmark_worker)
+_worker_jobs = []
+
+
+def _init_benchmark_worker(jobs):
+    """Inicializador del pool: cada proceso recibe los trabajos de su benchmark"""
+    global _worker_jobs
+    _worker_jobs = jobs
+
+
+def _run_worker_job(index):
+    return _run_benchmark_job(*_worker_jobs[index])
+
+
+def _run_benchmark_job(algorithm, problem):
+    """Correr un algoritmo del benchmark y medir tiempo y memoria pico
+
+    Devuelve solo datos simples (sin registros) para volver al proceso padre.
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = algorithm._dispatch(problem, {})
+        error = result.get('error') if not result.get('success', True) else False
+    except Exception as e:
+        result, error = {}, str(e)
+    runtime = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'sequence': result.get('sequence'),
+        'label': result.get('algorithm'),
+        'runtime': runtime,
+        'peak_memory_kb': peak / 1024.0,
+        'error': error,
+    }
+
+
+class SchedulingBenchmark(models.Model):
+    """Torneo de algoritmos de programación sobre una instantánea congelada
+
+    Todos los algoritmos corren en paralelo sobre el mismo SchedulingProblem
+    con el mismo presupuesto de tiempo, y sus secuencias se evalúan con el
+    mismo objetivo para que los resultados sean comparables.
+    """
+    _name = 'megastock.scheduling.benchmark'
+    _description = 'Benchmark de Algoritmos de Programación'
+    _order = 'run_date desc, id desc'
+
+    name = fields.Char(
+        string='Nombre',
+        required=True,
+        default=lambda self: f"Benchmark {fields.Datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    )
+
+    production_line = fields.Selection([
+        ('all', 'Todas las Líneas'),
+        ('papel_periodico', 'Papel Periódico'),
+        ('cajas', 'Cajas & Planchas'),
+        ('lamina_micro', 'Lámina Micro Corrugada')
+    ], string='Línea de Producción', default='all', required=True)
+
+    optimization_objective = fields.Selection([
+        ('minimize_makespan', 'Minimizar Makespan'),
+        ('minimize_total_completion', 'Minimizar Tiempo Total'),
+        ('minimize_lateness', 'Minimizar Tardanza'),
+        ('minimize_setup_time', 'Minimizar Tiempo Setup'),
+        ('minimize_cost', 'Minimizar Costos'),
+    ], string='Objetivo de Comparación', default='minimize_makespan', required=True)
+
+    time_budget = fields.Float(
+        string='Presupuesto por Algoritmo (s)',
+        default=30.0,
+        help='Tiempo máximo de las metaheurísticas; las reglas simples terminan antes'
+    )
+
+    order_limit = fields.Integer(
+        string='Máximo de Órdenes',
+        default=200,
+        help='Órdenes confirmadas/planificadas que entran en la instantánea'
+    )
+
+    algorithm_ids = fields.Many2many(
+        'megastock.scheduling.algorithm',
+        string='Algoritmos',
+        help='Vacío = todos los algoritmos activos aplicables a la línea'
+    )
+
+    state = fields.Selection([
+        ('draft', 'Borrador'),
+        ('done', 'Ejecutado'),
+        ('failed', 'Fallido'),
+    ], string='Estado', default='draft', readonly=True)
+
+    run_date = fields.Datetime(string='Fecha Ejecución', readonly=True)
+    order_count = fields.Integer(string='Órdenes', readonly=True)
+    workcenter_count = fields.Integer(string='Centros de Trabajo', readonly=True)
+    total_runtime = fields.Float(string='Duración Total (s)', readonly=True)
+
+    result_ids = fields.One2many(
+        'megastock.scheduling.benchmark.result',
+        'benchmark_id',
+        string='Resultados'
+    )
+
+    best_algorithm_id = fields.Many2one(
+        'megastock.scheduling.algorithm',
+        string='Mejor Algoritmo',
+        readonly=True
+    )
+
+    def _get_benchmark_orders(self):
+        """Órdenes abiertas de la línea que forman la instantánea"""
+        orders = self.env['mrp.production'].search([
+            ('state', 'in', ['confirmed', 'planned'])
+        ], order='date_planned_start, id')
+        if self.production_line != 'all':
+            orders = orders.filtered(lambda o: o.corrugated_line_type == self.production_line)
+        return orders[:self.order_limit]
+
+    def _get_benchmark_algorithms(self):
+        if self.algorithm_ids:
+            return self.algorithm_ids
+        return self.env['megastock.scheduling.algorithm'].search([
+            ('active', '=', True),
+            ('applicable_lines', 'in', [self.production_line, 'all']),
+        ])
+
+    def action_run_benchmark(self):
+        """Congelar la instantánea y correr el torneo de algoritmos"""
+        self.ensure_one()
+
+        orders = self._get_benchmark_orders()
+        algorithms = self._get_benchmark_algorithms()
+        if not orders:
+            raise UserError("No hay órdenes confirmadas o planificadas para la línea seleccionada.")
+        if not algorithms:
+            raise UserError("No hay algoritmos activos para la línea seleccionada.")
+
+        started = time.perf_counter()
+        problem = SchedulingProblem.from_orders(orders, start=datetime.now())
+
+        # Copias desconectadas (new) de los algoritmos: en los procesos hijos leen
+        # sus parámetros de caché y nunca usan el cursor heredado
+        Algorithm = self.env['megastock.scheduling.algorithm'].with_context(
+            scheduling_time_budget=self.time_budget)
+        jobs = []
+        for algorithm in algorithms:
+            values = {name: algorithm[name] for name in BENCHMARK_ALGORITHM_FIELDS}
+            # Cada algoritmo usa un solo núcleo para que el presupuesto sea equivalente
+            values['max_processes'] = 1
+            jobs.append((Algorithm.new(values), problem))
+
+        outcomes = None
+        processes = min(os.cpu_count() or 1, len(jobs))
+        if processes > 1:
+            try:
+                # fork: los trabajos llegan a cada proceso por initargs, sin estado global compartido
+                with ProcessPoolExecutor(max_workers=processes,
+                                         mp_context=multiprocessing.get_context('fork'),
+                                         initializer=_init_benchmark_worker,
+                                         initargs=(jobs,)) as executor:
+                    outcomes = list(executor.map(_run_worker_job, range(len(jobs))))
+            except (OSError, ValueError) as e:
+                _logger.warning(f"Pool de procesos no disponible, benchmark en secuencia: {str(e)}")
+        if outcomes is None:
+            outcomes = [_run_benchmark_job(algorithm, problem) for algorithm, problem in jobs]
+
+        # Evaluar todas las secuencias con el mismo objetivo y setups reales
+        result_vals = []
+        for algorithm, outcome in zip(algorithms, outcomes):
+            vals = {
+                'benchmark_id': self.id,
+                'algorithm_id': algorithm.id,
+                'runtime': outcome['runtime'],
+                'peak_memory_kb': outcome['peak_memory_kb'],
+                'success': not outcome['error'] and outcome['sequence'] is not None,
+                'error_message': outcome['error'] or False,
+                'result_label': outcome['label'],
+            }
+            if vals['success']:
+                evaluation = problem.evaluate(outcome['sequence'])
+                vals.update({
+                    'makespan': evaluation.makespan,
+                    'weighted_tardiness': evaluation.weighted_tardiness,
+                    'setup_time': evaluation.setup_time,
+                    'objective_value': objective_value(evaluation, self.optimization_objective),
+                })
+            result_vals.append(vals)
+
+        self.result_ids.unlink()
+        results = self.env['megastock.scheduling.benchmark.result'].create(result_vals)
+
+        ranked = results.filtered('success').sorted(lambda r: (r.objective_value, r.runtime))
+        for rank, result in enumerate(ranked, 1):
+            result.rank = rank
+
+        self.write({
+            'state': 'done' if ranked else 'failed',
+            'run_date': fields.Datetime.now(),
+            'order_count': problem.n_orders,
+            'workcenter_count': problem.n_workcenters,
+            'total_runtime': time.perf_counter() - started,
+            'best_algorithm_id': ranked[:1].algorithm_id.id,
+        })
+        _logger.info(f"Benchmark {self.name}: {len(results)} algoritmos sobre {problem.n_orders} órdenes")
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Benchmark Completado',
+                'message': f'Mejor algoritmo: {ranked[:1].algorithm_id.name or "ninguno"}',
+                'type': 'success' if ranked else 'warning',
+            }
+        }
+
+    def action_set_line_default(self):
+        """Marcar el mejor algoritmo como predeterminado de la línea del benchmark"""
+        self.ensure_one()
+        if not self.best_algorithm_id:
+            raise UserError("El benchmark no tiene un algoritmo ganador.")
+
+        Algorithm = self.env['megastock.scheduling.algorithm']
+        Algorithm.search([
+            ('line_default', '=', True),
+            ('applicable_lines', '=', self.best_algorithm_id.applicable_lines),
+        ]).write({'line_default': False})
+        self.best_algorithm_id.line_default = True
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Algoritmo Predeterminado',
+                'message': f'{self.best_algorithm_id.name} queda como predeterminado',
+                'type': 'success',
+            }
+        }
+
+    def get_quality_runtime_chart(self):
+        """Puntos calidad vs tiempo de ejecución para el gráfico del dashboard"""
+        self.ensure_one()
+        return {
+            'objective': self.optimization_objective,
+            'points': [{
+                'algorithm': result.algorithm_id.name,
+                'algorithm_type': result.algorithm_type,
+                'runtime': result.runtime,
+                'objective_value': result.objective_value,
+                'peak_memory_kb': result.peak_memory_kb,
+                'rank': result.rank,
+            } for result in self.result_ids.filtered('success')],
+        }
+
+
+class SchedulingBenchmarkResult(models.Model):
+    _name = 'megastock.scheduling.benchmark.result'
+    _description = 'Resultado de Benchmark de Programación'
+    _order = 'benchmark_id desc, rank, id'
+
+    benchmark_id = fields.Many2one(
+        'megastock.scheduling.benchmark',
+        string='Benchmark',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    algorithm_id = fields.Many2one(
+        'megastock.scheduling.algorithm',
+        string='Algoritmo',
+        required=True,
+        ondelete='cascade'
+    )
+
+    algorithm_type = fields.Selection(
+        related='algorithm_id.algorithm_type',
+        store=True,
+        string='Tipo'
+    )
+
+    production_line = fields.Selection(
+        related='benchmark_id.production_line',
+        store=True,
+        string='Línea de Producción'
+    )
+
+    result_label = fields.Char(string='Variante')
+    success = fields.Boolean(string='Éxito')
+    error_message = fields.Text(string='Error')
+    rank = fields.Integer(string='Posición')
+
+    makespan = fields.Float(string='Makespan (h)', group_operator='avg')
+    weighted_tardiness = fields.Float(string='Tardanza Ponderada (h)', group_operator='avg')
+    setup_time = fields.Float(string='Tiempo Setup (h)', group_operator='avg')
+    objective_value = fields.Float(string='Valor Objetivo', group_operator='avg')
+    runtime = fields.Float(string='Tiempo Ejecución (s)', group_operator='avg')
+    peak_memory_kb = fields.Float(string='Memoria Pico (KB)', group_operator='avg')
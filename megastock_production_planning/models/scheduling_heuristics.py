@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Diferencia de makespan (h) bajo la cual dos posiciones de inserción empatan
+NEH_TIE_TOLERANCE = 1e-9
+
+
+def johnson_order(time_1, time_2):
+    """Regla de Johnson para dos máquinas sobre arreglos de tiempos
+
+    set_1: min(time_1, time_2) = time_1, por tiempo en máquina 1 ascendente
+    set_2: min(time_1, time_2) = time_2, por tiempo en máquina 2 descendente
+    """
+    set_1 = np.flatnonzero(time_1 <= time_2)
+    set_2 = np.flatnonzero(time_1 > time_2)
+    set_1 = set_1[np.argsort(time_1[set_1], kind='stable')]
+    set_2 = set_2[np.argsort(-time_2[set_2], kind='stable')]
+    return np.concatenate([set_1, set_2]).tolist()
+
+
+def cds_candidates(processing):
+    """Secuencias de Campbell-Dudek-Smith: Johnson sobre m-1 problemas de dos máquinas
+
+    El subproblema k suma las primeras k etapas como máquina virtual 1 y las
+    últimas k como máquina virtual 2. Con m = 2 es exactamente Johnson.
+    """
+    m = processing.shape[1]
+    head = np.cumsum(processing, axis=1)
+    tail = np.cumsum(processing[:, ::-1], axis=1)
+    return [johnson_order(head[:, k - 1], tail[:, k - 1]) for k in range(1, max(m, 2))]
+
+
+def palmer_sequence(processing):
+    """Índice de pendiente de Palmer: primero las órdenes cargadas hacia el final de la ruta"""
+    m = processing.shape[1]
+    slope = processing @ (2.0 * np.arange(1, m + 1) - m - 1)
+    return np.argsort(-slope, kind='stable').tolist()
+
+
+def neh_sequence(problem):
+    """NEH con la aceleración de Taillard (O(n²m) en total)
+
+    Las órdenes se insertan por tiempo total descendente en la posición que
+    minimiza el makespan parcial. Para cada inserción se calculan una vez las
+    cabezas e (fin de cada posición en cada máquina) y colas q (camino desde
+    cada posición hasta el final); el makespan de insertar en la posición i
+    es max_k(f[i, k] + q[i, k]), vectorizado sobre todas las posiciones.
+
+    Es el flow-shop de permutación clásico sin setups. Como en el simulador,
+    las etapas de tiempo cero son un paso directo: la orden no espera a esa
+    máquina ni la ocupa, y los caminos que cruzan la posición por una máquina
+    que la orden insertada no usa también cuentan para el makespan. Las colas
+    no ven la liberación de las órdenes siguientes, por lo que con
+    liberaciones es una aproximación; el resultado final se evalúa siempre
+    con el simulador real.
+    """
+    processing = problem.processing
+    n, m = processing.shape
+    if n <= 1:
+        return list(range(n))
+
+    p = problem._p
+    release = problem._release
+    ready = problem._ready
+    order = np.argsort(-processing.sum(axis=1), kind='stable').tolist()
+
+    sequence = [order[0]]
+    for job in order[1:]:
+        size = len(sequence)
+
+        # Cabezas: heads[i] = fin en cada máquina de las primeras i órdenes
+        heads = [ready]
+        for i in range(size):
+            previous = heads[i]
+            t = release[sequence[i]]
+            row = []
+            for k, duration in enumerate(p[sequence[i]]):
+                if duration <= 0.0:
+                    row.append(previous[k])
+                    continue
+                t = (t if t > previous[k] else previous[k]) + duration
+                row.append(t)
+            heads.append(row)
+
+        # Colas: tails[i] = camino más largo desde la posición i hasta el final
+        tails = [[0.0] * m for _i in range(size + 1)]
+        for i in range(size - 1, -1, -1):
+            following = tails[i + 1]
+            row = tails[i]
+            t = 0.0
+            for k in range(m - 1, -1, -1):
+                duration = p[sequence[i]][k]
+                if duration <= 0.0:
+                    row[k] = following[k]
+                    continue
+                t = (t if t > following[k] else following[k]) + duration
+                row[k] = t
+
+        e = np.array(heads)
+        q = np.array(tails)
+        job_times = processing[job]
+        active = job_times > 0.0
+        f = np.empty((size + 1, m))
+        t = np.full(size + 1, float(release[job]))
+        for k in range(m):
+            if active[k]:
+                t = np.maximum(t, e[:, k]) + job_times[k]
+            f[:, k] = t
+        # Caminos por la orden insertada, o que cruzan la posición por una
+        # máquina que no usa; sin etapas cero, los demás términos no suman
+        through = np.where(active, f + q, e + q).max(axis=1)
+        makespans = np.maximum(through, np.maximum(e.max(axis=1), q.max(axis=1)))
+        # Empates (con tolerancia de redondeo): la primera posición, como en NEH clásico
+        position = int(np.flatnonzero(makespans <= makespans.min() + NEH_TIE_TOLERANCE)[0])
+        sequence.insert(position, job)
+
+    return sequence
+
+
+def setup_aware_sequence(durations, due, priority, classes, setup, start=0.0):
+    """Secuencia de mínimo setup con resguardo de fechas de entrega
+
+    Vecino más cercano en tiempo de setup: tras cada trabajo sigue el
+    pendiente con menor setup desde el actual (desempate: mayor prioridad,
+    fecha más próxima), salvo que eso impida terminar a tiempo el pendiente
+    con fecha más próxima; en ese caso sigue ese. O(n²).
+
+    Args:
+        durations: horas de proceso de cada trabajo (incluido el buffer)
+        due: horas desde start hasta la entrega (inf sin fecha)
+        priority: prioridad de cada trabajo (mayor primero en empates)
+        classes: clase de setup de cada trabajo
+        setup: setup(clase_a, clase_b) en horas
+        start: hora de inicio de la secuencia
+
+    Returns:
+        list: índices en el orden propuesto
+    """
+    n = len(durations)
+    remaining = set(range(n))
+    by_due = sorted(range(n), key=lambda i: (due[i], -priority[i], i))
+    urgent_position = 0
+
+    sequence = []
+    t = start
+    current_class = None
+    while remaining:
+        while by_due[urgent_position] not in remaining:
+            urgent_position += 1
+        urgent = by_due[urgent_position]
+
+        def changeover(i):
+            return 0.0 if current_class is None else setup(current_class, classes[i])
+
+        choice = min(remaining, key=lambda i: (changeover(i), -priority[i], due[i], i))
+        if choice != urgent and due[urgent] != float('inf'):
+            finish = t + changeover(choice) + durations[choice]
+            urgent_finish = finish + setup(classes[choice], classes[urgent]) + durations[urgent]
+            if urgent_finish > due[urgent]:
+                choice = urgent
+
+        t += changeover(choice) + durations[choice]
+        current_class = classes[choice]
+        remaining.discard(choice)
+        sequence.append(choice)
+
+    return sequence
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .scheduling_problem import SequenceState, SwapMove, InsertMove, objective_value
+
+_logger = logging.getLogger(__name__)
+
+# Instantánea compartida por los procesos del pool (se envía una vez por proceso)
+_worker_problem = None
+
+
+def order_crossover(parent1, parent2, rng):
+    """Cruzamiento OX: segmento de parent1 y el resto en el orden de parent2"""
+    n = len(parent1)
+
+    # Seleccionar puntos de cruce
+    start = rng.randint(0, n - 1)
+    end = rng.randint(start + 1, n)
+
+    # Crear hijo con segmento del padre1
+    child = [None] * n
+    used = set(parent1[start:end])
+    child[start:end] = parent1[start:end]
+
+    # Completar con elementos del padre2 en orden
+    fill = (gene for gene in parent2 if gene not in used)
+    for i in range(n):
+        if child[i] is None:
+            child[i] = next(fill)
+
+    return child
+
+
+def swap_mutation(individual, rng):
+    """Copia de individual con dos posiciones intercambiadas"""
+    child = individual.copy()
+    i, j = rng.sample(range(len(child)), 2)
+    child[i], child[j] = child[j], child[i]
+    return child
+
+
+def random_move(n, rng):
+    """Movimiento aleatorio de intercambio o inserción entre dos posiciones"""
+    i, j = rng.sample(range(n), 2)
+    if rng.random() < 0.5:
+        return SwapMove(min(i, j), max(i, j))
+    return InsertMove(i, j)
+
+
+def _init_worker(problem):
+    global _worker_problem
+    _worker_problem = problem
+
+
+def _score(problem, params, sequence):
+    """Costo de una secuencia según el objetivo de la corrida"""
+    return objective_value(problem.evaluate(sequence, params['consider_setup']), params['objective'])
+
+
+def _new_island(problem, params, index, seed):
+    """Estado inicial de una isla con su propio generador sembrado
+
+    La población o la cadena inicial ya queda evaluada: la isla tiene una
+    mejor secuencia aunque el plazo se agote antes de la primera época.
+    """
+    rng = random.Random('%s-%s' % (seed, index))
+    island = {
+        'index': index,
+        'best': None,
+        'best_cost': float('inf'),
+        'initial_cost': None,
+        'evaluations': 0,
+        'migrants_accepted': 0,
+    }
+    if params['mode'] == 'genetic':
+        population = []
+        for _ in range(params['population_size']):
+            individual = list(range(problem.n_orders))
+            rng.shuffle(individual)
+            population.append(individual)
+        # Cada isla recibe una semilla heurística distinta para no perder diversidad
+        seeds = params.get('seeds') or []
+        if seeds:
+            population[0] = list(seeds[index % len(seeds)])
+        scored = sorted(((_score(problem, params, individual), individual) for individual in population),
+                        key=lambda x: x[0])
+        island['evaluations'] += len(scored)
+        island['initial_cost'], island['best_cost'] = scored[0][0], scored[0][0]
+        island['best'] = scored[0][1].copy()
+        island['population'] = [individual for _cost, individual in scored]
+    else:
+        sequence = list(range(problem.n_orders))
+        rng.shuffle(sequence)
+        seeds = params.get('seeds') or []
+        if index < len(seeds):
+            sequence = list(seeds[index])
+        cost = _score(problem, params, sequence)
+        island['evaluations'] += 1
+        island['initial_cost'], island['best_cost'], island['best'] = cost, cost, sequence.copy()
+        island['sequence'] = sequence
+        island['temperature'] = params['initial_temperature']
+    island['rng_state'] = rng.getstate()
+    return island
+
+
+def _evolve_genetic(problem, params, island, rng, steps):
+    """Correr steps generaciones sobre la población de la isla"""
+    objective = params['objective']
+    consider_setup = params['consider_setup']
+    population_size = params['population_size']
+    population = island['population']
+
+    def score(individual):
+        return objective_value(problem.evaluate(individual, consider_setup), objective)
+
+    for _generation in range(steps):
+        if params.get('deadline') and time.monotonic() > params['deadline']:
+            break
+        scored = sorted(((score(individual), individual) for individual in population), key=lambda x: x[0])
+        island['evaluations'] += len(scored)
+        if scored[0][0] < island['best_cost']:
+            island['best_cost'], island['best'] = scored[0][0], scored[0][1].copy()
+
+        survivors = [individual for _cost, individual in scored[:max(2, population_size // 2)]]
+        population = survivors.copy()
+        while len(population) < population_size:
+            parent1 = rng.choice(survivors)
+            parent2 = rng.choice(survivors)
+            if rng.random() < params['crossover_rate']:
+                child = order_crossover(parent1, parent2, rng)
+            else:
+                child = parent1.copy()
+            if rng.random() < params['mutation_rate']:
+                child = swap_mutation(child, rng)
+            population.append(child)
+
+    # Dejar la población ordenada para que la migración tome la élite del frente
+    scored = sorted(((score(individual), individual) for individual in population), key=lambda x: x[0])
+    island['evaluations'] += len(scored)
+    if scored[0][0] < island['best_cost']:
+        island['best_cost'], island['best'] = scored[0][0], scored[0][1].copy()
+    island['population'] = [individual for _cost, individual in scored]
+
+
+def _evolve_annealing(problem, params, island, rng, steps):
+    """Correr steps pasos de enfriamiento de la cadena de la isla"""
+    objective = params['objective']
+    state = SequenceState(problem, island['sequence'], params['consider_setup'])
+    current_cost = objective_value(state.evaluation, objective)
+    if current_cost < island['best_cost']:
+        island['best_cost'], island['best'] = current_cost, state.sequence.copy()
+
+    temperature = island['temperature']
+    for _step in range(steps):
+        if temperature <= params['min_temperature']:
+            break
+        if params.get('deadline') and time.monotonic() > params['deadline']:
+            break
+        move = random_move(problem.n_orders, rng)
+        neighbor_cost = objective_value(state.evaluate_move(move), objective)
+        island['evaluations'] += 1
+        if neighbor_cost < current_cost or rng.random() < math.exp(-(neighbor_cost - current_cost) / temperature):
+            state.apply(move)
+            current_cost = neighbor_cost
+            if current_cost < island['best_cost']:
+                island['best_cost'], island['best'] = current_cost, state.sequence.copy()
+        temperature *= params['cooling_rate']
+
+    island['sequence'] = state.sequence
+    island['temperature'] = temperature
+
+
+def _evolve(problem, params, island, steps):
+    """Avanzar una época de la isla restaurando y guardando su generador"""
+    rng = random.Random()
+    rng.setstate(island['rng_state'])
+    if params['mode'] == 'genetic':
+        _evolve_genetic(problem, params, island, rng, steps)
+    else:
+        _evolve_annealing(problem, params, island, rng, steps)
+    island['rng_state'] = rng.getstate()
+    return island
+
+
+def _run_epoch(args):
+    params, island, steps = args
+    return _evolve(_worker_problem, params, island, steps)
+
+
+def _migrate(islands, params):
+    """Migración en anillo: la élite de la isla i llega a la isla i + 1
+
+    Los emigrantes se toman de todas las islas antes de modificar ninguna,
+    así el resultado no depende del orden en que se procesan.
+    """
+    size = params['migration_size']
+    if size <= 0 or len(islands) < 2:
+        return
+    if params['mode'] == 'genetic':
+        emigrants = [[individual.copy() for individual in island['population'][:size]] for island in islands]
+        for index, island in enumerate(islands):
+            arriving = emigrants[index - 1]
+            # La población está ordenada: los migrantes reemplazan a los peores
+            island['population'][-len(arriving):] = arriving
+            island['migrants_accepted'] += len(arriving)
+    else:
+        emigrants = [(island['best_cost'], island['best']) for island in islands]
+        for index, island in enumerate(islands):
+            cost, sequence = emigrants[index - 1]
+            if sequence is not None and cost < island['best_cost']:
+                island['sequence'] = sequence.copy()
+                island['migrants_accepted'] += 1
+
+
+def run_islands(problem, params, n_islands, seed, processes=1):
+    """Ejecutar el modelo de islas y devolver la mejor secuencia encontrada
+
+    Args:
+        problem: SchedulingProblem (sin ORM, se envía a los procesos)
+        params: dict con mode ('genetic' o 'simulated_annealing'), objective,
+            consider_setup, migration_interval, migration_size y los
+            parámetros propios de GA o SA
+            (deadline opcional, en time.monotonic, corta la corrida)
+        n_islands: número de poblaciones/cadenas independientes
+        seed: semilla de la corrida; mismo seed, mismo resultado
+        processes: procesos del pool (1 = secuencial)
+
+    Returns:
+        tuple: (mejor secuencia, mejor costo, estadísticas por isla)
+    """
+    islands = [_new_island(problem, params, index, seed) for index in range(n_islands)]
+
+    interval = max(1, params['migration_interval'])
+    if params['mode'] == 'genetic':
+        total_steps = params['generations']
+    else:
+        total_steps = math.log(params['min_temperature'] / params['initial_temperature']) / math.log(params['cooling_rate'])
+    total_steps = max(int(math.ceil(total_steps)), 1)
+    epochs = int(math.ceil(total_steps / float(interval)))
+
+    executor = None
+    if processes > 1 and n_islands > 1:
+        try:
+            # fork: los procesos heredan el código ya importado y reciben la instantánea una sola vez
+            executor = ProcessPoolExecutor(
+                max_workers=min(processes, n_islands),
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_worker,
+                initargs=(problem,),
+            )
+        except (OSError, ValueError) as e:
+            _logger.warning(f"Pool de procesos no disponible, islas en secuencia: {str(e)}")
+
+    try:
+        for epoch in range(epochs):
+            # La primera época corre siempre, aunque el plazo ya se haya agotado
+            if epoch and params.get('deadline') and time.monotonic() > params['deadline']:
+                break
+            steps = min(interval, total_steps - epoch * interval)
+            if executor:
+                islands = list(executor.map(_run_epoch, [(params, island, steps) for island in islands]))
+            else:
+                islands = [_evolve(problem, params, island, steps) for island in islands]
+            if epoch < epochs - 1:
+                _migrate(islands, params)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    best_island = min(islands, key=lambda island: (island['best_cost'], island['index']))
+    stats = [{
+        'island': island['index'],
+        'initial_cost': island['initial_cost'],
+        'best_cost': island['best_cost'],
+        'evaluations': island['evaluations'],
+        'migrants_accepted': island['migrants_accepted'],
+    } for island in islands]
+    return best_island['best'], best_island['best_cost'], stats
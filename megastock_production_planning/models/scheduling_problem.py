@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+
+# Duración por defecto (horas por unidad) para órdenes sin ruta
+DEFAULT_HOURS_PER_UNIT = 0.1
+
+# Estados de megastock.production.schedule que ocupan la máquina
+BUSY_SCHEDULE_STATES = ('scheduled', 'confirmed', 'in_progress')
+
+# Peso del makespan como desempate cuando el objetivo principal es otro
+OBJECTIVE_TIEBREAK = 1e-3
+
+Evaluation = namedtuple('Evaluation', 'makespan weighted_tardiness setup_time total_completion')
+
+
+def objective_value(evaluation, objective):
+    """Reducir una Evaluation al escalar de optimization_objective (menor es mejor)
+
+    El makespan entra siempre con un peso pequeño para desempatar
+    secuencias equivalentes en el objetivo principal.
+    """
+    if objective == 'minimize_lateness':
+        primary = evaluation.weighted_tardiness
+    elif objective == 'minimize_setup_time':
+        primary = evaluation.setup_time
+    elif objective == 'minimize_total_completion':
+        primary = evaluation.total_completion
+    elif objective == 'minimize_cost':
+        primary = evaluation.weighted_tardiness + evaluation.setup_time
+    else:
+        # makespan, utilización y balance de carga: acortar el programa
+        return evaluation.makespan
+    return primary + OBJECTIVE_TIEBREAK * evaluation.makespan
+
+
+class SchedulingProblem(object):
+    """Instantánea del problema de programación construida una vez por ejecución
+
+    Las órdenes y centros de trabajo se indexan con enteros y todos los datos
+    que usan los algoritmos quedan en arreglos numpy:
+
+    - processing[i, k]: horas de la orden i en el centro k
+    - due[i]: horas desde start hasta date_planned_finished (inf sin fecha)
+    - release[i]: horas desde start hasta date_planned_start (>= 0)
+    - setup_class[i]: perfil de setup (flauta, test, colores, troquel) como entero
+    - weight[i]: peso de tardanza según la prioridad de la orden
+    - create_rank[i]: posición por fecha de creación (FIFO/LIFO)
+    - setup_hours[k]: setup genérico del centro k cuando cambia la clase
+    - setup_matrix[k][a][b]: setup (h) del centro k al pasar de la clase a a la b
+    - machine_ready[k]: horas desde start hasta que el centro k queda libre
+
+    Los centros forman las etapas de un flow-shop en el orden dado
+    (corrugadora → impresora → troqueladora → pegadora). Los algoritmos
+    trabajan con secuencias de índices y solo vuelven a los registros al
+    armar el programa final.
+    """
+
+    def __init__(self, order_ids, workcenter_ids, processing, due, release,
+                 setup_class, weight, create_rank, start, setup_hours=None, machine_ready=None,
+                 setup_matrix=None):
+        self.order_ids = list(order_ids)
+        self.workcenter_ids = list(workcenter_ids)
+        self.processing = np.asarray(processing, dtype=float)
+        self.due = np.asarray(due, dtype=float)
+        self.release = np.asarray(release, dtype=float)
+        self.setup_class = np.asarray(setup_class, dtype=int)
+        self.weight = np.asarray(weight, dtype=float)
+        self.create_rank = np.asarray(create_rank, dtype=int)
+        self.start = start
+        self.total = self.processing.sum(axis=1)
+        m = self.processing.shape[1] if self.processing.ndim == 2 else 1
+        self.setup_hours = np.zeros(m) if setup_hours is None else np.asarray(setup_hours, dtype=float)
+        self.machine_ready = np.zeros(m) if machine_ready is None else np.asarray(machine_ready, dtype=float)
+
+        # Copias en listas: el bucle del simulador es más rápido sobre listas que sobre escalares numpy
+        self._p = self.processing.tolist()
+        self._due = self.due.tolist()
+        self._release = self.release.tolist()
+        self._class = self.setup_class.tolist()
+        self._weight = self.weight.tolist()
+        if setup_matrix is None:
+            classes = int(self.setup_class.max()) + 1 if self.setup_class.size else 1
+            setup_matrix = [[[0.0 if a == b else hours for b in range(classes)] for a in range(classes)]
+                            for hours in self.setup_hours.tolist()]
+        self.setup_matrix = setup_matrix
+        self._ready = self.machine_ready.tolist()
+
+    @property
+    def n_orders(self):
+        return len(self.order_ids)
+
+    @property
+    def n_workcenters(self):
+        return len(self.workcenter_ids)
+
+    @classmethod
+    def from_orders(cls, production_orders, workcenters=None, start=None):
+        """Construir la instantánea recorriendo el ORM una sola vez
+
+        Args:
+            production_orders: Recordset de mrp.production
+            workcenters: Recordset/lista de mrp.workcenter en orden de etapa (opcional).
+                Si no se indica, se toman de las operaciones de las rutas.
+            start: Instante de referencia (por defecto ahora)
+        """
+        start = start or datetime.now()
+        orders = list(production_orders)
+
+        if workcenters:
+            workcenter_list = list(workcenters)
+        else:
+            workcenter_list = []
+            for order in orders:
+                for operation in (order.routing_id.operation_ids if order.routing_id else []):
+                    if operation.workcenter_id not in workcenter_list:
+                        workcenter_list.append(operation.workcenter_id)
+        column = {workcenter.id: k for k, workcenter in enumerate(workcenter_list)}
+
+        n = len(orders)
+        m = max(len(workcenter_list), 1)
+        SetupMatrix = orders[0].env['megastock.setup.matrix'] if orders else None
+        processing = np.zeros((n, m))
+        due = np.full(n, np.inf)
+        release = np.zeros(n)
+        setup_class = np.zeros(n, dtype=int)
+        weight = np.ones(n)
+        setup_codes = {}
+
+        for i, order in enumerate(orders):
+            if order.routing_id:
+                for operation in order.routing_id.operation_ids:
+                    k = column.get(operation.workcenter_id.id)
+                    if k is None:
+                        continue
+                    minutes = (operation.time_cycle * order.product_qty) + (operation.time_mode_batch or 0)
+                    processing[i, k] += minutes / 60.0
+            else:
+                processing[i, 0] = order.product_qty * DEFAULT_HOURS_PER_UNIT
+
+            if order.date_planned_finished:
+                due[i] = (order.date_planned_finished - start).total_seconds() / 3600.0
+            if order.date_planned_start:
+                release[i] = max(0.0, (order.date_planned_start - start).total_seconds() / 3600.0)
+
+            setup_key = SetupMatrix._profile_from_product(order.product_id)
+            setup_class[i] = setup_codes.setdefault(setup_key, len(setup_codes))
+            weight[i] = 1.0 + float(getattr(order, 'priority', 0) or 0)
+
+        create_dates = [order.create_date or start for order in orders]
+        create_rank = np.argsort(np.argsort(np.array(create_dates, dtype='datetime64[us]'), kind='stable'), kind='stable')
+
+        # Setup por centro y disponibilidad según la programación ya comprometida
+        setup_hours = np.zeros(m)
+        machine_ready = np.zeros(m)
+        for k, workcenter in enumerate(workcenter_list):
+            setup_hours[k] = (workcenter.time_start or 0.0) / 60.0
+        setup_matrix = None
+        if workcenter_list and orders:
+            profiles = list(setup_codes)
+            setup_matrix = [[[minutes / 60.0 for minutes in row]
+                             for row in SetupMatrix._build_matrix(workcenter, profiles)]
+                            for workcenter in workcenter_list]
+        if workcenter_list and orders:
+            env = orders[0].env
+            busy = env['megastock.production.schedule'].read_group(
+                [('workcenter_id', 'in', list(column)),
+                 ('state', 'in', list(BUSY_SCHEDULE_STATES)),
+                 ('production_id', 'not in', [order.id for order in orders]),
+                 ('end_datetime', '>', start)],
+                ['end_datetime:max'],
+                ['workcenter_id'],
+            )
+            for group in busy:
+                k = column[group['workcenter_id'][0]]
+                machine_ready[k] = max(0.0, (group['end_datetime'] - start).total_seconds() / 3600.0)
+
+        return cls(
+            [order.id for order in orders],
+            [workcenter.id for workcenter in workcenter_list],
+            processing, due, release, setup_class, weight, create_rank, start,
+            setup_hours=setup_hours, machine_ready=machine_ready, setup_matrix=setup_matrix,
+        )
+
+    def evaluate(self, sequence, consider_setup=True, with_times=False):
+        """Simular la secuencia en el flow-shop y devolver sus objetivos en O(n·m)
+
+        Cada orden recorre las etapas en orden; en cada etapa empieza cuando
+        llega de la etapa anterior (o desde su liberación) y la máquina quedó
+        libre, más el setup de la matriz entre la clase de la orden anterior
+        en esa máquina y la suya. Las etapas sin tiempo se saltan.
+
+        Returns:
+            Evaluation (y, si with_times, lista de [(k, inicio, fin)] por posición)
+        """
+        free = list(self._ready)
+        last_class = [None] * len(free)
+        makespan = tardiness = setup_total = total_completion = 0.0
+        times = [] if with_times else None
+
+        for j in sequence:
+            operations = [] if with_times else None
+            t, setup = self._advance(j, free, last_class, consider_setup, operations)
+            setup_total += setup
+            total_completion += t
+            if t > makespan:
+                makespan = t
+            late = t - self._due[j]
+            if late > 0.0:
+                tardiness += self._weight[j] * late
+            if with_times:
+                times.append(operations)
+
+        evaluation = Evaluation(makespan, tardiness, setup_total, total_completion)
+        if with_times:
+            return evaluation, times
+        return evaluation
+
+    def _advance(self, j, free, last_class, consider_setup, operations=None):
+        """Pasar la orden j por las etapas actualizando free/last_class en sitio
+
+        Returns:
+            tuple: (hora de fin de la orden, horas de setup agregadas)
+        """
+        t = self._release[j]
+        job_class = self._class[j]
+        setup_matrix = self.setup_matrix
+        setup_total = 0.0
+        for k, duration in enumerate(self._p[j]):
+            if duration <= 0.0:
+                continue
+            begin = free[k]
+            if consider_setup and last_class[k] is not None and last_class[k] != job_class:
+                setup = setup_matrix[k][last_class[k]][job_class]
+                begin += setup
+                setup_total += setup
+            if t > begin:
+                begin = t
+            t = begin + duration
+            free[k] = t
+            last_class[k] = job_class
+            if operations is not None:
+                operations.append((k, begin, t))
+        return t, setup_total
+
+    def to_schedule(self, sequence, consider_setup=True):
+        """Programa (lista de dicts) con los tiempos simulados del flow-shop"""
+        _evaluation, times = self.evaluate(sequence, consider_setup, with_times=True)
+        schedule = []
+        for position, (i, operations) in enumerate(zip(sequence, times), 1):
+            begin = operations[0][1] if operations else self._release[i]
+            end = operations[-1][2] if operations else begin
+            schedule.append({
+                'production_id': self.order_ids[i],
+                'start_time': self.start + timedelta(hours=begin),
+                'end_time': self.start + timedelta(hours=end),
+                'duration': float(self.total[i]),
+                'sequence': position,
+                'operations': [{
+                    'workcenter_id': self.workcenter_ids[k] if k < len(self.workcenter_ids) else False,
+                    'start_time': self.start + timedelta(hours=op_start),
+                    'end_time': self.start + timedelta(hours=op_end),
+                } for k, op_start, op_end in operations],
+            })
+        return schedule
+
+
+class SwapMove(namedtuple('SwapMove', 'i j')):
+    """Intercambiar las órdenes de las posiciones i < j"""
+    __slots__ = ()
+
+    @property
+    def first(self):
+        return self.i
+
+    @property
+    def last(self):
+        return self.j
+
+    def job_at(self, sequence, position):
+        if position == self.i:
+            return sequence[self.j]
+        if position == self.j:
+            return sequence[self.i]
+        return sequence[position]
+
+    def apply(self, sequence):
+        sequence[self.i], sequence[self.j] = sequence[self.j], sequence[self.i]
+
+
+class InsertMove(namedtuple('InsertMove', 'i j')):
+    """Sacar la orden de la posición i e insertarla en la posición j"""
+    __slots__ = ()
+
+    @property
+    def first(self):
+        return min(self.i, self.j)
+
+    @property
+    def last(self):
+        return max(self.i, self.j)
+
+    def job_at(self, sequence, position):
+        if position == self.j:
+            return sequence[self.i]
+        if self.i < self.j:
+            return sequence[position + 1]
+        return sequence[position - 1]
+
+    def apply(self, sequence):
+        sequence.insert(self.j, sequence.pop(self.i))
+
+
+class SequenceState(object):
+    """Secuencia actual con el estado del flow-shop guardado por posición
+
+    free[a] y last_class[a] son el estado de las máquinas antes de la
+    posición a y acc[a] los acumulados (makespan, tardanza, setup, suma de
+    fines) hasta ahí. Un movimiento solo se simula desde su primera posición
+    cambiada, y se corta en cuanto el estado vuelve a coincidir con el
+    guardado después de la última posición cambiada. Los arreglos se
+    reutilizan entre movimientos y solo se reescriben al aplicar uno.
+    """
+
+    def __init__(self, problem, sequence, consider_setup=True):
+        self.problem = problem
+        self.consider_setup = consider_setup
+        self.sequence = list(sequence)
+        n = len(self.sequence)
+        m = len(problem._ready)
+        self.free = [list(problem._ready) for _a in range(n + 1)]
+        self.last_class = [[None] * m for _a in range(n + 1)]
+        self.acc = [(0.0, 0.0, 0.0, 0.0)] * (n + 1)
+        self.completion = [0.0] * n
+        self.tail_makespan = [0.0] * (n + 1)
+        self._rebuild(0)
+
+    @property
+    def evaluation(self):
+        return Evaluation(*self.acc[-1])
+
+    def _rebuild(self, start):
+        """Recalcular el estado guardado desde la posición start"""
+        problem = self.problem
+        sequence = self.sequence
+        due = problem._due
+        weight = problem._weight
+        makespan, tardiness, setup_total, total_completion = self.acc[start]
+        for a in range(start, len(sequence)):
+            free = self.free[a + 1]
+            last_class = self.last_class[a + 1]
+            free[:] = self.free[a]
+            last_class[:] = self.last_class[a]
+            j = sequence[a]
+            t, setup = problem._advance(j, free, last_class, self.consider_setup)
+            self.completion[a] = t
+            late = t - due[j]
+            self.acc[a + 1] = (
+                makespan if makespan > t else t,
+                tardiness + (weight[j] * late if late > 0.0 else 0.0),
+                setup_total + setup,
+                total_completion + t,
+            )
+            makespan, tardiness, setup_total, total_completion = self.acc[a + 1]
+
+        # Máximo de fines desde cada posición hasta el final (para cortar la simulación)
+        tail = 0.0
+        for a in range(len(sequence) - 1, -1, -1):
+            if self.completion[a] > tail:
+                tail = self.completion[a]
+            self.tail_makespan[a] = tail
+
+    def evaluate_move(self, move):
+        """Evaluation de la secuencia tras aplicar move, sin modificar el estado"""
+        problem = self.problem
+        sequence = self.sequence
+        due = problem._due
+        weight = problem._weight
+        start, last = move.first, move.last
+        free = list(self.free[start])
+        last_class = list(self.last_class[start])
+        makespan, tardiness, setup_total, total_completion = self.acc[start]
+
+        for a in range(start, len(sequence)):
+            if a > last and free == self.free[a] and last_class == self.last_class[a]:
+                # El resto de la secuencia se programa igual que en el estado guardado
+                final = self.acc[-1]
+                before = self.acc[a]
+                return Evaluation(
+                    max(makespan, self.tail_makespan[a]),
+                    tardiness + final[1] - before[1],
+                    setup_total + final[2] - before[2],
+                    total_completion + final[3] - before[3],
+                )
+            j = move.job_at(sequence, a) if a <= last else sequence[a]
+            t, setup = problem._advance(j, free, last_class, self.consider_setup)
+            setup_total += setup
+            total_completion += t
+            if t > makespan:
+                makespan = t
+            late = t - due[j]
+            if late > 0.0:
+                tardiness += weight[j] * late
+
+        return Evaluation(makespan, tardiness, setup_total, total_completion)
+
+    def apply(self, move):
+        """Aplicar move a la secuencia y actualizar el estado desde su primera posición"""
+        move.apply(self.sequence)
+        self._rebuild(move.first)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Atributos de producto que definen el perfil de setup y minutos por defecto
+# cuando cambian (mismos valores base que la secuenciación de corrugadora)
+SETUP_ATTRIBUTES = [
+    ('flauta', 20.0),
+    ('test_value', 10.0),
+    ('colors_printing', 15.0),
+    ('numero_troquel', 25.0),
+]
+
+# Huecos mayores entre trabajos no se consideran cambio de formato (paradas, turnos)
+MAX_CHANGEOVER_MINUTES = 240.0
+
+# Observaciones que pesa el promedio móvil del aprendizaje
+LEARNING_WINDOW = 20
+
+# Setups aprendidos de este proceso: {(base de datos, workcenter_id): (firma, {par: minutos})}
+_learned_setups = {}
+
+
+class SetupMatrix(models.Model):
+    """Tiempos de cambio dependientes de la secuencia, por máquina
+
+    Cada registro guarda el setup aprendido al pasar de un perfil de producto
+    (flauta, test, colores, troquel) a otro en un centro de trabajo. Los pares
+    sin historial usan los minutos por defecto de los atributos que cambian,
+    con el setup genérico del centro (time_start) como mínimo.
+    """
+    _name = 'megastock.setup.matrix'
+    _description = 'Matriz de Setup por Máquina MEGASTOCK'
+    _order = 'workcenter_id, from_profile, to_profile'
+
+    workcenter_id = fields.Many2one(
+        'mrp.workcenter',
+        string='Centro de Trabajo',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    from_profile = fields.Char(string='Perfil Anterior', required=True)
+    to_profile = fields.Char(string='Perfil Siguiente', required=True)
+
+    setup_minutes = fields.Float(
+        string='Setup (min)',
+        help='Promedio móvil de los cambios observados'
+    )
+
+    sample_count = fields.Integer(string='Observaciones', default=0)
+    last_observed = fields.Datetime(string='Última Observación')
+
+    _sql_constraints = [
+        ('workcenter_profiles_unique', 'unique(workcenter_id, from_profile, to_profile)',
+         'Solo puede existir una entrada por máquina y par de perfiles.'),
+    ]
+
+    @api.model
+    def _profile_from_product(self, product):
+        """Clave del perfil de setup de un producto: valores de SETUP_ATTRIBUTES unidos por '|'"""
+        template = product.product_tmpl_id
+        return '|'.join(str(template[name] or '') for name, _minutes in SETUP_ATTRIBUTES)
+
+    @api.model
+    def _get_learned(self, workcenter_id):
+        """Setups aprendidos de una máquina: {(perfil_desde, perfil_hasta): minutos}
+        
+        Se guardan en memoria del proceso por máquina y se releen solo cuando
+        cambió la firma de sus entradas (cantidad, última escritura): una
+        observación nueva invalida la matriz de esa máquina y no las cachés
+        de todo el registro.
+        """
+        Matrix = self.sudo()
+        Matrix.flush_model()
+        groups = Matrix.read_group(
+            [('workcenter_id', '=', workcenter_id)], ['write_date:max'], [], lazy=False)
+        signature = (groups[0]['__count'], groups[0]['write_date']) if groups else (0, None)
+        
+        key = (self.env.cr.dbname, workcenter_id)
+        cached = _learned_setups.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        entries = Matrix.search_read(
+            [('workcenter_id', '=', workcenter_id)],
+            ['from_profile', 'to_profile', 'setup_minutes'],
+        )
+        learned = {(entry['from_profile'], entry['to_profile']): entry['setup_minutes'] for entry in entries}
+        _learned_setups[key] = (signature, learned)
+        return learned
+
+    @api.model
+    def _default_minutes(self, workcenter, from_profile, to_profile):
+        """Setup estimado sin historial: suma de atributos que cambian"""
+        if from_profile == to_profile:
+            return 0.0
+        minutes = sum(
+            default for (_name, default), before, after
+            in zip(SETUP_ATTRIBUTES, from_profile.split('|'), to_profile.split('|'))
+            if before != after
+        )
+        return max(minutes, workcenter.time_start or 0.0)
+
+    @api.model
+    def get_setup_minutes(self, workcenter, from_profile, to_profile, learned=None):
+        if not from_profile or from_profile == to_profile:
+            return 0.0
+        if learned is None:
+            learned = self._get_learned(workcenter.id)
+        if (from_profile, to_profile) in learned:
+            return learned[(from_profile, to_profile)]
+        return self._default_minutes(workcenter, from_profile, to_profile)
+
+    @api.model
+    def _build_matrix(self, workcenter, profiles):
+        """Matriz densa de minutos entre perfiles (índices según la lista dada)"""
+        learned = self._get_learned(workcenter.id)
+        return [[self.get_setup_minutes(workcenter, before, after, learned) for after in profiles]
+                for before in profiles]
+
+    @api.model
+    def _record_changeover(self, workcenter, from_profile, to_profile, minutes):
+        """Incorporar un cambio observado al promedio móvil del par"""
+        if not workcenter or from_profile == to_profile or not 0 < minutes <= MAX_CHANGEOVER_MINUTES:
+            return
+        entry = self.sudo().search([
+            ('workcenter_id', '=', workcenter.id),
+            ('from_profile', '=', from_profile),
+            ('to_profile', '=', to_profile),
+        ], limit=1)
+        if entry:
+            weight = min(entry.sample_count + 1, LEARNING_WINDOW)
+            entry.write({
+                'setup_minutes': entry.setup_minutes + (minutes - entry.setup_minutes) / weight,
+                'sample_count': entry.sample_count + 1,
+                'last_observed': fields.Datetime.now(),
+            })
+        else:
+            self.sudo().create({
+                'workcenter_id': workcenter.id,
+                'from_profile': from_profile,
+                'to_profile': to_profile,
+                'setup_minutes': minutes,
+                'sample_count': 1,
+                'last_observed': fields.Datetime.now(),
+            })
+
+    def _drop_learned(self):
+        """Descartar la matriz en memoria de las máquinas de estos registros
+        
+        Escrituras de la misma transacción comparten write_date y no mueven la
+        firma; las de otros procesos sí, y esos releen por firma.
+        """
+        dbname = self.env.cr.dbname
+        for workcenter_id in set(self.workcenter_id.ids):
+            _learned_setups.pop((dbname, workcenter_id), None)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._drop_learned()
+        return records
+
+    def write(self, vals):
+        self._drop_learned()
+        result = super().write(vals)
+        self._drop_learned()
+        return result
+
+    def unlink(self):
+        self._drop_learned()
+        return super().unlink()
@@ -3,10 +3,47 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
 from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+from collections import Counter, defaultdict
+import json
 import logging
 
+from .scheduling_heuristics import setup_aware_sequence
+
 _logger = logging.getLogger(__name__)
 
+# Ventana del throughput: un contador por minuto en un ring buffer
+THROUGHPUT_WINDOW_MINUTES = 60
+
+# Contador de la cola que lleva cada estado de item
+STATE_COUNTERS = {
+    'waiting': 'waiting_items',
+    'in_progress': 'in_progress_items',
+    'completed': 'completed_items',
+}
+
+
+def _epoch_minute(moment):
+    """Minuto absoluto (UTC) de un datetime naive de Odoo"""
+    return int((moment - datetime(1970, 1, 1)).total_seconds() // 60)
+
+
+def _advance_ring(buckets, last_minute, now_minute):
+    """Vaciar los minutos del ring buffer que salieron de la ventana
+
+    buckets[minuto % tamaño] cuenta los completados de ese minuto; tras
+    avanzar a now_minute la suma es el total de la última ventana.
+    """
+    size = len(buckets)
+    elapsed = now_minute - last_minute
+    if elapsed >= size:
+        return [0] * size
+    buckets = list(buckets)
+    for minute in range(last_minute + 1, now_minute + 1):
+        buckets[minute % size] = 0
+    return buckets
+
+
 class WorkQueue(models.Model):
     _name = 'megastock.work.queue'
     _description = 'Cola de Trabajo MEGASTOCK'
@@ -75,40 +112,71 @@ class WorkQueue(models.Model):
     )
     
     # === ESTADÍSTICAS ===
+    # Contadores mantenidos por las transiciones de los items (ver
+    # WorkQueueItem._apply_queue_transitions); leerlos no recorre el historial
     total_items = fields.Integer(
         string='Total Items',
-        compute='_compute_statistics',
-        store=True
+        readonly=True
     )
     
     waiting_items = fields.Integer(
         string='Items Esperando',
-        compute='_compute_statistics',
-        store=True
+        readonly=True
     )
     
     in_progress_items = fields.Integer(
         string='Items en Progreso',
-        compute='_compute_statistics',
-        store=True
+        readonly=True
     )
     
     completed_items = fields.Integer(
         string='Items Completados',
-        compute='_compute_statistics',
-        store=True
+        readonly=True
+    )
+    
+    current_items_count = fields.Integer(
+        string='Items Pendientes',
+        readonly=True,
+        help='Items esperando o en progreso'
     )
     
     average_waiting_time = fields.Float(
         string='Tiempo Promedio Espera (min)',
-        compute='_compute_performance_metrics',
-        help='Tiempo promedio de espera en cola'
+        readonly=True,
+        help='Promedio móvil de la espera en cola de los items completados'
+    )
+    
+    waiting_sample_count = fields.Integer(
+        string='Muestras de Espera',
+        readonly=True
+    )
+    
+    average_efficiency = fields.Float(
+        string='Eficiencia Promedio (%)',
+        readonly=True,
+        help='Promedio móvil de duración estimada vs real de los items completados'
+    )
+    
+    efficiency_sample_count = fields.Integer(
+        string='Muestras de Eficiencia',
+        readonly=True
+    )
+    
+    completion_ring = fields.Char(
+        string='Completados por Minuto',
+        readonly=True,
+        help='Ring buffer (JSON) de completados de la última hora'
+    )
+    
+    completion_ring_minute = fields.Integer(
+        string='Minuto del Ring Buffer',
+        readonly=True
     )
     
     throughput_per_hour = fields.Float(
         string='Throughput por Hora',
-        compute='_compute_performance_metrics',
-        help='Número de trabajos completados por hora'
+        compute='_compute_throughput',
+        help='Número de trabajos completados en la última hora'
     )
     
     current_workload_hours = fields.Float(
@@ -131,35 +199,122 @@ class WorkQueue(models.Model):
     
     # === MÉTODOS COMPUTADOS ===
     
-    @api.depends('queue_item_ids.state')
-    def _compute_statistics(self):
-        """Calcular estadísticas de la cola"""
-        for queue in self:
-            items = queue.queue_item_ids
-            queue.total_items = len(items)
-            queue.waiting_items = len(items.filtered(lambda i: i.state == 'waiting'))
-            queue.in_progress_items = len(items.filtered(lambda i: i.state == 'in_progress'))
-            queue.completed_items = len(items.filtered(lambda i: i.state == 'completed'))
-    
-    def _compute_performance_metrics(self):
-        """Calcular métricas de performance"""
+    def _compute_throughput(self):
+        """Calcular throughput desde el ring buffer de completados"""
+        now_minute = _epoch_minute(fields.Datetime.now())
         for queue in self:
-            completed_items = queue.queue_item_ids.filtered(lambda i: i.state == 'completed')
+            queue.throughput_per_hour = queue._completions_in_window(now_minute)
+    
+    def _completions_in_window(self, now_minute):
+        """Completados de la última hora, sin escribir el ring buffer"""
+        if not self.completion_ring:
+            return 0
+        buckets = _advance_ring(json.loads(self.completion_ring), self.completion_ring_minute, now_minute)
+        return sum(buckets)
+    
+    def _record_item_events(self, state_deltas, completed_items):
+        """Actualizar los contadores de la cola con las transiciones de sus items
+        
+        Args:
+            state_deltas: Counter {estado: +/- items} de las transiciones
+            completed_items: items que acaban de pasar a completado
+        """
+        self.ensure_one()
+        vals = {}
+        for state, field_name in STATE_COUNTERS.items():
+            if state_deltas.get(state):
+                vals[field_name] = self[field_name] + state_deltas[state]
+        total_delta = sum(state_deltas.values())
+        if total_delta:
+            vals['total_items'] = self.total_items + total_delta
+        pending_delta = state_deltas.get('waiting', 0) + state_deltas.get('in_progress', 0)
+        if pending_delta:
+            vals['current_items_count'] = self.current_items_count + pending_delta
+        
+        if completed_items:
+            now_minute = _epoch_minute(fields.Datetime.now())
+            if self.completion_ring:
+                buckets = _advance_ring(json.loads(self.completion_ring), self.completion_ring_minute, now_minute)
+            else:
+                buckets = [0] * THROUGHPUT_WINDOW_MINUTES
             
-            if completed_items:
-                # Tiempo promedio de espera
-                waiting_times = completed_items.mapped('actual_waiting_time')
-                queue.average_waiting_time = sum(waiting_times) / len(waiting_times) if waiting_times else 0.0
+            average_wait, wait_count = self.average_waiting_time, self.waiting_sample_count
+            average_efficiency, efficiency_count = self.average_efficiency, self.efficiency_sample_count
+            for item in completed_items:
+                minute = _epoch_minute(item.completion_time) if item.completion_time else now_minute
+                if 0 <= now_minute - minute < THROUGHPUT_WINDOW_MINUTES:
+                    buckets[minute % THROUGHPUT_WINDOW_MINUTES] += 1
                 
-                # Throughput por hora (últimas 24 horas)
-                twenty_four_hours_ago = datetime.now() - timedelta(hours=24)
-                recent_completed = completed_items.filtered(
-                    lambda i: i.completion_time and i.completion_time >= twenty_four_hours_ago
-                )
-                queue.throughput_per_hour = len(recent_completed) / 24.0
-            else:
-                queue.average_waiting_time = 0.0
-                queue.throughput_per_hour = 0.0
+                wait_count += 1
+                average_wait += (item.actual_waiting_time - average_wait) / wait_count
+                if item.estimated_duration > 0 and item.actual_duration > 0:
+                    efficiency_count += 1
+                    efficiency = min(100, (item.estimated_duration / item.actual_duration) * 100)
+                    average_efficiency += (efficiency - average_efficiency) / efficiency_count
+            
+            vals.update({
+                'completion_ring': json.dumps(buckets),
+                'completion_ring_minute': now_minute,
+                'average_waiting_time': average_wait,
+                'waiting_sample_count': wait_count,
+                'average_efficiency': average_efficiency,
+                'efficiency_sample_count': efficiency_count,
+            })
+        
+        if vals:
+            self.write(vals)
+    
+    @api.model
+    def _rebuild_queue_statistics(self):
+        """Recalcular desde los items todos los contadores y promedios
+        
+        Corrige cualquier deriva de los contadores incrementales; corre en el
+        cron nocturno, no en el dashboard. También los inicializa al instalar
+        o actualizar el módulo (función en cron_jobs_data.xml).
+        """
+        Item = self.env['megastock.work.queue.item']
+        queues = self.with_context(active_test=False).search([])
+        now_minute = _epoch_minute(fields.Datetime.now())
+        
+        counts = defaultdict(Counter)
+        for group in Item.read_group([], ['work_queue_id'], ['work_queue_id', 'state'], lazy=False):
+            counts[group['work_queue_id'][0]][group['state']] = group['__count']
+        
+        completed = defaultdict(list)
+        for item in Item.search_read(
+            [('state', '=', 'completed')],
+            ['work_queue_id', 'actual_waiting_time', 'estimated_duration', 'actual_duration', 'completion_time'],
+        ):
+            completed[item['work_queue_id'][0]].append(item)
+        
+        for queue in queues:
+            state_counts = counts[queue.id]
+            items = completed[queue.id]
+            buckets = [0] * THROUGHPUT_WINDOW_MINUTES
+            efficiencies = []
+            for item in items:
+                if item['completion_time']:
+                    minute = _epoch_minute(item['completion_time'])
+                    if 0 <= now_minute - minute < THROUGHPUT_WINDOW_MINUTES:
+                        buckets[minute % THROUGHPUT_WINDOW_MINUTES] += 1
+                if item['estimated_duration'] > 0 and item['actual_duration'] > 0:
+                    efficiencies.append(min(100, (item['estimated_duration'] / item['actual_duration']) * 100))
+            
+            queue.write({
+                'total_items': sum(state_counts.values()),
+                'waiting_items': state_counts['waiting'],
+                'in_progress_items': state_counts['in_progress'],
+                'completed_items': state_counts['completed'],
+                'current_items_count': state_counts['waiting'] + state_counts['in_progress'],
+                'average_waiting_time': sum(item['actual_waiting_time'] for item in items) / len(items) if items else 0.0,
+                'waiting_sample_count': len(items),
+                'average_efficiency': sum(efficiencies) / len(efficiencies) if efficiencies else 0.0,
+                'efficiency_sample_count': len(efficiencies),
+                'completion_ring': json.dumps(buckets),
+                'completion_ring_minute': now_minute,
+            })
+        
+        _logger.info(f"Estadísticas recalculadas para {len(queues)} colas de trabajo")
     
     @api.depends('queue_item_ids.estimated_duration')
     def _compute_workload(self):
@@ -293,43 +448,66 @@ class WorkQueue(models.Model):
             items = self._custom_sequence_logic(items)
         
         # Asignar nuevos números de secuencia
-        for index, item in enumerate(items):
-            item.sequence = index + 1
-            item.scheduled_start_time = self._calculate_scheduled_start_time(index, items)
+        self._write_sequence(items)
     
     def _custom_sequence_logic(self, items):
-        """Lógica personalizada de secuenciación"""
-        # Implementar algoritmo personalizado
-        # Por ejemplo: minimizar setup times, balancear tipos de producto, etc.
-        
-        # Agrupar por tipo de producto para minimizar setups
-        grouped_items = {}
-        for item in items:
-            product_type = item.production_id.product_id.categ_id.name
-            if product_type not in grouped_items:
-                grouped_items[product_type] = []
-            grouped_items[product_type].append(item)
-        
-        # Ordenar cada grupo por prioridad
-        sequenced_items = []
-        for product_type, type_items in grouped_items.items():
-            type_items = sorted(type_items, key=lambda i: i.priority, reverse=True)
-            sequenced_items.extend(type_items)
-        
-        return sequenced_items
-    
-    def _calculate_scheduled_start_time(self, index, items):
-        """Calcular tiempo programado de inicio"""
-        base_time = datetime.now()
-        
-        # Sumar duración de items anteriores
-        for i in range(index):
-            if i < len(items):
-                duration_hours = items[i].estimated_duration
-                buffer_hours = self.buffer_time_minutes / 60.0
-                base_time += timedelta(hours=duration_hours + buffer_hours)
-        
-        return base_time
+        """Lógica personalizada de secuenciación
+        
+        Minimiza el setup total con la matriz aprendida de la máquina de la
+        cola (flauta, test, colores, troquel), sin dejar atrasar el item con
+        fecha de entrega más próxima.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return items
+        
+        SetupMatrix = self.env['megastock.setup.matrix']
+        profiles = [SetupMatrix._profile_from_product(item.production_id.product_id) for item in items]
+        codes = {}
+        classes = [codes.setdefault(profile, len(codes)) for profile in profiles]
+        matrix = SetupMatrix._build_matrix(self.workcenter_id, list(codes))
+        
+        now = fields.Datetime.now()
+        buffer_hours = self.buffer_time_minutes / 60.0
+        durations = [item.estimated_duration + buffer_hours for item in items]
+        due = [(item.due_date - now).total_seconds() / 3600.0 if item.due_date else float('inf')
+               for item in items]
+        priority = [item.priority for item in items]
+        
+        order = setup_aware_sequence(
+            durations, due, priority, classes, lambda before, after: matrix[before][after] / 60.0)
+        return [items[i] for i in order]
+    
+    def _write_sequence(self, items):
+        """Escribir sequence y scheduled_start_time de los items en un solo UPDATE
+        
+        El inicio programado de cada item es la suma acumulada de duraciones
+        y buffers de los anteriores, calculada en una sola pasada.
+        """
+        if not items:
+            return
+        
+        Item = self.env['megastock.work.queue.item']
+        Item.flush_model(['sequence', 'scheduled_start_time'])
+        
+        base_time = fields.Datetime.now()
+        buffer_hours = self.buffer_time_minutes / 60.0
+        elapsed_hours = 0.0
+        rows = []
+        for index, item in enumerate(items):
+            rows.append((item.id, index + 1, base_time + timedelta(hours=elapsed_hours), self.env.uid))
+            elapsed_hours += item.estimated_duration + buffer_hours
+        
+        execute_values(self._cr._obj, f"""
+            UPDATE {Item._table} AS item
+               SET sequence = data.sequence,
+                   scheduled_start_time = data.start_time,
+                   write_uid = data.uid,
+                   write_date = (now() at time zone 'UTC')
+              FROM (VALUES %s) AS data(id, sequence, start_time, uid)
+             WHERE item.id = data.id
+        """, rows, page_size=len(rows))
+        Item.browse([row[0] for row in rows]).invalidate_recordset(['sequence', 'scheduled_start_time'])
     
     def get_next_item(self):
         """Obtener siguiente item para procesar"""
@@ -591,6 +769,53 @@ class WorkQueueItem(models.Model):
             else:
                 item.actual_waiting_time = 0.0
     
+    # === CONTADORES DE LA COLA ===
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        items = super().create(vals_list)
+        items._apply_queue_transitions({})
+        return items
+    
+    def write(self, vals):
+        tracked = 'state' in vals or 'work_queue_id' in vals
+        before = {item.id: (item.work_queue_id, item.state) for item in self} if tracked else None
+        result = super().write(vals)
+        if tracked:
+            self._apply_queue_transitions(before)
+        return result
+    
+    def unlink(self):
+        state_deltas = defaultdict(Counter)
+        for item in self:
+            state_deltas[item.work_queue_id][item.state] -= 1
+        result = super().unlink()
+        for queue, deltas in state_deltas.items():
+            if queue.exists():
+                queue._record_item_events(deltas, [])
+        return result
+    
+    def _apply_queue_transitions(self, before):
+        """Llevar a los contadores de cada cola los cambios de estado o de cola
+        
+        Args:
+            before: {id item: (cola, estado)} previo a la escritura ({} al crear)
+        """
+        state_deltas = defaultdict(Counter)
+        completed = defaultdict(list)
+        for item in self:
+            old_queue, old_state = before.get(item.id, (None, None))
+            if old_queue == item.work_queue_id and old_state == item.state:
+                continue
+            if old_queue:
+                state_deltas[old_queue][old_state] -= 1
+            state_deltas[item.work_queue_id][item.state] += 1
+            if item.state == 'completed' and (old_state != 'completed' or old_queue != item.work_queue_id):
+                completed[item.work_queue_id].append(item)
+        
+        for queue, deltas in state_deltas.items():
+            queue._record_item_events(deltas, completed[queue])
+    
     # === MÉTODOS DE ACCIÓN ===
     
     def action_start_processing(self):
@@ -600,8 +825,11 @@ class WorkQueueItem(models.Model):
         if self.state != 'waiting':
             raise UserError("Solo se pueden iniciar items en estado 'Esperando'.")
         
-        self.state = 'in_progress'
-        self.actual_start_time = fields.Datetime.now()
+        self.write({
+            'state': 'in_progress',
+            'actual_start_time': fields.Datetime.now(),
+        })
+        self._learn_changeover()
         
         # Iniciar la orden de producción si no está iniciada
         if self.production_id.state in ['confirmed', 'planned']:
@@ -619,6 +847,32 @@ class WorkQueueItem(models.Model):
             }
         }
     
+    def _learn_changeover(self):
+        """Registrar el cambio desde el último trabajo terminado en la misma máquina
+        
+        El hueco entre la finalización anterior y este inicio se toma como
+        setup real y alimenta la matriz de setup de la máquina.
+        """
+        workcenter = self.work_queue_id.workcenter_id
+        previous = self.search([
+            ('id', '!=', self.id),
+            ('work_queue_id.workcenter_id', '=', workcenter.id),
+            ('state', '=', 'completed'),
+            ('completion_time', '<=', self.actual_start_time),
+        ], order='completion_time desc', limit=1)
+        if not previous:
+            return
+        
+        SetupMatrix = self.env['megastock.setup.matrix']
+        from_profile = SetupMatrix._profile_from_product(previous.production_id.product_id)
+        to_profile = SetupMatrix._profile_from_product(self.production_id.product_id)
+        minutes = (self.actual_start_time - previous.completion_time).total_seconds() / 60.0
+        
+        self.setup_required = from_profile != to_profile
+        if self.setup_required:
+            self.setup_time_minutes = minutes
+            SetupMatrix._record_changeover(workcenter, from_profile, to_profile, minutes)
+    
     def action_complete_processing(self):
         """Completar procesamiento del item"""
         self.ensure_one()
@@ -626,8 +880,10 @@ class WorkQueueItem(models.Model):
         if self.state != 'in_progress':
             raise UserError("Solo se pueden completar items en estado 'En Progreso'.")
         
-        self.state = 'completed'
-        self.completion_time = fields.Datetime.now()
+        self.write({
+            'state': 'completed',
+            'completion_time': fields.Datetime.now(),
+        })
         
         # Iniciar siguiente item en la cola automáticamente
         next_item = self.work_queue_id.get_next_item()
@@ -648,8 +904,10 @@ class WorkQueueItem(models.Model):
         """Cancelar item de la cola"""
         self.ensure_one()
         
-        self.state = 'cancelled'
-        self.completion_time = fields.Datetime.now()
+        self.write({
+            'state': 'cancelled',
+            'completion_time': fields.Datetime.now(),
+        })
         
         return {
             'type': 'ir.actions.client',
@@ -726,71 +984,55 @@ class WorkQueue(models.Model):
     
     @api.model
     def get_queue_status_data(self, line_filter='all'):
-        """Obtener datos de estado de colas para dashboard"""
+        """Obtener datos de estado de colas para dashboard
+        
+        Solo lee los contadores de cada cola: el costo es O(colas), sin
+        recorrer los items.
+        """
         domain = [('state', '=', 'active')]
         
         if line_filter != 'all':
             domain.append(('production_line', '=', line_filter))
         
-        queues = self.search(domain)
+        queues = self.search_read(domain, [
+            'name', 'state', 'production_line', 'queue_type', 'max_queue_size',
+            'current_items_count', 'average_waiting_time', 'average_efficiency',
+            'completion_ring', 'completion_ring_minute',
+        ])
+        now_minute = _epoch_minute(fields.Datetime.now())
         
         queue_data = []
         for queue in queues:
-            utilization = min(100, (queue.current_items_count / queue.max_capacity * 100)) if queue.max_capacity > 0 else 0
-            
-            # Calcular tiempo promedio de espera actual
-            waiting_items = queue.queue_item_ids.filtered(lambda i: i.state == 'waiting')
-            avg_wait_time = 0
-            if waiting_items:
-                total_wait = sum(item.actual_waiting_time for item in waiting_items if item.actual_waiting_time > 0)
-                avg_wait_time = total_wait / len(waiting_items) if len(waiting_items) > 0 else 0
+            max_capacity = queue['max_queue_size']
+            utilization = min(100, (queue['current_items_count'] / max_capacity * 100)) if max_capacity > 0 else 0
+            throughput = 0
+            if queue['completion_ring']:
+                throughput = sum(_advance_ring(
+                    json.loads(queue['completion_ring']), queue['completion_ring_minute'], now_minute))
             
             queue_data.append({
-                'id': queue.id,
-                'name': queue.name,
-                'items_count': queue.current_items_count,
-                'max_capacity': queue.max_capacity,
-                'avg_wait_time': round(avg_wait_time, 1),
+                'id': queue['id'],
+                'name': queue['name'],
+                'items_count': queue['current_items_count'],
+                'max_capacity': max_capacity,
+                'avg_wait_time': round(queue['average_waiting_time'], 1),
                 'utilization': round(utilization, 1),
-                'status': 'active' if queue.state == 'active' else 'inactive',
-                'production_line': queue.production_line,
-                'queue_type': queue.queue_type,
-                'throughput_last_hour': queue._calculate_hourly_throughput(),
-                'efficiency_percentage': queue._calculate_queue_efficiency()
+                'status': 'active' if queue['state'] == 'active' else 'inactive',
+                'production_line': queue['production_line'],
+                'queue_type': queue['queue_type'],
+                'throughput_last_hour': throughput,
+                'efficiency_percentage': round(queue['average_efficiency'], 1)
             })
         
         return queue_data
     
     def _calculate_hourly_throughput(self):
         """Calcular throughput de la última hora"""
-        one_hour_ago = fields.Datetime.now() - timedelta(hours=1)
-        
-        completed_items = self.queue_item_ids.filtered(
-            lambda i: i.state == 'completed' and 
-                     i.completion_time and 
-                     i.completion_time >= one_hour_ago
-        )
-        
-        return len(completed_items)
+        return self._completions_in_window(_epoch_minute(fields.Datetime.now()))
     
     def _calculate_queue_efficiency(self):
         """Calcular eficiencia de la cola"""
-        total_items = self.queue_item_ids.filtered(lambda i: i.state == 'completed')
-        
-        if not total_items:
-            return 0.0
-        
-        # Eficiencia basada en tiempo real vs estimado
-        efficiency_sum = 0
-        count = 0
-        
-        for item in total_items:
-            if item.estimated_duration > 0 and item.actual_duration > 0:
-                item_efficiency = min(100, (item.estimated_duration / item.actual_duration) * 100)
-                efficiency_sum += item_efficiency
-                count += 1
-        
-        return round(efficiency_sum / count, 1) if count > 0 else 0.0
+        return round(self.average_efficiency, 1)
 
 
 class CapacityPlanning(models.Model):
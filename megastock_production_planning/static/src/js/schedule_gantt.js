@@ -23,7 +23,9 @@ var ScheduleGantt = AbstractAction.extend({
 
     init: function(parent, context) {
         this._super(parent, context);
-        this.ganttData = {};
+        this.ganttData = [];
+        this.scheduleRows = {};
+        this.ganttServerTime = null;
         this.selectedDateFrom = moment().format('YYYY-MM-DD');
         this.selectedDateTo = moment().add(7, 'days').format('YYYY-MM-DD');
         this.selectedLine = 'all';
@@ -56,19 +58,76 @@ var ScheduleGantt = AbstractAction.extend({
 
     // === MÉTODOS DE CARGA DE DATOS ===
 
-    _loadGanttData: function() {
+    _loadGanttData: function(incremental) {
         var self = this;
-        return rpc.query({
-            model: 'megastock.production.schedule',
-            method: 'get_gantt_data',
-            args: [this.selectedDateFrom, this.selectedDateTo],
-            kwargs: {
-                line_filter: this.selectedLine,
-                context: session.user_context,
+        if (!incremental || !this.ganttServerTime) {
+            this.scheduleRows = {};
+        }
+        var since = incremental ? this.ganttServerTime : null;
+        var knownIds = since ? Object.keys(this.scheduleRows).map(Number) : null;
+
+        // Primera carga por páginas; los refrescos traen solo cambios desde el último corte
+        var loadPage = function(offset) {
+            return rpc.query({
+                model: 'megastock.production.schedule',
+                method: 'get_gantt_window',
+                args: [self.selectedDateFrom, self.selectedDateTo],
+                kwargs: {
+                    line_filter: self.selectedLine,
+                    since: since,
+                    known_ids: offset ? null : knownIds,
+                    offset: offset,
+                    context: session.user_context,
+                }
+            }).then(function(window) {
+                if (!offset) {
+                    self.ganttServerTime = window.server_time;
+                }
+                self._applyGanttWindow(window);
+                if (window.next_offset) {
+                    return loadPage(window.next_offset);
+                }
+            });
+        };
+
+        return loadPage(0).then(function() {
+            self.ganttData = Object.values(self.scheduleRows).sort(function(a, b) {
+                return (a.workcenter_id - b.workcenter_id) || (a.start < b.start ? -1 : a.start > b.start ? 1 : 0);
+            });
+            return self.ganttData;
+        });
+    },
+
+    _applyGanttWindow: function(window) {
+        var self = this;
+        var columns = window.columns;
+
+        window.removed_ids.forEach(function(scheduleId) {
+            delete self.scheduleRows[scheduleId];
+        });
+        columns.id.forEach(function(scheduleId, index) {
+            if (columns.state[index] === 'cancelled') {
+                delete self.scheduleRows[scheduleId];
+                return;
             }
-        }).then(function(data) {
-            self.ganttData = data;
-            return data;
+            self.scheduleRows[scheduleId] = {
+                id: scheduleId,
+                name: columns.name[index],
+                production_name: window.productions[columns.production_id[index]],
+                workcenter_id: columns.workcenter_id[index],
+                workcenter_name: window.workcenters[columns.workcenter_id[index]],
+                start: columns.start[index],
+                end: columns.end[index],
+                duration: columns.duration[index],
+                state: columns.state[index],
+                color: window.colors[columns.state[index]],
+                product_name: window.products[columns.product_id[index]],
+                quantity: columns.quantity[index],
+                operators: columns.operator_ids[index].map(function(operatorId) {
+                    return window.operators[operatorId];
+                }),
+                alerts_count: columns.alerts_count[index],
+            };
         });
     },
 
@@ -350,7 +409,7 @@ var ScheduleGantt = AbstractAction.extend({
 
     _onRefreshGantt: function(ev) {
         ev.preventDefault();
-        this._loadGanttData().then(() => {
+        this._loadGanttData(true).then(() => {
             this._renderGanttChart();
         });
     },